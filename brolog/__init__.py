@@ -1,5 +1,7 @@
-from brolog.solver import query
+from brolog.facts import load_facts
+from brolog.program import Program
+from brolog.solver import aquery, query
 
 
-__all__ = ["query"]
+__all__ = ["Program", "aquery", "load_facts", "query"]
 __version__ = "0.1.0"
@@ -0,0 +1,129 @@
+"""
+All-solutions builtins: `findall/3`, `bagof/3`, `setof/3` and `aggregate_all/3`.
+
+The engine proves the goal to the end and hands over a copy of the template for each proof (see `Collect`).
+The copies are gathered in Python lists, counted or summed as they come, and the result is unified with the
+last argument at once. `setof/3` and `aggregate_all(set(T), ...)` sort the results in the standard order of
+terms and drop adjacent duplicates.
+
+`bagof/3` and `setof/3` have one solution per binding of the free variables of the goal (the variables which
+occur neither in the template nor before `^`, e.g. `Y` in `setof(X, Z^p(X, Y, Z), L)`), in the standard order
+of these bindings, and fail if the goal has no proof.
+"""
+
+import functools
+from collections.abc import Callable, Iterator
+
+from brolog.arithmetic import EvaluationError, evaluate
+from brolog.lists import Solutions, compare
+from brolog.objects import Atom, Function, Int, List, Term, Variable, deref, make_functor, make_number, variant_key
+
+
+# Prove a goal (a term), yielding a copy of the template with fresh variables for each proof
+Collect = Callable[[Term, Term], Iterator[Term]]
+
+EXISTS = make_functor("^", 2)
+TRUE = Atom("true")
+
+
+def findall(collect: Collect, template: Term, goal: Term, result: Term) -> Solutions:
+    return [[(result, List.from_list(list(collect(template, goal))))]]
+
+
+def bagof(collect: Collect, template: Term, goal: Term, result: Term) -> Solutions:
+    return [[*pairs, (result, List.from_list(items))] for pairs, items in groups(collect, template, goal)]
+
+
+def setof(collect: Collect, template: Term, goal: Term, result: Term) -> Solutions:
+    return [[*pairs, (result, List.from_list(sort_unique(items)))] for pairs, items in groups(collect, template, goal)]
+
+
+def groups(collect: Collect, template: Term, goal: Term) -> list[tuple[list[tuple[Term, Term]], list[Term]]]:
+    """
+    The results of a goal, grouped by the values of its free variables (the witness).
+
+    Each group is the pairs of terms which bind the witness, and the copies of the template.
+    """
+    goal, existential = strip_existential(goal)
+    bound = set(term_variables([template, *existential]))
+    witness = [var for var in term_variables([goal]) if var not in bound]
+    if not witness:
+        items = list(collect(template, goal))
+        return [([], items)] if items else []
+
+    witness_term = List.from_list(witness)
+    results = list(collect(Function("-", [witness_term, template]), goal))
+    # Stable, the results of each group stay in the order of the proofs
+    results.sort(key=functools.cmp_to_key(lambda x, y: compare(x.args[0], y.args[0])))
+    by_witness: dict[tuple, tuple[list[tuple[Term, Term]], list[Term]]] = {}
+    for result in results:
+        values, item = result.args
+        pairs, items = by_witness.setdefault(variant_key(values), ([], []))
+        # Binding the witness to each of its variants unifies their variables
+        pairs.append((witness_term, values))
+        items.append(item)
+    return list(by_witness.values())
+
+
+def strip_existential(goal: Term) -> tuple[Term, list[Term]]:
+    """Split `V^Goal` into the goal and the terms whose variables are existentially quantified"""
+    existential = []
+    goal = deref(goal)
+    while isinstance(goal, Function) and goal.functor is EXISTS:
+        existential.append(goal.args[0])
+        goal = deref(goal.args[1])
+    return goal, existential
+
+
+def term_variables(terms: list[Term]) -> list[Variable]:
+    """The unbound variables of some terms, in order of first occurrence"""
+    variables: dict[Variable, None] = {}
+    stack = terms[::-1]
+    while stack:
+        term = deref(stack.pop())
+        if isinstance(term, Variable):
+            variables[term] = None
+        elif isinstance(term, Function):
+            stack.extend(reversed(term.args))
+    return list(variables)
+
+
+def sort_unique(items: list[Term]) -> list[Term]:
+    """Sort in the standard order of terms, dropping duplicates"""
+    items = sorted(items, key=functools.cmp_to_key(compare))
+    return [item for i, item in enumerate(items) if i == 0 or compare(items[i - 1], item) != 0]
+
+
+def aggregate_all(collect: Collect, spec: Term, goal: Term, result: Term) -> Solutions:
+    """Aggregate all proofs of a goal: `count`, `sum(Expr)`, `max(Expr)`, `bag(Template)` or `set(Template)`"""
+    spec = deref(spec)
+    match spec:
+        case Variable():
+            msg = "Instantiation error: aggregate_all/3 needs an aggregation"
+            raise EvaluationError(msg)
+        case Atom(name="count"):
+            value = Int(sum(1 for _ in collect(TRUE, goal)))
+        case Function(name="sum", arity=1):
+            value = make_number(sum(evaluate(item) for item in collect(spec.args[0], goal)))
+        case Function(name="max", arity=1):
+            values = [evaluate(item) for item in collect(spec.args[0], goal)]
+            if not values:
+                return []
+            value = make_number(max(values))
+        case Function(name="bag", arity=1):
+            value = List.from_list(list(collect(spec.args[0], goal)))
+        case Function(name="set", arity=1):
+            value = List.from_list(sort_unique(list(collect(spec.args[0], goal))))
+        case _:
+            msg = f"Domain error: expected count, sum/1, max/1, bag/1 or set/1, found {spec}"
+            raise EvaluationError(msg)
+    return [[(result, value)]]
+
+
+# The builtins which prove a goal, they are called with a `Collect` function and their arguments
+AGGREGATES: dict[tuple[str, int], Callable[..., Solutions]] = {
+    make_functor("findall", 3): findall,
+    make_functor("bagof", 3): bagof,
+    make_functor("setof", 3): setof,
+    make_functor("aggregate_all", 3): aggregate_all,
+}
@@ -0,0 +1,216 @@
+"""
+Determinism analysis of a loaded program, reported by `brolog analyze`.
+
+For each predicate and mode (the arguments which are bound when it is called, see `brolog.program.Mode`), the
+analysis infers whether a call has at most one answer (`semidet`) or may have more (`nondet`). A call is semidet
+if at most one clause can match it and the goals of that clause are semidet themselves, after its last cut.
+At most one clause matches when the predicate has a single clause, or when each clause either commits with a
+cut or differs from all the clauses after it on a bound argument (different atoms, numbers or functors).
+
+The goals of a clause body are analysed from left to right, assuming that the program is well-moded: the
+arguments bound in the head and the variables of the goals which already succeeded are bound. Recursive calls
+are assumed to be semidet until shown otherwise, so the result is the largest consistent one.
+
+The engines do not depend on the declared modes: the arguments which tell all clauses apart are indexed when
+the program is loaded or changed (`PredicateClauses.switches`), and a call with one of them bound goes straight to
+its clause without leaving a choicepoint.
+"""
+
+from dataclasses import dataclass
+
+from brolog.aggregates import AGGREGATES, term_variables
+from brolog.arithmetic import ARITHMETIC
+from brolog.database import ASSERT, RETRACT
+from brolog.lists import BUILTINS
+from brolog.objects import Control, Cut, Predicate, Rule, Term, Variable, make_functor
+from brolog.program import Mode, Program, index_key
+
+
+# Above this many clauses, they are only checked for a switch argument and not pairwise
+MAX_PAIRWISE = 64
+
+# The builtins with at most one answer
+SEMIDET_BUILTINS = frozenset([*ARITHMETIC, *ASSERT, make_functor("findall", 3), make_functor("aggregate_all", 3)])
+# The list builtins with at most one answer once the argument at this position is bound
+LIST_BUILTINS = {
+    make_functor("append", 3): 0,
+    make_functor("length", 2): 0,
+    make_functor("nth0", 3): 0,
+    make_functor("reverse", 2): 0,
+    make_functor("msort", 2): 0,
+}
+
+
+@dataclass
+class PredicateReport:
+    functor: tuple[str, int]
+    clauses: int
+    # The arguments (from 0) where every clause has a different atom, number or functor
+    switches: list[int]
+    # Whether every clause but the last commits with a cut
+    committed: bool
+    # The determinism inferred for each declared mode, or for calls with unknown arguments if there are none
+    modes: list[tuple[Mode, str]]
+
+    @property
+    def mismatches(self) -> list[Mode]:
+        """The modes declared `det` or `semidet` which may have several answers"""
+        return [
+            mode for mode, inferred in self.modes if mode.determinism in {"det", "semidet"} and inferred != "semidet"
+        ]
+
+    def __str__(self) -> str:
+        name, arity = self.functor
+        facts = [f"{self.clauses} clause{'s' if self.clauses != 1 else ''}"]
+        if self.switches:
+            facts.append(f"switch on argument {', '.join(str(i + 1) for i in self.switches)}")
+        if self.committed:
+            facts.append("committed by cuts")
+        return f"{name}/{arity}: {', '.join(facts)}"
+
+
+class Analysis:
+    """Infers the determinism of the calls of a program, see the module docstring"""
+
+    def __init__(self, program: Program) -> None:
+        self.program = program
+        # Whether the calls of a predicate with the arguments at some positions bound have at most one answer
+        self.semidet: dict[tuple[tuple[str, int], frozenset[int]], bool] = {}
+
+    def is_semidet(self, functor: tuple[str, int], bound: frozenset[int]) -> bool:
+        if (value := self.semidet.get((functor, bound))) is None:
+            # Until shown otherwise, so that recursive calls do not loop
+            value = self.semidet[functor, bound] = True
+        return value
+
+    def run(self) -> None:
+        """Infer the determinism of the calls requested so far and of the calls they make, until nothing changes"""
+        changed = True
+        while changed:
+            size = len(self.semidet)
+            changed = False
+            for (functor, bound), value in list(self.semidet.items()):
+                if value and not self.infer(functor, bound):
+                    self.semidet[functor, bound] = False
+                    changed = True
+            # New calls were found
+            changed = changed or len(self.semidet) != size
+
+    def infer(self, functor: tuple[str, int], bound: frozenset[int]) -> bool:
+        program = self.program
+        if functor in program.tabled or functor in program.facts:
+            return False
+        if (clauses := program.predicates.get(functor)) is None:
+            return builtin_semidet(functor, bound)
+        rules = [clause.rule for clause in clauses.clauses]
+        return exclusive(rules, bound) and all(self.body_semidet(rule, bound) for rule in rules)
+
+    def body_semidet(self, rule: Rule, bound: frozenset[int]) -> bool:
+        """Whether the goals after the last cut of a clause have at most one answer"""
+        bound_variables = set(term_variables([rule.head.args[i] for i in bound]))
+        semidet = True
+        for goal in rule.body:
+            if isinstance(goal, Cut):
+                semidet = True
+                continue
+            semidet = self.goal_semidet(goal, bound_variables) and semidet
+            bound_variables.update(goal_variables(goal))
+        return semidet
+
+    def goal_semidet(self, goal: Predicate, bound_variables: set[Variable]) -> bool:  # noqa: PLR0911
+        if isinstance(goal, Cut):
+            return True
+        if isinstance(goal, Control):
+            match goal.name:
+                case "true" | "fail" | "\\+":
+                    return True
+                case ",":
+                    first, second = goal.args
+                    return self.goal_semidet(first, bound_variables) and self.goal_semidet(
+                        second, bound_variables | goal_variables(first)
+                    )
+                case "->":
+                    # The condition has at most one answer
+                    condition, then = goal.args
+                    return self.goal_semidet(then, bound_variables | goal_variables(condition))
+                case ";" if isinstance(left := goal.args[0], Control) and left.name == "->":
+                    return self.goal_semidet(left, bound_variables) and self.goal_semidet(goal.args[1], bound_variables)
+            return False
+        bound = frozenset(i for i, arg in enumerate(goal.args) if set(term_variables([arg])) <= bound_variables)
+        return self.is_semidet(goal.functor, bound)
+
+
+def exclusive(rules: list[Rule], bound: frozenset[int]) -> bool:
+    """Whether at most one of the clauses can match a call whose arguments at the `bound` positions are bound"""
+    if len(rules) <= 1:
+        return True
+    if any(is_switch(rules, position) for position in bound):
+        return True
+    if len(rules) > MAX_PAIRWISE:
+        return False
+    return all(
+        has_cut(rule) or all(differ(rule, other, bound) for other in rules[i + 1 :])
+        for i, rule in enumerate(rules[:-1])
+    )
+
+
+def is_switch(rules: list[Rule], position: int) -> bool:
+    """Whether every clause has a different atom, number or functor at an argument"""
+    keys = [index_key(rule.head.args[position]) for rule in rules]
+    return None not in keys and len(set(keys)) == len(keys)
+
+
+def differ(rule: Rule, other: Rule, bound: frozenset[int]) -> bool:
+    """Whether two clauses cannot match the same call, because of one of the bound arguments"""
+    for i in bound:
+        key, other_key = index_key(rule.head.args[i]), index_key(other.head.args[i])
+        if key is not None and other_key is not None and key != other_key:
+            return True
+    return False
+
+
+def has_cut(rule: Rule) -> bool:
+    return any(isinstance(goal, Cut) for goal in rule.body)
+
+
+def builtin_semidet(functor: tuple[str, int], bound: frozenset[int]) -> bool:
+    """Whether a call to a predicate which the program does not define has at most one answer"""
+    if functor in SEMIDET_BUILTINS:
+        return True
+    if (position := LIST_BUILTINS.get(functor)) is not None:
+        return position in bound
+    # Other builtins may have several answers, a call to an undefined predicate fails
+    return functor not in BUILTINS and functor not in AGGREGATES and functor is not RETRACT
+
+
+def goal_variables(goal: Predicate | Term) -> set[Variable]:
+    if isinstance(goal, Predicate):
+        return set().union(*(goal_variables(arg) for arg in goal.args))
+    return set(term_variables([goal]))
+
+
+def analyze(program: Program) -> list[PredicateReport]:
+    """Report the determinism inferred for the declared modes of each predicate of the program"""
+    analysis = Analysis(program)
+    requests = {}
+    for functor in program.predicates:
+        name, arity = functor
+        modes = program.modes.get(functor) or [Mode(name, ("?",) * arity)]
+        requests[functor] = modes
+        for mode in modes:
+            analysis.is_semidet(functor, mode.bound)
+    analysis.run()
+
+    reports = []
+    for functor, modes in requests.items():
+        rules = [clause.rule for clause in program.predicates[functor].clauses]
+        reports.append(
+            PredicateReport(
+                functor,
+                len(rules),
+                [i for i in range(functor[1]) if len(rules) > 1 and is_switch(rules, i)],
+                len(rules) > 1 and all(has_cut(rule) for rule in rules[:-1]),
+                [(mode, "semidet" if analysis.semidet[functor, mode.bound] else "nondet") for mode in modes],
+            )
+        )
+    return reports
@@ -0,0 +1,172 @@
+"""
+Arithmetic: `is/2` and the numeric comparisons, evaluated with Python numbers.
+
+The expressions of a clause body are compiled once, when the clause is loaded, into Python
+closures which read the clause variables directly from the frame of a call (see `brolog.compiler`).
+Constant subexpressions are folded at compile time. Terms which only become known at runtime
+(e.g. the value of `X` in `Y is 1 + 2 * X`, which may itself be an expression) are evaluated by walking them.
+"""
+
+import math
+import operator
+from collections.abc import Callable
+
+from brolog.objects import Atom, Function, Number, Term, Variable, make_functor
+
+
+IS = make_functor("is", 2)
+
+COMPARISONS: dict[tuple[str, int], Callable[[float, float], bool]] = {
+    make_functor("=:=", 2): operator.eq,
+    make_functor("=\\=", 2): operator.ne,
+    make_functor("<", 2): operator.lt,
+    make_functor(">", 2): operator.gt,
+    make_functor("=<", 2): operator.le,
+    make_functor(">=", 2): operator.ge,
+}
+
+# The predicates evaluated by this module
+ARITHMETIC = frozenset([IS, *COMPARISONS])
+
+
+class EvaluationError(Exception):
+    """An expression cannot be evaluated, e.g. it contains an unbound variable or divides by zero"""
+
+
+def integer(value: float) -> int:
+    if not isinstance(value, int):
+        msg = f"Type error: integer expected, found {value}"
+        raise EvaluationError(msg)
+    return value
+
+
+def divide(x: float, y: float) -> float:
+    if y == 0:
+        msg = "Evaluation error: division by zero"
+        raise EvaluationError(msg)
+    if isinstance(x, int) and isinstance(y, int) and x % y == 0:
+        return x // y
+    return x / y
+
+
+def int_divide(x: float, y: float) -> int:
+    """Integer division truncating towards zero"""
+    x, y = integer(x), integer(y)
+    if y == 0:
+        msg = "Evaluation error: division by zero"
+        raise EvaluationError(msg)
+    quotient = abs(x) // abs(y)
+    return quotient if (x < 0) == (y < 0) else -quotient
+
+
+def modulo(x: float, y: float) -> int:
+    """The remainder with the sign of the divisor"""
+    x, y = integer(x), integer(y)
+    if y == 0:
+        msg = "Evaluation error: division by zero"
+        raise EvaluationError(msg)
+    return x % y
+
+
+def remainder(x: float, y: float) -> int:
+    """The remainder with the sign of the dividend"""
+    return integer(x) - integer(y) * int_divide(x, y)
+
+
+def power(x: float, y: float) -> float:
+    try:
+        result = x**y
+    except (OverflowError, ZeroDivisionError) as e:
+        msg = f"Evaluation error: {e}"
+        raise EvaluationError(msg) from e
+    if isinstance(result, complex):
+        # A negative base with a non-integer exponent
+        msg = f"Evaluation error: undefined: {x} ** {y}"
+        raise EvaluationError(msg)
+    return result
+
+
+def sign(x: float) -> float:
+    if isinstance(x, int) or not x:
+        return type(x)((x > 0) - (x < 0))
+    return math.copysign(1.0, x)
+
+
+def round_half_away(x: float) -> int:
+    return int(math.copysign(math.floor(abs(x) + 0.5), x))
+
+
+def checked(f: Callable[..., float]) -> Callable[..., float]:
+    """Raise `EvaluationError` for the arguments outside of the domain of a math function"""
+
+    def _checked(*args: float) -> float:
+        try:
+            return f(*args)
+        except (ValueError, OverflowError) as e:
+            msg = f"Evaluation error: {e}"
+            raise EvaluationError(msg) from e
+
+    return _checked
+
+
+FUNCTIONS: dict[tuple[str, int], Callable[..., float]] = {
+    make_functor("+", 2): operator.add,
+    make_functor("-", 2): operator.sub,
+    make_functor("*", 2): operator.mul,
+    make_functor("/", 2): divide,
+    make_functor("//", 2): int_divide,
+    make_functor("mod", 2): modulo,
+    make_functor("rem", 2): remainder,
+    make_functor("**", 2): power,
+    make_functor("^", 2): power,
+    make_functor("min", 2): min,
+    make_functor("max", 2): max,
+    make_functor(">>", 2): checked(lambda x, y: integer(x) >> integer(y)),
+    make_functor("<<", 2): checked(lambda x, y: integer(x) << integer(y)),
+    make_functor("/\\", 2): lambda x, y: integer(x) & integer(y),
+    make_functor("\\/", 2): lambda x, y: integer(x) | integer(y),
+    make_functor("gcd", 2): lambda x, y: math.gcd(integer(x), integer(y)),
+    make_functor("-", 1): operator.neg,
+    make_functor("+", 1): operator.pos,
+    make_functor("abs", 1): abs,
+    make_functor("sign", 1): sign,
+    make_functor("sqrt", 1): checked(math.sqrt),
+    make_functor("exp", 1): checked(math.exp),
+    make_functor("log", 1): checked(math.log),
+    make_functor("sin", 1): checked(math.sin),
+    make_functor("cos", 1): checked(math.cos),
+    make_functor("tan", 1): checked(math.tan),
+    make_functor("atan", 1): checked(math.atan),
+    make_functor("float", 1): checked(float),
+    make_functor("integer", 1): checked(round_half_away),
+    make_functor("round", 1): checked(round_half_away),
+    make_functor("truncate", 1): checked(int),
+    make_functor("floor", 1): checked(math.floor),
+    make_functor("ceiling", 1): checked(math.ceil),
+}
+
+CONSTANTS: dict[Atom, float] = {
+    Atom("pi"): math.pi,
+    Atom("e"): math.e,
+    Atom("inf"): math.inf,
+    Atom("nan"): math.nan,
+}
+
+
+def evaluate(term: Term | None) -> float:
+    """Evaluate an arithmetic expression, following the bindings of its variables"""
+    while isinstance(term, Variable) and term.ref is not None:
+        term = term.ref
+    if isinstance(term, Number):
+        return term.value
+    if term is None or isinstance(term, Variable):
+        # `None` is a clause variable which was never created
+        msg = "Instantiation error: arguments are not sufficiently instantiated"
+        raise EvaluationError(msg)
+    if isinstance(term, Atom) and term in CONSTANTS:
+        return CONSTANTS[term]
+    if isinstance(term, Function) and (f := FUNCTIONS.get(term.functor)) is not None:
+        return f(*[evaluate(arg) for arg in term.args])
+    name, arity = term.functor if isinstance(term, Function) else (term, 0)
+    msg = f"Type error: {name}/{arity} is not a function"
+    raise EvaluationError(msg)
@@ -0,0 +1,349 @@
+"""
+Benchmark suite, run with `brolog bench`.
+
+The suite covers classic Prolog benchmarks and the throughput of the lexer and parser.
+For each benchmark, it reports the best time of a few runs, the throughput (logical inferences
+per second, or bytes or facts per second for loading) and the peak memory allocated by a run.
+Results can be saved as JSON and compared against a previous run to catch regressions.
+"""
+
+import gc
+import json
+import platform
+import random
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import brolog
+from brolog.engine import Engine
+from brolog.facts import FactTable, read_rows
+from brolog.lex import tokenize
+from brolog.parse import Parser
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    description: str
+    # What `run` counts, e.g. inferences for LIPS
+    unit: str
+    # Builds the benchmark for a given size scale and returns a function which runs it once,
+    # returning the number of units processed
+    prepare: Callable[[float], Callable[[], int]]
+
+
+@dataclass
+class Result:
+    name: str
+    scale: float
+    unit: str
+    units: int
+    # Best time of all repeats, in seconds
+    time: float
+    # Units per second, e.g. LIPS
+    throughput: float
+    # Peak memory allocated during a run in bytes, None if not measured
+    peak_memory: int | None = None
+
+
+def atoms(prefix: str, n: int) -> str:
+    return "[" + ", ".join(f"{prefix}{i}" for i in range(n)) + "]"
+
+
+def prolog(source: str, query: str, *, all_answers: bool = True) -> Callable[[], int]:
+    """Prepare a query, each run proves it (for all answers) and returns the number of inferences"""
+    program = Parser(source).parse_program()
+    q = Parser(query).parse_query()
+
+    def run() -> int:
+        program.tables.clear()
+        engine = Engine(program)
+        answers = engine.solve(q)
+        if all_answers:
+            for _ in answers:
+                pass
+        elif next(answers, None) is None:
+            msg = f"No answer to {query}"
+            raise AssertionError(msg)
+        return engine.inferences
+
+    return run
+
+
+NREV = """\
+app([], L, L).
+app([H|T], L, [H|R]) :- app(T, L, R).
+nrev([], []).
+nrev([H|T], R) :- nrev(T, RT), app(RT, [H], R).
+bench([], _).
+bench([_|N], L) :- nrev(L, _), bench(N, L).
+"""
+
+
+def nrev(scale: float) -> Callable[[], int]:
+    repeats = max(1, round(100 * scale))
+    return prolog(NREV, f"bench({atoms('r', repeats)}, {atoms('a', 30)}).")
+
+
+QUEENS = """\
+queens(N, Qs) :- range(1, N, Ns), queens(Ns, [], Qs).
+queens([], Qs, Qs).
+queens(Unplaced, Safe, Qs) :- select(Q, Unplaced, R), noattack(Q, Safe, 1), queens(R, [Q|Safe], Qs).
+select(X, [X|T], T).
+select(X, [H|T], [H|R]) :- select(X, T, R).
+noattack(_, [], _).
+noattack(Q, [Q1|Qs], D) :- Q =\\= Q1 + D, Q =\\= Q1 - D, D1 is D + 1, noattack(Q, Qs, D1).
+range(N, N, [N]) :- !.
+range(M, N, [M|Ns]) :- M < N, M1 is M + 1, range(M1, N, Ns).
+"""
+
+
+def queens(scale: float) -> Callable[[], int]:
+    return prolog(QUEENS, f"queens({6 if scale < 1 else 8}, Qs).")
+
+
+ZEBRA = """\
+houses([h(_, norwegian, _, _, _), _, h(_, _, _, milk, _), _, _]).
+right_of(X, Y, [Y|[X|_]]).
+right_of(X, Y, [_|T]) :- right_of(X, Y, T).
+next_to(X, Y, L) :- right_of(X, Y, L).
+next_to(X, Y, L) :- right_of(Y, X, L).
+member(X, [X|_]).
+member(X, [_|T]) :- member(X, T).
+zebra(Owner) :- houses(Hs),
+    member(h(red, english, _, _, _), Hs),
+    member(h(_, spanish, dog, _, _), Hs),
+    member(h(green, _, _, coffee, _), Hs),
+    member(h(_, ukrainian, _, tea, _), Hs),
+    right_of(h(green, _, _, _, _), h(ivory, _, _, _, _), Hs),
+    member(h(_, _, snails, _, oldgold), Hs),
+    member(h(yellow, _, _, _, kools), Hs),
+    next_to(h(_, _, _, _, chesterfield), h(_, _, fox, _, _), Hs),
+    next_to(h(_, _, _, _, kools), h(_, _, horse, _, _), Hs),
+    member(h(_, _, _, orangejuice, luckystrike), Hs),
+    member(h(_, japanese, _, _, parliament), Hs),
+    next_to(h(_, norwegian, _, _, _), h(blue, _, _, _, _), Hs),
+    member(h(_, Owner, zebra, _, _), Hs),
+    member(h(_, _, _, water, _), Hs).
+solve([]).
+solve([_|N]) :- zebra(_), solve(N).
+"""
+
+
+def zebra(scale: float) -> Callable[[], int]:
+    repeats = max(1, round(10 * scale))
+    return prolog(ZEBRA, f"solve({atoms('r', repeats)}).", all_answers=False)
+
+
+TAK = """\
+tak(X, Y, Z, Z) :- X =< Y, !.
+tak(X, Y, Z, A) :-
+    X1 is X - 1, Y1 is Y - 1, Z1 is Z - 1,
+    tak(X1, Y, Z, A1), tak(Y1, Z, X, A2), tak(Z1, X, Y, A3), tak(A1, A2, A3, A).
+"""
+
+
+def tak(scale: float) -> Callable[[], int]:
+    x, y, z = (18, 12, 6) if scale >= 1 else (12, 8, 4)
+    return prolog(TAK, f"tak({x}, {y}, {z}, A).")
+
+
+CRYPT = """\
+sel(X, [X|T], T).
+sel(X, [H|T], [H|R]) :- sel(X, T, R).
+# SEND + MORE = MONEY, column by column
+money(S, E, N, D, M, O, R, Y) :-
+    sel(D, [0, 1, 2, 3, 4, 5, 6, 7, 8, 9], D1), sel(E, D1, D2), add(D, E, 0, Y, C1), sel(Y, D2, D3),
+    sel(N, D3, D4), sel(R, D4, D5), add(N, R, C1, E, C2),
+    sel(O, D5, D6), add(E, O, C2, N, C3),
+    sel(S, D6, D7), S > 0, sel(M, D7, _), M > 0, add(S, M, C3, O, M).
+add(A, B, Carry, Sum, CarryOut) :- T is A + B + Carry, Sum is T mod 10, CarryOut is T // 10.
+"""
+
+
+def crypt(scale: float) -> Callable[[], int]:
+    run = prolog(CRYPT, "money(S, E, N, D, M, O, R, Y).")
+    repeats = max(1, round(scale))
+    return lambda: sum(run() for _ in range(repeats))
+
+
+CLOSURE = """\
+:- table path/2.
+path(X, Y) :- path(X, Z), e(Z, Y).
+path(X, Y) :- e(X, Y).
+reach(X, Y) :- e(X, Y).
+reach(X, Y) :- e(X, Z), reach(Z, Y).
+"""
+
+
+def closure(scale: float) -> Callable[[], int]:
+    """Deep transitive closure of a chain, with a tabled left recursion and a plain right recursion"""
+    # The tabled closure of a chain takes a quadratic number of inferences
+    tabled = prolog(CLOSURE + chain(max(10, round(500 * scale))), "path(n0, X).")
+    plain = prolog(CLOSURE + chain(max(10, round(100_000 * scale))), "reach(n0, X).")
+    return lambda: tabled() + plain()
+
+
+def chain(n: int) -> str:
+    return "".join(f"e(n{i}, n{i + 1}).\n" for i in range(n))
+
+
+FACTS = """\
+lookup_all([]).
+lookup_all([K|Ks]) :- f(K, _), lookup_all(Ks).
+"""
+
+
+def facts(scale: float) -> Callable[[], int]:
+    """Lookups by key in a large table of facts, through the first argument index"""
+    n = max(10, round(100_000 * scale))
+    rng = random.Random(0)  # noqa: S311
+    keys = [f"k{rng.randrange(n)}" for _ in range(n // 2)]
+    table = "".join(f"f(k{i}, v{i}).\n" for i in range(n))
+    return prolog(FACTS + table, f"lookup_all([{', '.join(keys)}]).")
+
+
+def generate_source(size: int) -> Iterator[str]:
+    """About `size` bytes of facts and rules"""
+    written = i = 0
+    while written < size:
+        line = (
+            f"edge(n{i}, n{i % 100}, red, w(a, [b, c])).\n"
+            if i % 4
+            else f"path{i % 50}(X, Y) :- edge(X, Z, _, _), path{i % 50}(Z, Y).\n"
+        )
+        written += len(line)
+        i += 1
+        yield line
+
+
+def lex(scale: float) -> Callable[[], int]:
+    source = "".join(generate_source(round(2_000_000 * scale)))
+
+    def run() -> int:
+        tokenize(source)
+        return len(source)
+
+    return run
+
+
+def parse(scale: float) -> Callable[[], int]:
+    source = "".join(generate_source(round(2_000_000 * scale)))
+
+    def run() -> int:
+        Parser(source).parse_program()
+        return len(source)
+
+    return run
+
+
+def load_facts(scale: float) -> Callable[[], int]:
+    """Load a large table of facts, the peak memory per fact is the footprint of a fact"""
+    n = max(10, round(50_000 * scale))
+    lines = [f"edge(n{i}, n{i % 100}, red, w(a, b)).\n" for i in range(n)]
+
+    def run() -> int:
+        return len(Parser(lines).parse_program())
+
+    return run
+
+
+def load_csv(scale: float) -> Callable[[], int]:
+    """Load a table like the one of `load_facts` from CSV into a columnar fact table"""
+    n = max(10, round(50_000 * scale))
+    lines = [f"n{i},n{i % 100},red,7\n" for i in range(n)]
+
+    def run() -> int:
+        table = FactTable("edge", 4)
+        table.extend(read_rows(lines, "csv"))
+        return len(table)
+
+    return run
+
+
+BENCHMARKS = [
+    Benchmark("nrev", "Naive reverse of a 30 element list", "inferences", nrev),
+    Benchmark("queens", "All solutions of the n-queens problem", "inferences", queens),
+    Benchmark("zebra", "The zebra puzzle", "inferences", zebra),
+    Benchmark("tak", "The Takeuchi function", "inferences", tak),
+    Benchmark("crypt", "SEND + MORE = MONEY", "inferences", crypt),
+    Benchmark("closure", "Transitive closure of a long chain", "inferences", closure),
+    Benchmark("facts", "Lookups in a large fact table", "inferences", facts),
+    Benchmark("lex", "Tokenize a multi-MB source", "bytes", lex),
+    Benchmark("parse", "Parse a multi-MB source", "bytes", parse),
+    Benchmark("load-facts", "Load a large table of facts", "facts", load_facts),
+    Benchmark("load-csv", "Load a large table of facts from CSV", "facts", load_csv),
+]
+
+
+def run_benchmark(benchmark: Benchmark, *, scale: float = 1.0, repeat: int = 3, memory: bool = True) -> Result:
+    run = benchmark.prepare(scale)
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        units = run()
+        best = min(best, time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        # A separate run, tracing allocations slows it down
+        gc.collect()
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return Result(benchmark.name, scale, benchmark.unit, units, best, units / best if best else 0.0, peak)
+
+
+def run_suite(
+    names: list[str] | None = None, *, scale: float = 1.0, repeat: int = 3, memory: bool = True
+) -> Iterator[Result]:
+    for benchmark in BENCHMARKS:
+        if not names or benchmark.name in names:
+            yield run_benchmark(benchmark, scale=scale, repeat=repeat, memory=memory)
+
+
+def save(results: list[Result], path: Path) -> None:
+    data = {
+        "version": brolog.__version__,
+        "python": platform.python_version(),
+        "results": {result.name: asdict(result) for result in results},
+    }
+    path.write_text(json.dumps(data, indent=2))
+
+
+def load(path: Path) -> dict[str, Result]:
+    return {name: Result(**result) for name, result in json.loads(path.read_text())["results"].items()}
+
+
+def format_throughput(result: Result) -> str:
+    if result.unit == "inferences":
+        return f"{result.throughput / 1000:,.0f} kLIPS"
+    if result.unit == "bytes":
+        return f"{result.throughput / 1_000_000:,.2f} MB/s"
+    return f"{result.throughput:,.0f} {result.unit}/s"
+
+
+def format_memory(result: Result) -> str:
+    if result.peak_memory is None:
+        return "-"
+    memory = f"{result.peak_memory / 1_000_000:,.1f} MB"
+    if result.unit == "facts":
+        memory += f" ({result.peak_memory / result.units:,.0f} B/fact)"
+    return memory
+
+
+def format_header(*, baseline: bool = False) -> str:
+    header = f"{'benchmark':<12}{'time':>11}{'throughput':>18}{'peak memory':>28}"
+    return header + f"{'vs baseline':>12}" if baseline else header
+
+
+def format_result(result: Result, baseline: Result | None = None) -> str:
+    line = f"{result.name:<12}{result.time:>10.3f}s{format_throughput(result):>18}{format_memory(result):>28}"
+    if baseline is not None:
+        line += f"{result.time / baseline.time:>11.2f}x"
+    return line
@@ -0,0 +1,91 @@
+"""
+On-disk cache of parsed programs.
+
+Loading a large program is dominated by lexing and parsing. The parsed `Program`
+(rules and clause indexes) is therefore pickled to `<source>.plc` next to the source file,
+or to the user cache directory if that is not writable. The cache is keyed by the hash of
+the source and the brolog version, and is ignored (and rebuilt) when either changes.
+
+Cache files are trusted like the source itself, only load caches you created.
+"""
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+import brolog
+from brolog.parse import Parser
+from brolog.program import Program
+
+
+# Bump when the pickled representation changes without a version bump
+CACHE_FORMAT = 8
+
+
+def cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "brolog"
+
+
+def cache_paths(source_path: Path) -> list[Path]:
+    """The locations where the compiled form of `source_path` may be stored, in order of preference."""
+    name = hashlib.sha256(str(source_path.resolve()).encode()).hexdigest()
+    return [source_path.with_suffix(".plc"), cache_dir() / f"{name}.plc"]
+
+
+def make_header(source: bytes) -> dict:
+    return {
+        "format": CACHE_FORMAT,
+        "version": brolog.__version__,
+        "source": hashlib.sha256(source).hexdigest(),
+    }
+
+
+def read_cache(path: Path, header: dict) -> Program | None:
+    """Return the cached program if the cache exists and matches `header`."""
+    try:
+        with path.open("rb") as f:
+            if pickle.load(f) != header:  # noqa: S301
+                return None
+            return pickle.load(f)  # noqa: S301
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def write_cache(path: Path, header: dict, program: Program) -> bool:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with tmp_path.open("wb") as f:
+            pickle.dump(header, f)
+            pickle.dump(program, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(path)
+    except (OSError, RecursionError, pickle.PicklingError):
+        return False
+    return True
+
+
+def compile_program(source_path: Path) -> tuple[Program, Path | None]:
+    """Parse a program and store its compiled form. Returns the program and where it was stored."""
+    source = source_path.read_bytes()
+    header = make_header(source)
+    program = Parser(source.decode().splitlines(keepends=True)).parse_program()
+    for path in cache_paths(source_path):
+        if write_cache(path, header, program):
+            return program, path
+    return program, None
+
+
+def load_program(source_path: Path, *, use_cache: bool = True) -> Program:
+    """Load a program from its compiled form if it is up to date, otherwise parse it and cache the result."""
+    if not use_cache:
+        with source_path.open() as f:
+            return Parser(f).parse_program()
+
+    header = make_header(source_path.read_bytes())
+    for path in cache_paths(source_path):
+        if (program := read_cache(path, header)) is not None:
+            return program
+    program, _ = compile_program(source_path)
+    return program
@@ -1,60 +1,410 @@
+import itertools
+import json
+import sqlite3
 import sys
-from io import TextIOWrapper
+import time
+from collections.abc import Callable, Iterable
+from contextlib import nullcontext
+from functools import partial
+from pathlib import Path
+from typing import TypeVar
 
 import click
 
 import brolog
+from brolog import analysis
+from brolog import bench as benchmarks
+from brolog.arithmetic import EvaluationError
+from brolog.cache import compile_program, load_program
+from brolog.facts import FactFormatError, FactTable, parse_indicator
 from brolog.lex import LexerError
-from brolog.objects import Rule
+from brolog.limits import LimitExceeded, Limits
+from brolog.objects import Predicate, Term, Variable
+from brolog.parallel import ParallelSolver
 from brolog.parse import ParseError, Parser
+from brolog.profiler import Profile
+from brolog.program import Program
 from brolog.solver import get_variable_assignments, query
+from brolog.sqlite import SqliteTable
 
 
-@click.group(invoke_without_command=True)
-@click.argument("input_file", type=click.File("r"), required=False)
+T = TypeVar("T")
+
+Solve = Callable[[Predicate], Iterable[list[dict[Variable, Term]]]]
+
+
+class BrologGroup(click.Group):
+    """Run the `run` command when the first argument is not a command, i.e. `brolog input_file.pl`"""
+
+    def resolve_command(
+        self, ctx: click.Context, args: list[str]
+    ) -> tuple[str | None, click.Command | None, list[str]]:
+        if args and args[0] not in self.commands:
+            return "run", self.commands["run"], args
+        return super().resolve_command(ctx, args)
+
+
+@click.group(cls=BrologGroup, invoke_without_command=True)
 @click.option("--version", is_flag=True)
 @click.pass_context
-def cli(ctx, input_file: TextIOWrapper, version: bool) -> None:  # noqa: ANN001, FBT001
+def cli(ctx, version: bool) -> None:  # noqa: ANN001, FBT001
     """Brolog REPL. Run `brolog input_file.pl` to load a program"""
     if ctx.invoked_subcommand is None:
-        if input_file:
-            repl(input_file)
-        elif version:
+        if version:
             click.echo(brolog.__version__)
         else:
             click.echo(ctx.get_help())
 
 
-def repl(input_file: TextIOWrapper) -> None:
-    source = input_file.read()
-    if (rules := try_parse(source)) is None:
+input_file_argument = click.argument("input_file", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+
+
+@cli.command()
+@input_file_argument
+@click.option("--no-cache", is_flag=True, help="Parse the program even if an up to date compiled form exists.")
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help=(
+        "Number of processes which explore the branches of a query in parallel. "
+        "Programs which use assertz/asserta/retract run sequentially."
+    ),
+)
+@click.option(
+    "--queries",
+    "queries_file",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Run the queries in this file (one `goal.` each) instead of starting the REPL.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["text", "jsonl"]),
+    default="text",
+    show_default=True,
+    help="Output format of --queries. jsonl prints one JSON record per answer and per query.",
+)
+@click.option(
+    "--facts",
+    "fact_files",
+    multiple=True,
+    metavar="NAME/ARITY=FILE",
+    help="Load the rows of a CSV, TSV or JSON lines file as the facts of a predicate, e.g. edge/2=edges.csv.",
+)
+@click.option(
+    "--sqlite",
+    "sqlite_tables",
+    multiple=True,
+    metavar="NAME/ARITY=FILE:TABLE",
+    help="Answer the calls to a predicate from a table of a SQLite database, e.g. edge/2=graph.db:edges.",
+)
+@click.option(
+    "--max-answers",
+    type=click.IntRange(min=1),
+    help="Stop looking for answers to a query once this many are found.",
+)
+@click.option("--max-inferences", type=click.IntRange(min=0), help="Stop a query after this many inferences.")
+@click.option("--max-depth", type=click.IntRange(min=0), help="Stop a query when its search gets this deep.")
+@click.option("--max-choicepoints", type=click.IntRange(min=0), help="Stop a query with this many open choicepoints.")
+@click.option("--timeout", type=click.FloatRange(min=0), help="Stop a query after this many seconds.")
+@click.option("--profile", is_flag=True, help="Print a per-predicate profile of all queries to stderr at the end.")
+@click.option(
+    "--profile-json",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write the per-predicate profile of all queries to this file as JSON at the end.",
+)
+def run(  # noqa: PLR0913
+    input_file: Path,
+    no_cache: bool,  # noqa: FBT001
+    workers: int,
+    queries_file: Path | None,
+    output_format: str,
+    fact_files: tuple[str, ...],
+    sqlite_tables: tuple[str, ...],
+    max_answers: int | None,
+    max_inferences: int | None,
+    max_depth: int | None,
+    max_choicepoints: int | None,
+    timeout: float | None,
+    profile: bool,  # noqa: FBT001
+    profile_json: Path | None,
+) -> None:
+    """Load a program and start the REPL (same as `brolog input_file.pl`)"""
+    if output_format != "text" and queries_file is None:
+        msg = "--format can only be used with --queries"
+        raise click.UsageError(msg)
+    if (profile or profile_json) and workers > 1:
+        msg = "--profile cannot be used with --workers"
+        raise click.UsageError(msg)
+    if (program := try_parse(lambda: load_program(input_file, use_cache=not no_cache))) is None:
+        sys.exit(1)
+    if not all(add_facts(program, spec) for spec in fact_files) or not all(
+        add_sqlite_table(program, spec) for spec in sqlite_tables
+    ):
         sys.exit(1)
 
+    queries = None
+    if queries_file is not None:
+        with queries_file.open() as f:
+            if (queries := try_parse(lambda: list(Parser(f).iter_queries()))) is None:
+                sys.exit(1)
+
+    limits = Limits(max_inferences, max_depth, max_choicepoints, timeout)
+    collected = Profile() if profile or profile_json else None
+    with ParallelSolver(program, workers, limits=limits) if workers > 1 else nullcontext() as solver:
+        run_query = partial(solve, program, solver=solver, limits=limits, profile=collected)
+        if queries is None:
+            repl(run_query, max_answers=max_answers)
+        else:
+            batch(queries, output_format, run_query, max_answers=max_answers)
+
+    if profile:
+        click.echo(collected.report(), err=True)
+    if profile_json:
+        collected.dump(profile_json)
+
+
+@cli.command("compile")
+@click.argument("input_files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False, path_type=Path))
+def compile_(input_files: tuple[Path, ...]) -> None:
+    """Prebuild the compiled form of programs so that they load faster"""
+    for input_file in input_files:
+        if (result := try_parse(lambda: compile_program(input_file))) is None:  # noqa: B023
+            sys.exit(1)
+        _, path = result
+        if path is None:
+            click.secho(f"Could not write the compiled form of {input_file}", fg="red", bold=True)
+            sys.exit(1)
+        click.echo(f"{input_file} -> {path}")
+
+
+@cli.command()
+@input_file_argument
+@click.option("--no-cache", is_flag=True, help="Parse the program even if an up to date compiled form exists.")
+def analyze(input_file: Path, no_cache: bool) -> None:  # noqa: FBT001
+    """Report the determinism of each predicate and check the declared modes (`:- mode p(+, -) is det.`)"""
+    if (program := try_parse(lambda: load_program(input_file, use_cache=not no_cache))) is None:
+        sys.exit(1)
+    mismatches = 0
+    for report in analysis.analyze(program):
+        click.echo(str(report))
+        for mode, inferred in report.modes:
+            line = f"  {mode.name}({', '.join(mode.args)}) is {inferred}"
+            if mode in report.mismatches:
+                mismatches += 1
+                click.secho(f"{line}, declared {mode.determinism}", fg="red")
+            else:
+                click.echo(line)
+    if mismatches:
+        click.secho(f"{mismatches} mode declaration(s) may have several answers", fg="red", bold=True)
+        sys.exit(1)
+
+
+@cli.command()
+@click.argument("names", nargs=-1, type=click.Choice([b.name for b in benchmarks.BENCHMARKS]))
+@click.option(
+    "--scale",
+    type=click.FloatRange(min=0, min_open=True),
+    default=1.0,
+    show_default=True,
+    help="Multiply the size of each benchmark.",
+)
+@click.option(
+    "--repeat",
+    type=click.IntRange(min=1),
+    default=3,
+    show_default=True,
+    help="Run each benchmark this many times and report the best time.",
+)
+@click.option("--no-memory", is_flag=True, help="Skip the extra run which measures the peak memory.")
+@click.option("--save", type=click.Path(dir_okay=False, path_type=Path), help="Write the results to this file as JSON.")
+@click.option(
+    "--baseline",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Compare the times against the results saved in this file.",
+)
+@click.option(
+    "--tolerance",
+    type=click.FloatRange(min=0),
+    help="With --baseline, exit with an error if a benchmark is this much slower, e.g. 0.1 for 10%.",
+)
+def bench(  # noqa: PLR0913
+    names: tuple[str, ...],
+    scale: float,
+    repeat: int,
+    no_memory: bool,  # noqa: FBT001
+    save: Path | None,
+    baseline: Path | None,
+    tolerance: float | None,
+) -> None:
+    """Run the benchmark suite, or only the given benchmarks"""
+    if tolerance is not None and baseline is None:
+        msg = "--tolerance can only be used with --baseline"
+        raise click.UsageError(msg)
+    previous = benchmarks.load(baseline) if baseline else {}
+
+    click.echo(benchmarks.format_header(baseline=bool(previous)))
+    results = []
+    regressions = []
+    for result in benchmarks.run_suite(list(names), scale=scale, repeat=repeat, memory=not no_memory):
+        results.append(result)
+        if (old := previous.get(result.name)) is not None and old.scale != result.scale:
+            old = None
+        click.echo(benchmarks.format_result(result, old))
+        if old is not None and tolerance is not None and result.time > old.time * (1 + tolerance):
+            regressions.append(result.name)
+
+    if save:
+        benchmarks.save(results, save)
+    if regressions:
+        click.secho(f"Slower than the baseline: {', '.join(regressions)}", fg="red", bold=True)
+        sys.exit(1)
+
+
+def repl(run_query: Solve, *, max_answers: int | None = None) -> None:
+    # Ask for more answers after each one, unless the queries are piped in
+    more = ask_more if sys.stdin.isatty() else None
     while True:
         try:
             query_str = input(click.style("?- ", fg="yellow"))
-            if (q := try_parse(query_str, head_only=True)) is None:
+            if (q := try_parse(lambda: Parser(query_str).parse_query())) is None:  # noqa: B023
                 continue
 
-            if proofs := list(query(rules, q)):
-                for proof in proofs:
-                    assignments = get_variable_assignments(q, proof)
-                    if not assignments:
-                        click.secho("true.\n", bold=True)
-                        continue
-
-                    output = ",\n".join(f"{variable} = {value}" for variable, value in assignments.items()) + ".\n"
-                    click.echo(output)
-            else:
-                click.secho("false.", fg="red", bold=True)
-
+            print_answers(q, run_query(q), max_answers=max_answers, more=more)
+        except (LimitExceeded, EvaluationError) as e:
+            click.secho(f"Error: {e}", fg="red", bold=True)
         except EOFError:
             break
 
 
-def try_parse(source: str, **kwargs) -> list[Rule] | Rule | None:
+def batch(queries: list[Predicate], output_format: str, run_query: Solve, *, max_answers: int | None = None) -> None:
+    """Run queries one after the other against the same program (and its tables)"""
+    for index, q in enumerate(queries):
+        if output_format == "text":
+            try:
+                print_answers(q, run_query(q), max_answers=max_answers)
+            except (LimitExceeded, EvaluationError) as e:
+                click.secho(f"Error: {e}", fg="red", bold=True)
+            continue
+
+        start = time.perf_counter()
+        count = 0
+        try:
+            for count, proof in enumerate(itertools.islice(run_query(q), max_answers), start=1):
+                bindings = format_bindings(get_variable_assignments(q, proof))
+                write_record({"query": index, "answer": count, "bindings": bindings, "time": elapsed(start)})
+        except LimitExceeded as e:
+            write_record(
+                {
+                    "query": index,
+                    "answers": count,
+                    "time": elapsed(start),
+                    "error": str(e),
+                    "limit": e.limit,
+                    "inferences": e.inferences,
+                    "depth": e.depth,
+                    "choicepoints": e.choicepoints,
+                }
+            )
+            continue
+        except EvaluationError as e:
+            write_record({"query": index, "answers": count, "time": elapsed(start), "error": str(e)})
+            continue
+        write_record({"query": index, "answers": count, "time": elapsed(start)})
+
+
+def solve(
+    program: Program, q: Predicate, *, solver: ParallelSolver | None, limits: Limits, profile: Profile | None
+) -> Iterable[list[dict[Variable, Term]]]:
+    if solver:
+        return solver.query(q, ordered=True)
+    return query(program, q, limits=limits, profile=profile or False)
+
+
+def print_answers(
+    q: Predicate,
+    proofs: Iterable[list[dict[Variable, Term]]],
+    *,
+    max_answers: int | None = None,
+    more: Callable[[], bool] | None = None,
+) -> None:
+    """
+    Print the answers of a query as they are found, up to `max_answers`.
+
+    With `more`, it is called after each answer to tell whether to look for the next one.
+    """
+    count = 0
+    for count, proof in enumerate(proofs, start=1):
+        if assignments := get_variable_assignments(q, proof):
+            click.echo(",\n".join(f"{variable} = {value}" for variable, value in assignments.items()), nl=False)
+        else:
+            click.secho("true", bold=True, nl=False)
+        if count == max_answers or (more is not None and not more()):
+            click.echo(".\n")
+            return
+        click.echo(" ;" if more is not None else ".\n")
+    if count == 0 or more is not None:
+        click.secho("false.", fg="red", bold=True)
+
+
+def ask_more() -> bool:
+    """Read the key pressed after an answer: `;`, `n`, `r`, space or tab for the next one, anything else to stop"""
+    return click.getchar() in {";", "n", "r", " ", "\t"}
+
+
+def format_bindings(bindings: dict[Variable, Term]) -> dict[str, str]:
+    return {str(variable): str(value) for variable, value in bindings.items()}
+
+
+def elapsed(start: float) -> float:
+    return round(time.perf_counter() - start, 6)
+
+
+def write_record(record: dict) -> None:
+    """Print a JSON record, flushed right away so that consumers can process it while the batch is running"""
+    click.echo(json.dumps(record))
+    sys.stdout.flush()
+
+
+def add_facts(program: Program, spec: str) -> bool:
+    """Load a `name/arity=file` fact file into the program, several files of the same predicate are combined"""
+    indicator, _, path = spec.partition("=")
+    try:
+        name, arity = parse_indicator(indicator)
+        if (table := program.facts.get((name, arity))) is None:
+            table = FactTable(name, arity)
+        table.load(path)
+        program.add_facts(table)
+    except FactFormatError as e:
+        click.secho(f"Error at line {e.line} of {path}: {e}", fg="red", bold=True)
+        return False
+    except (OSError, ValueError) as e:
+        click.secho(f"Error: {e}", fg="red", bold=True)
+        return False
+    return True
+
+
+def add_sqlite_table(program: Program, spec: str) -> bool:
+    """Bind a predicate to a SQLite table given as `name/arity=file:table`"""
+    indicator, _, source = spec.partition("=")
+    path, _, table = source.rpartition(":")
+    if not path:
+        click.secho(f"Error: expected NAME/ARITY=FILE:TABLE, got {spec}", fg="red", bold=True)
+        return False
+    try:
+        program.add_facts(SqliteTable(indicator, path, table))
+    except (sqlite3.Error, ValueError) as e:
+        click.secho(f"Error: {e}", fg="red", bold=True)
+        return False
+    return True
+
+
+def try_parse(parse: Callable[[], T]) -> T | None:
+    """Run `parse`, printing any syntax error instead of raising it"""
     try:
-        return Parser(source).parse(**kwargs)
+        return parse()
     except LexerError as e:
         click.secho(f"Error at line {e.line} column {e.column}: {e}", fg="red", bold=True)
     except ParseError as e:
@@ -0,0 +1,264 @@
+"""
+Compilation of clauses for the trail engine.
+
+Each clause is compiled once into templates in which the clause variables are replaced by
+numbered slots of a frame. Calling a clause then does not copy it: the head templates are
+matched directly against the goal arguments, a slot is filled with the goal's term on its
+first occurrence and only the parts of the clause which are actually needed are built.
+Fresh variables are thus only created for clauses whose head matches.
+Arithmetic goals are compiled into functions of the frame, see `brolog.arithmetic`.
+"""
+
+from collections.abc import Callable
+
+from brolog.arithmetic import ARITHMETIC, COMPARISONS, FUNCTIONS, IS, EvaluationError, evaluate
+from brolog.objects import (
+    Control,
+    Cut,
+    Function,
+    List,
+    Number,
+    Predicate,
+    Rule,
+    Term,
+    Variable,
+    make_functor,
+    make_number,
+)
+
+
+class Slot:
+    """A clause variable, stored in the frame at `index`"""
+
+    __slots__ = ("index", "name")
+
+    def __init__(self, index: int, name: str) -> None:
+        self.index = index
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"{self.name}@{self.index}"
+
+
+class Struct:
+    """A compound term (or a goal) which contains clause variables"""
+
+    __slots__ = ("type", "functor", "args")
+
+    def __init__(self, type_: type[Function | Predicate], functor: tuple[str, int], args: list) -> None:
+        # The class of the term to build, e.g. Function, List or Predicate
+        self.type = type_
+        self.functor = functor
+        self.args = args
+
+    def __repr__(self) -> str:
+        args = ", ".join(repr(arg) for arg in self.args)
+        return f"{self.functor[0]}({args})"
+
+
+# A template is an atom or a ground term (shared as is), a Slot or a Struct
+Template = Term | Slot | Struct
+
+
+class Arithmetic:
+    """A compiled arithmetic goal, `is/2` or a comparison"""
+
+    __slots__ = ("functor", "args", "expressions", "compare")
+
+    def __init__(self, functor: tuple[str, int], args: list[Template]) -> None:
+        # Interned again when unpickled
+        self.functor = functor = make_functor(*functor)
+        self.args = args
+        # The left side of `is` is unified, not evaluated
+        self.expressions = [compile_expression(arg) for arg in (args[1:] if functor is IS else args)]
+        self.compare = COMPARISONS.get(functor)
+
+    def value(self, frame: list[Term | None]) -> Number:
+        """The value of the right side of `is`"""
+        return make_number(self.expressions[0](frame))
+
+    def holds(self, frame: list[Term | None]) -> bool:
+        """Whether a comparison is true"""
+        left, right = self.expressions
+        return self.compare(left(frame), right(frame))
+
+    def __reduce__(self) -> tuple:
+        # The compiled expressions are closures, they are compiled again when unpickled
+        return (Arithmetic, (self.functor, self.args))
+
+    def __repr__(self) -> str:
+        args = ", ".join(repr(arg) for arg in self.args)
+        return f"{self.functor[0]}({args})"
+
+
+class ArithmeticGoal:
+    """An arithmetic goal of a clause body, evaluated against the frame of the call"""
+
+    __slots__ = ("arithmetic", "frame")
+
+    def __init__(self, arithmetic: Arithmetic, frame: list[Term | None]) -> None:
+        self.arithmetic = arithmetic
+        self.frame = frame
+
+    @property
+    def functor(self) -> tuple[str, int]:
+        return self.arithmetic.functor
+
+    def goal(self) -> Predicate:
+        """The goal as a plain predicate, e.g. to copy it"""
+        return Predicate(name=self.functor[0], args=[build(arg, self.frame) for arg in self.arithmetic.args])
+
+    def __repr__(self) -> str:
+        return repr(self.arithmetic)
+
+
+class Clause:
+    """A compiled rule"""
+
+    __slots__ = ("rule", "nvars", "head", "body")
+
+    def __init__(self, rule: Rule, nvars: int, head: list[Template], body: list[Struct | Cut]) -> None:
+        self.rule = rule
+        # The size of the frame
+        self.nvars = nvars
+        # Templates of the head arguments
+        self.head = head
+        self.body = body
+
+    def __repr__(self) -> str:
+        return repr(self.rule)
+
+
+def compile_term(term: Term | Predicate, slots: dict[Variable, Slot]) -> Template:
+    """
+    Compile a term into a template, assigning slots to new variables.
+
+    The term is walked with an explicit stack so that deeply nested terms do not hit the recursion limit.
+    """
+    compiled = []
+    stack = [(term, False)]
+    while stack:
+        term, expanded = stack.pop()
+        if isinstance(term, Variable):
+            if term not in slots:
+                slots[term] = Slot(len(slots), term.name)
+            compiled.append(slots[term])
+        elif not isinstance(term, Function | Predicate):
+            compiled.append(term)
+        elif not expanded:
+            # Compile the arguments first
+            stack.append((term, True))
+            stack.extend((arg, False) for arg in reversed(term.args))
+        else:
+            args = compiled[len(compiled) - term.arity :]
+            del compiled[len(compiled) - term.arity :]
+            if all(a is b for a, b in zip(args, term.args, strict=True)):
+                # A ground term can be shared by all calls
+                compiled.append(term)
+            else:
+                # Lists are built as cons cells
+                compiled.append(Struct(List if isinstance(term, List) else type(term), term.functor, args))
+    return compiled[0]
+
+
+def compile_goal(goal: Predicate, slots: dict[Variable, Slot]) -> Template | Arithmetic:
+    """Compile a body goal, the goals of control constructs are compiled as well"""
+    if isinstance(goal, Cut) or (isinstance(goal, Control) and not goal.args):
+        return goal
+    if isinstance(goal, Control):
+        return Struct(Control, goal.functor, [compile_goal(arg, slots) for arg in goal.args])
+    if goal.functor in ARITHMETIC:
+        return Arithmetic(goal.functor, [compile_term(arg, slots) for arg in goal.args])
+    return compile_term(goal, slots)
+
+
+def compile_clause(rule: Rule) -> Clause:
+    """Compile the head arguments and body goals of a rule, numbering its variables in order of occurrence."""
+    slots = {}
+    head = [compile_term(arg, slots) for arg in rule.head.args]
+    body = [compile_goal(goal, slots) for goal in rule.body]
+    return Clause(rule, len(slots), head, body)
+
+
+def compile_arithmetic(goal: Predicate) -> tuple[Arithmetic, list[Term]]:
+    """Compile an arithmetic goal built at runtime (e.g. a query), returns it with its frame"""
+    slots = {}
+    arithmetic = Arithmetic(goal.functor, [compile_term(arg, slots) for arg in goal.args])
+    # Slots are numbered in order of insertion
+    return arithmetic, list(slots)
+
+
+# A compiled expression, or a constant if it does not depend on the frame
+Expression = Callable[[list[Term | None]], float] | float
+
+
+def compile_expression(template: Template) -> Callable[[list[Term | None]], float]:
+    """Compile an arithmetic expression into a function of the frame of a call, folding constants"""
+    expression = compile_subexpression(template)
+    if callable(expression):
+        return expression
+    return lambda _frame: expression
+
+
+def compile_subexpression(template: Template) -> Expression:  # noqa: PLR0911
+    if isinstance(template, Slot):
+        index = template.index
+        return lambda frame: evaluate(frame[index])
+
+    if isinstance(template, Struct):
+        if template.type is not Function or (f := FUNCTIONS.get(template.functor)) is None:
+            # Not an expression, raise when evaluated
+            term = Function(template.functor[0], [None] * len(template.args))
+            return lambda _frame: evaluate(term)
+        args = [compile_subexpression(arg) for arg in template.args]
+        if len(args) == 1:
+            (arg,) = args
+            return lambda frame: f(arg(frame))
+        left, right = args
+        if not callable(left):
+            return lambda frame: f(left, right(frame))
+        if not callable(right):
+            return lambda frame: f(left(frame), right)
+        return lambda frame: f(left(frame), right(frame))
+
+    # A number, an atom or a ground term
+    try:
+        return evaluate(template)
+    except EvaluationError:
+        return lambda _frame: evaluate(template)
+
+
+def build_goal(template: Template | Arithmetic, frame: list[Term | None]) -> Predicate | ArithmeticGoal:
+    if isinstance(template, Arithmetic):
+        return ArithmeticGoal(template, frame)
+    if isinstance(template, Struct) and template.type is Control:
+        return Control(template.functor[0], [build_goal(arg, frame) for arg in template.args])
+    return build(template, frame)
+
+
+def build(template: Template, frame: list[Term | None]) -> Term | Predicate:
+    """Build the term described by `template`, creating fresh variables for the slots which are still empty."""
+    if isinstance(template, Slot):
+        return fill(template, frame)
+    if not isinstance(template, Struct):
+        return template
+
+    root = template.type(name=template.functor[0], args=[None] * len(template.args))
+    stack = [(template.args, root.args)]
+    while stack:
+        src, dst = stack.pop()
+        for i, arg in enumerate(src):
+            if isinstance(arg, Slot):
+                dst[i] = fill(arg, frame)
+            elif isinstance(arg, Struct):
+                dst[i] = arg.type(name=arg.functor[0], args=[None] * len(arg.args))
+                stack.append((arg.args, dst[i].args))
+            else:
+                dst[i] = arg
+    return root
+
+
+def fill(slot: Slot, frame: list[Term | None]) -> Term:
+    if frame[slot.index] is None:
+        frame[slot.index] = Variable(slot.name)
+    return frame[slot.index]
@@ -0,0 +1,118 @@
+"""
+The dynamic database: `assertz/1`, `asserta/1` and `retract/1`.
+
+Clauses are passed as terms, e.g. `assertz(edge(a, b))` or `assertz((path(X, Y) :- edge(X, Y)))`, and are
+added to (or removed from) the program of the running query, whose clause index is updated in place.
+A call which has already started is not affected, it sees the clauses as they were when it was made
+(logical update view).
+"""
+
+from brolog.arithmetic import EvaluationError
+from brolog.compiler import Clause
+from brolog.lists import Solutions
+from brolog.objects import Atom, Control, Cut, Function, List, Predicate, Rule, Term, Variable, deref, make_functor
+from brolog.program import Program
+
+
+ASSERTZ = make_functor("assertz", 1)
+ASSERTA = make_functor("asserta", 1)
+RETRACT = make_functor("retract", 1)
+NECK = make_functor(":-", 2)
+
+# The functors of the control constructs whose arguments are goals
+CONTROL = frozenset([make_functor(",", 2), make_functor(";", 2), make_functor("->", 2), make_functor("\\+", 1)])
+TRUE = Atom("true")
+
+
+def as_goal(term: Term) -> Predicate:
+    """Convert a term to the goal it denotes, e.g. `(a(X), \\+ b(X))` to a conjunction"""
+    term = deref(term)
+    match term:
+        case Variable():
+            msg = "Instantiation error: a goal is not sufficiently instantiated"
+            raise EvaluationError(msg)
+        case Atom(name="!"):
+            return Cut()
+        case Atom(name="true" | "fail"):
+            return Control(term.name, [])
+        case Atom():
+            return Predicate(term.name, [])
+        case Function() if term.functor in CONTROL:
+            return Control(term.name, [as_goal(arg) for arg in term.args])
+        case Function() if not isinstance(term, List):
+            return Predicate(term.name, term.args)
+    msg = f"Type error: callable expected, found {term}"
+    raise EvaluationError(msg)
+
+
+def as_term(goal: Predicate) -> Term:
+    """Convert a goal back to a term, the inverse of `as_goal`"""
+    if not goal.args:
+        return Atom(goal.name)
+    return Function(goal.name, [as_term(arg) if isinstance(arg, Predicate) else arg for arg in goal.args])
+
+
+def as_clause(term: Term) -> Function:
+    """Return the clause term `Head :- Body` of a rule or a fact (whose body is `true`)"""
+    term = deref(term)
+    if isinstance(term, Function) and term.functor is NECK:
+        return term
+    return Function(":-", [term, TRUE])
+
+
+def as_rule(term: Term) -> Rule:
+    """Convert a clause term to a rule"""
+    head, body = as_clause(term).args
+    head = as_goal(head)
+    if isinstance(head, Control | Cut):
+        msg = f"Permission error: cannot modify the control construct {head}"
+        raise EvaluationError(msg)
+
+    goals = []
+    body = as_goal(body)
+    while isinstance(body, Control) and body.name == ",":
+        goals.append(body.args[0])
+        body = body.args[1]
+    if goals or not (isinstance(body, Control) and body.name == "true"):
+        goals.append(body)
+    return Rule(head=head, body=goals)
+
+
+def clause_term(rule: Rule) -> Function:
+    """The clause term of a rule, what `retract/1` unifies with"""
+    if not rule.body:
+        return Function(":-", [as_term(rule.head), TRUE])
+    body = as_term(rule.body[-1])
+    for goal in reversed(rule.body[:-1]):
+        body = Function(",", [as_term(goal), body])
+    return Function(":-", [as_term(rule.head), body])
+
+
+def assertz(program: Program, term: Term) -> Solutions:
+    """Add a clause after the clauses of its predicate, `term` must not contain bound variables"""
+    program.add(dynamic_rule(program, term))
+    return [[]]
+
+
+def asserta(program: Program, term: Term) -> Solutions:
+    """Add a clause before the clauses of its predicate, `term` must not contain bound variables"""
+    program.add(dynamic_rule(program, term), front=True)
+    return [[]]
+
+
+def dynamic_rule(program: Program, term: Term) -> Rule:
+    rule = as_rule(term)
+    if rule.head.functor in program.facts:
+        msg = f"Permission error: {rule.head.name}/{rule.head.arity} is a fact table"
+        raise EvaluationError(msg)
+    return rule
+
+
+# The builtins which add a clause
+ASSERT = {ASSERTZ: assertz, ASSERTA: asserta}
+
+
+def retract_candidates(program: Program, term: Term) -> list[Clause]:
+    """The clauses which `retract(term)` may remove, the engine removes the first one which unifies"""
+    head = as_goal(as_clause(term).args[0])
+    return program.lookup(head.functor, deref(head.args[0]) if head.args else None)
@@ -0,0 +1,707 @@
+"""
+Trail-based solver.
+
+Unlike the substitution engine in `brolog.solver`, variables are bound in place (`Variable.ref`)
+and every binding is recorded on a trail so that it can be undone on backtracking.
+Reading the value of a variable means following its chain of bindings (dereferencing).
+"""
+
+import itertools
+import sys
+import time
+from collections.abc import Callable, Generator, Iterable, Iterator, Sequence
+from typing import NoReturn
+
+from brolog.aggregates import AGGREGATES
+from brolog.arithmetic import ARITHMETIC
+from brolog.compiler import (
+    Arithmetic,
+    ArithmeticGoal,
+    Clause,
+    Slot,
+    Struct,
+    Template,
+    build,
+    build_goal,
+    compile_arithmetic,
+)
+from brolog.database import ASSERT, RETRACT, as_clause, as_goal, clause_term, retract_candidates
+from brolog.limits import CHECK_INTERVAL, LimitExceeded, Limits
+from brolog.lists import BUILTINS, LIBRARY
+from brolog.objects import (
+    ArrayList,
+    Atom,
+    Control,
+    Cut,
+    Function,
+    Number,
+    Predicate,
+    Term,
+    Variable,
+    deref,
+    next_variable_serial,
+    variant_key,
+)
+from brolog.program import Program
+from brolog.tabling import Table
+
+
+def copy_term(term: Term | Predicate, leaf: Callable[[Term], Term]) -> Term | Predicate:
+    """
+    Copy a (possibly bound) term, replacing atoms and unbound variables with `leaf(term)`.
+
+    The term is walked with an explicit stack so that deeply nested terms (e.g. long lists)
+    do not hit the recursion limit. Without the occurs check, a term can be cyclic (e.g. `X = f(X)`):
+    a variable met again inside its own value is passed to `leaf` instead of being expanded again.
+    """
+    variables = ()
+    if isinstance(term, Variable) and term.ref is not None:
+        term, variables = bound_value(term, set())
+    if not isinstance(term, Function | Predicate):
+        return copy_term(term.goal(), leaf) if isinstance(term, ArithmeticGoal) else leaf(term)
+
+    root, src, dst = empty_copy(term)
+    stack = [(src, dst, variables)]
+    # The bound variables whose values are being copied
+    active = set()
+    while stack:
+        src, dst, variables = stack.pop()
+        if src is None:
+            # Done with the value of these variables
+            active.difference_update(variables)
+            continue
+        if variables:
+            active.update(variables)
+            stack.append((None, None, variables))
+        for i, arg in enumerate(src):
+            variables = ()
+            if isinstance(arg, Variable) and arg.ref is not None:
+                arg, variables = bound_value(arg, active)  # noqa: PLW2901
+                if variables is None:
+                    dst[i] = leaf(arg)
+                    continue
+            # Goals are the arguments of control constructs
+            if isinstance(arg, Function | Predicate) and arg.arity:
+                dst[i], *arg_pair = empty_copy(arg)
+                stack.append((*arg_pair, variables))
+            else:
+                dst[i] = copy_term(arg.goal(), leaf) if isinstance(arg, ArithmeticGoal) else leaf(arg)
+    return root
+
+
+def bound_value(var: Variable, active: set[Variable]) -> tuple[Term, list[Variable] | None]:
+    """
+    The value of a bound variable and the variables followed to reach it.
+
+    If one of them is in `active`, the value contains itself: that variable is returned with `None` instead.
+    """
+    term = var
+    variables = []
+    while isinstance(term, Variable) and term.ref is not None:
+        if term in active:
+            return term, None
+        variables.append(term)
+        term = term.ref
+    return term, variables
+
+
+def empty_copy(term: Function | Predicate) -> tuple[Function | Predicate, Iterable[Term], list[Term | None]]:
+    """A copy of a compound term with its arguments still to be filled in: the copy, the arguments and their slots"""
+    if term.__class__ is ArrayList:
+        # Keep the array, its elements and tail are the arguments
+        copy = ArrayList([None] * (len(term.cells) - term.start))
+        return copy, itertools.islice(term.cells, term.start, None), copy.cells
+    copy = type(term)(name=term.name, args=[None] * term.arity)
+    return copy, term.args, copy.args
+
+
+def resolve(term: Term) -> Term:
+    """Return a copy of `term` with all bound variables replaced by their values."""
+    return copy_term(term, lambda t: t)
+
+
+def renamer(variables: dict[Variable, Variable]) -> Callable[[Term], Term]:
+    """Return a `copy_term` leaf function which replaces each variable with a fresh one."""
+
+    def _rename(term: Term) -> Term:
+        if isinstance(term, Variable):
+            if term not in variables:
+                variables[term] = Variable(term.name)
+            return variables[term]
+        return term
+
+    return _rename
+
+
+def zip_lists(x: ArrayList, y: ArrayList) -> list[tuple[Term, Term]]:
+    """The pairs of terms to unify to unify two lists, their elements are paired without building cons cells"""
+    n = min(len(x), len(y))
+    pairs = list(zip(x.cells[x.start : x.start + n], y.cells[y.start : y.start + n], strict=True))
+    pairs.append((x.drop(n), y.drop(n)))
+    return pairs
+
+
+def occurs(var: Variable, term: Term) -> bool:
+    stack = [term]
+    while stack:
+        term = deref(stack.pop())
+        if term is var:
+            return True
+        if isinstance(term, Function):
+            stack.extend(term.args)
+    return False
+
+
+class CutBarrier:
+    """A cut in a clause body, remembering the height of the choicepoint stack when its clause was called."""
+
+    __slots__ = ("height",)
+
+    def __init__(self, height: int) -> None:
+        self.height = height
+
+    def __repr__(self) -> str:
+        return "!"
+
+
+def scope_cuts(goal: Predicate | CutBarrier, height: int) -> Predicate | CutBarrier:
+    """
+    Replace the cuts of a goal by barriers at `height`.
+
+    The cuts in the condition of an if-then and in a negation are local to it, they are scoped when it is called.
+    """
+    if isinstance(goal, Cut):
+        return CutBarrier(height)
+    if not isinstance(goal, Control) or goal.name == "\\+" or not goal.args:
+        return goal
+    if goal.name == "->":
+        return Control("->", [goal.args[0], scope_cuts(goal.args[1], height)])
+    return Control(goal.name, [scope_cuts(arg, height) for arg in goal.args])
+
+
+def has_cut(goal: Predicate | CutBarrier) -> bool:
+    """Whether a goal is a cut or contains one which cuts its clause"""
+    if isinstance(goal, Cut | CutBarrier):
+        return True
+    if isinstance(goal, Control) and goal.name != "\\+":
+        args = goal.args[1:] if goal.name == "->" else goal.args
+        return any(has_cut(arg) for arg in args)
+    return False
+
+
+class Goals:
+    """An immutable linked list of goals. Clause bodies are prepended without copying the rest."""
+
+    __slots__ = ("goal", "depth", "next")
+
+    def __init__(self, goal: Predicate | CutBarrier, depth: int, next: "Goals | None") -> None:  # noqa: A002
+        self.goal = goal
+        self.depth = depth
+        self.next = next
+
+
+class ChoicePoint:
+    """The state needed to resume a call with its remaining alternatives (clauses or tabled answers)."""
+
+    __slots__ = ("goals", "alternatives", "index", "resume", "trail_mark", "var_mark")
+
+    def __init__(  # noqa: PLR0913
+        self,
+        goals: Goals,
+        alternatives: list,
+        index: int,
+        resume: Callable[[Goals, list, int, int], "Goals | None"],
+        trail_mark: int,
+        var_mark: int,
+    ) -> None:
+        # The goal list starting with the call itself
+        self.goals = goals
+        self.alternatives = alternatives
+        # The next alternative to try
+        self.index = index
+        # Engine method which tries the alternatives
+        self.resume = resume
+        self.trail_mark = trail_mark
+        # Variables created before this choicepoint must be trailed when bound
+        self.var_mark = var_mark
+
+
+# Marks a failed resolution step, as opposed to `None` which is an empty goal list
+FAIL = object()
+
+# A goal which always fails
+FAIL_GOAL = Control("fail", [])
+
+# Yielded instead of an answer when the engine pauses, see `Engine.loop`
+PAUSE = object()
+
+
+class Engine:
+    """
+    An iterative solver with an explicit goal list and choicepoint stack.
+
+    A derivation of any depth runs in constant Python stack. Goals are kept in a linked list
+    so that the last goal of a clause body is called with the continuation of its parent
+    (last-call optimization) and a call with no alternative clauses left does not leave
+    a choicepoint behind. Bindings are only trailed if a choicepoint may need to undo them,
+    so deterministic tail-recursive predicates run in bounded memory.
+    """
+
+    def __init__(self, program: Program, *, occurs_check: bool = False, limits: Limits | None = None) -> None:
+        self.program = program
+        # Check that a variable does not occur in the term it is bound to, off by default like in standard Prolog
+        self.occurs_check = occurs_check
+        self.limits = limits or Limits()
+        # The limits checked on every call, as plain integers
+        self.max_depth = sys.maxsize if self.limits.max_depth is None else self.limits.max_depth
+        self.max_choicepoints = sys.maxsize if self.limits.max_choicepoints is None else self.limits.max_choicepoints
+        self.start = time.monotonic()
+        self.trail: list[Variable] = []
+        self.choicepoints: list[ChoicePoint] = []
+        # Bindings of variables created before `var_mark` must be trailed
+        self.base_var_mark = self.var_mark = 0
+        # Number of resolution steps (calls) so far
+        self.inferences = 0
+
+    def bind(self, var: Variable, term: Term) -> None:
+        var.ref = term
+        # Variables younger than the newest choicepoint are discarded on backtracking anyway
+        if var.serial < self.var_mark:
+            self.trail.append(var)
+
+    def undo(self, mark: int) -> None:
+        """Undo all bindings made since the trail had length `mark`."""
+        trail = self.trail
+        while len(trail) > mark:
+            trail.pop().ref = None
+
+    def unify(self, x: Term, y: Term) -> bool:  # noqa: C901
+        """
+        Unify two terms by binding variables in place.
+
+        On failure, some bindings may have been made already. It is up to the caller to undo them.
+        """
+        stack = [(x, y)]
+        while stack:
+            x, y = stack.pop()
+            x, y = deref(x), deref(y)
+            if x is y:
+                continue
+            if isinstance(x, Variable):
+                if isinstance(y, Variable) and y.serial > x.serial:
+                    # Bind the younger variable so that it is not trailed needlessly
+                    x, y = y, x
+                elif self.occurs_check and isinstance(y, Function) and occurs(x, y):
+                    return False
+                self.bind(x, y)
+            elif isinstance(y, Variable):
+                if self.occurs_check and isinstance(x, Function) and occurs(y, x):
+                    return False
+                self.bind(y, x)
+            elif isinstance(x, Function) and isinstance(y, Function) and x.functor is y.functor:
+                if x.__class__ is ArrayList and y.__class__ is ArrayList:
+                    stack.extend(zip_lists(x, y))
+                else:
+                    stack.extend(zip(x.args, y.args, strict=True))
+            elif not (isinstance(x, Number) and x == y):
+                # Atoms and functors are interned, they only match if they are the same object
+                return False
+        return True
+
+    def unify_args(self, xs: list[Term], ys: list[Term]) -> bool:
+        return all(self.unify(x, y) for x, y in zip(xs, ys, strict=True))
+
+    def match(self, templates: list[Template], args: list[Term], frame: list[Term | None]) -> bool:  # noqa: C901
+        """
+        Unify compiled head arguments with the arguments of a goal, filling the clause frame.
+
+        Parts of the head are only built when they are matched against an unbound variable.
+        On failure, some bindings may have been made already. It is up to the caller to undo them.
+        """
+        stack = list(zip(templates, args, strict=True))
+        while stack:
+            template, term = stack.pop()
+            if isinstance(template, Slot):
+                # First occurrence of a clause variable, no need to create it
+                if frame[template.index] is None:
+                    frame[template.index] = term
+                elif not self.unify(frame[template.index], term):
+                    return False
+                continue
+
+            term = deref(term)
+            if isinstance(term, Variable):
+                if isinstance(template, Struct):
+                    value = build(template, frame)
+                    if self.occurs_check and occurs(term, value):
+                        return False
+                    self.bind(term, value)
+                else:
+                    # Atoms and ground terms are shared
+                    self.bind(term, template)
+            elif isinstance(template, Struct):
+                if not (isinstance(term, Function) and term.functor is template.functor):
+                    return False
+                stack.extend(zip(template.args, term.args, strict=True))
+            elif template is not term and (isinstance(template, Atom) or not self.unify(template, term)):
+                return False
+        return True
+
+    def solve(self, q: Predicate, *, pause_every: int | None = None) -> Generator[dict[Variable, Term], None, None]:
+        """
+        Prove `q`, yielding the value of each of its variables for every proof.
+
+        The query itself is never bound, the engine works with a renamed copy.
+        With `pause_every`, `PAUSE` is also yielded after every `pause_every` inferences.
+        """
+        variables = {}
+        # A cut in the query prunes all alternatives
+        goal = CutBarrier(0) if isinstance(q, Cut) else scope_cuts(copy_term(q, renamer(variables)), 0)
+        for result in self.run(Goals(goal, 1, None), pause_every=pause_every):
+            yield result if result is PAUSE else {v: resolve(fresh) for v, fresh in variables.items()}
+
+    def reset(self) -> None:
+        self.trail.clear()
+        self.choicepoints.clear()
+        self.base_var_mark = self.var_mark = next_variable_serial()
+        self.inferences = 0
+        self.start = time.monotonic()
+
+    def run(self, goals: Goals | None, *, pause_every: int | None = None) -> Generator[object, None, None]:
+        """Run the machine, yielding each time the goal list is proven. The bindings hold the answer."""
+        self.reset()
+        return self.loop(goals, pause_every=pause_every)
+
+    def loop(self, goals: Goals | None, *, pause_every: int | None = None) -> Generator[object, None, None]:
+        """
+        Yield `None` each time the goal list is proven.
+
+        With `pause_every`, `PAUSE` is also yielded after every `pause_every` inferences
+        so that the caller can interleave other work with a long search.
+        """
+        pause_at = self.inferences + pause_every if pause_every else None
+        check_at = self.next_check(pause_at)
+        while True:
+            if goals is FAIL:
+                if not self.choicepoints:
+                    self.undo(0)
+                    return
+                goals = self.backtrack()
+            elif goals is None:
+                yield
+                goals = FAIL
+            elif isinstance(goals.goal, CutBarrier):
+                self.cut(goals.goal.height)
+                goals = goals.next
+            else:
+                if goals.depth > self.max_depth:
+                    self.limit_exceeded("depth", goals.depth)
+                self.inferences += 1
+                if self.inferences == check_at:
+                    self.check_limits(goals.depth)
+                    if self.inferences == pause_at:
+                        yield PAUSE
+                        pause_at += pause_every
+                    check_at = self.next_check(pause_at)
+                goals = self.call(goals)
+
+    def next_check(self, pause_at: int | None) -> int:
+        """The inference count at which the loop should next pause or check the limits other than depth"""
+        check_at = self.inferences + CHECK_INTERVAL
+        if pause_at is not None:
+            check_at = min(check_at, pause_at)
+        if self.limits.max_inferences is not None:
+            check_at = min(check_at, max(self.limits.max_inferences + 1, self.inferences + 1))
+        return check_at
+
+    def check_limits(self, depth: int) -> None:
+        limits = self.limits
+        if limits.max_inferences is not None and self.inferences > limits.max_inferences:
+            self.limit_exceeded("inferences", depth)
+        if limits.timeout is not None and time.monotonic() - self.start > limits.timeout:
+            self.limit_exceeded("time", depth)
+
+    def limit_exceeded(self, limit: str, depth: int) -> NoReturn:
+        """Raise `LimitExceeded` with the current counters"""
+        raise LimitExceeded(
+            limit,
+            inferences=self.inferences,
+            depth=depth,
+            choicepoints=len(self.choicepoints),
+            elapsed=time.monotonic() - self.start,
+        )
+
+    def call(self, goals: Goals) -> Goals | None:
+        """Resolve the first goal of the goal list and return the new goal list (or `FAIL`)."""
+        goal = goals.goal
+        if goal.__class__ is not Predicate:
+            if isinstance(goal, ArithmeticGoal):
+                return self.call_arithmetic(goals, goal.arithmetic, goal.frame)
+            return self.call_control(goals)
+        if self.program.tabled and goal.functor in self.program.tabled:
+            return self.call_tabled(goals)
+
+        first_arg = deref(goal.args[0]) if goal.args else None
+        clauses = self.program.lookup(goal.functor, first_arg, goal.args)
+        if not clauses and goal.functor not in self.program.predicates:
+            return self.call_builtin(goals, first_arg)
+        return self.resolve_clauses(goals, clauses, 0, len(self.choicepoints))
+
+    def call_builtin(self, goals: Goals, first_arg: Term | None) -> Goals | None:  # noqa: PLR0911
+        """Call a predicate which the program does not define"""
+        goal = goals.goal
+        if (table := self.program.facts.get(goal.functor)) is not None:
+            return self.resolve_solutions(goals, table.solutions(goal.args), 0, len(self.choicepoints))
+        if goal.functor in ARITHMETIC:
+            # Not a clause body goal (e.g. in a query), compile it now
+            return self.call_arithmetic(goals, *compile_arithmetic(goal))
+        if (builtin := BUILTINS.get(goal.functor)) is not None and (solutions := builtin(*goal.args)) is not None:
+            return self.resolve_solutions(goals, solutions, 0, len(self.choicepoints))
+        if (aggregate := AGGREGATES.get(goal.functor)) is not None:
+            return self.resolve_solutions(goals, aggregate(self.collect, *goal.args), 0, len(self.choicepoints))
+        if (assert_ := ASSERT.get(goal.functor)) is not None:
+            # The clause must not change with the bindings of the query
+            return self.resolve_solutions(
+                goals, assert_(self.program, resolve(goal.args[0])), 0, len(self.choicepoints)
+            )
+        if goal.functor is RETRACT:
+            clauses = retract_candidates(self.program, goal.args[0])
+            return self.resolve_retract(goals, clauses, 0, len(self.choicepoints))
+        clauses = LIBRARY.lookup(goal.functor, first_arg, goal.args)
+        return self.resolve_clauses(goals, clauses, 0, len(self.choicepoints))
+
+    def collect(self, template: Term, goal: Term) -> Iterator[Term]:
+        """
+        Prove a goal in a sub-engine, yielding a copy of `template` for each proof (see `brolog.aggregates`).
+
+        The bindings made by the proofs are undone, the cuts of the goal are local to it.
+        """
+        engine = self.sub_engine()
+        engine.reset()
+        # The limits apply to the query as a whole
+        engine.inferences, engine.start = self.inferences, self.start
+        try:
+            for _ in engine.loop(Goals(scope_cuts(as_goal(goal), 0), 1, None)):
+                yield copy_term(template, renamer({}))
+        finally:
+            self.inferences = engine.inferences
+            engine.undo(0)
+
+    def resolve_solutions(
+        self, goals: Goals, solutions: Sequence[list[tuple[Term, Term]]], index: int, height: int
+    ) -> Goals | None:
+        """
+        Like `resolve_clauses`, for the solutions of a builtin: the pairs of terms to unify.
+
+        The length of the solutions is checked after each one is read, a `Stream` only knows it at its end.
+        """
+        mark = len(self.trail)
+        i = index
+        while i < len(solutions):
+            pairs = solutions[i]
+            if i + 1 < len(solutions):
+                self.push_choicepoint(goals, solutions, i + 1, self.resolve_solutions, mark, height)
+            elif len(self.choicepoints) > height:
+                self.cut(height)
+
+            if all(self.unify(x, y) for x, y in pairs):
+                return goals.next
+            self.undo(mark)
+            i += 1
+        return FAIL
+
+    def resolve_retract(self, goals: Goals, clauses: list[Clause], index: int, height: int) -> Goals | None:
+        """Like `resolve_clauses`, but remove the first clause which unifies with the argument of `retract/1`"""
+        pattern = as_clause(goals.goal.args[0])
+        mark = len(self.trail)
+        for i in range(index, len(clauses)):
+            if i + 1 < len(clauses):
+                self.push_choicepoint(goals, clauses, i + 1, self.resolve_retract, mark, height)
+            elif len(self.choicepoints) > height:
+                self.cut(height)
+
+            clause = clauses[i]
+            # A clause which is already removed cannot be retracted again
+            if self.unify(pattern, copy_term(clause_term(clause.rule), renamer({}))) and self.program.remove(clause):
+                return goals.next
+            self.undo(mark)
+        return FAIL
+
+    def call_arithmetic(self, goals: Goals, arithmetic: Arithmetic, frame: list[Term | None]) -> Goals | None:
+        """Evaluate `is/2` or a comparison against the frame of its clause"""
+        if arithmetic.compare is None:
+            value = arithmetic.value(frame)
+            return goals.next if self.unify(build(arithmetic.args[0], frame), value) else FAIL
+        return goals.next if arithmetic.holds(frame) else FAIL
+
+    def resolve_clauses(self, goals: Goals, clauses: list[Clause], index: int, height: int) -> Goals | None:
+        """
+        Resolve the first goal with the first matching clause starting at `index`.
+
+        If there are clauses left to try afterwards, a choicepoint is kept on top of the stack,
+        otherwise the stack is truncated to `height`.
+        """
+        goal = goals.goal
+        mark = len(self.trail)
+        for i in range(index, len(clauses)):
+            if i + 1 < len(clauses):
+                self.push_choicepoint(goals, clauses, i + 1, self.resolve_clauses, mark, height)
+            elif len(self.choicepoints) > height:
+                # Last alternative, discard the choicepoint
+                self.cut(height)
+
+            clause = clauses[i]
+            frame = [None] * clause.nvars
+            if self.match(clause.head, goal.args, frame):
+                depth = goals.depth + 1
+                new_goals = goals.next
+                for p in reversed(clause.body):
+                    if isinstance(p, Cut):
+                        body_goal = CutBarrier(height)
+                    elif isinstance(body_goal := build_goal(p, frame), Control):
+                        body_goal = scope_cuts(body_goal, height)
+                    new_goals = Goals(body_goal, depth, new_goals)
+                return new_goals
+            self.undo(mark)
+        return FAIL
+
+    def call_control(self, goals: Goals) -> Goals | None:  # noqa: PLR0911
+        """Run a control construct, its goals are called at the same depth"""
+        goal = goals.goal
+        match goal.name:
+            case "true":
+                return goals.next
+            case "fail":
+                return FAIL
+            case ",":
+                return Goals(goal.args[0], goals.depth, Goals(goal.args[1], goals.depth, goals.next))
+            case ";" if isinstance(left := goal.args[0], Control) and left.name == "->":
+                return self.if_then_else(goals, *left.args, goal.args[1])
+            case ";":
+                return self.resolve_branches(goals, [goal.args[:1], goal.args[1:]], 0, len(self.choicepoints))
+            case "->":
+                return self.if_then_else(goals, *goal.args, FAIL_GOAL)
+            case "\\+":
+                return self.if_then_else(goals, goal.args[0], FAIL_GOAL, None)
+
+    def if_then_else(
+        self, goals: Goals, condition: Predicate, then: Predicate, else_: Predicate | None
+    ) -> Goals | None:
+        """
+        Try the else branch (`None` for true) unless the condition succeeds.
+
+        Once the condition succeeds, a barrier cuts its alternatives and the else branch.
+        """
+        height = len(self.choicepoints)
+        branches = [(scope_cuts(condition, height + 1), CutBarrier(height), then), () if else_ is None else (else_,)]
+        return self.resolve_branches(goals, branches, 0, height)
+
+    def resolve_branches(self, goals: Goals, branches: list[tuple], index: int, height: int) -> Goals | None:
+        """Replace the first goal with the goals of the branch at `index`, keeping a choicepoint for the others."""
+        if index + 1 < len(branches):
+            self.push_choicepoint(goals, branches, index + 1, self.resolve_branches, len(self.trail), height)
+        elif len(self.choicepoints) > height:
+            self.cut(height)
+
+        new_goals = goals.next
+        for goal in reversed(branches[index]):
+            new_goals = Goals(goal, goals.depth, new_goals)
+        return new_goals
+
+    def push_choicepoint(  # noqa: PLR0913
+        self,
+        goals: Goals,
+        alternatives: list,
+        index: int,
+        resume: Callable[[Goals, list, int, int], Goals | None],
+        mark: int,
+        height: int,
+    ) -> None:
+        if len(self.choicepoints) > height:
+            # Retry, reuse the choicepoint
+            self.choicepoints[-1].index = index
+            return
+        if len(self.choicepoints) >= self.max_choicepoints:
+            self.limit_exceeded("choicepoints", goals.depth)
+        self.var_mark = next_variable_serial()
+        self.choicepoints.append(ChoicePoint(goals, alternatives, index, resume, mark, self.var_mark))
+
+    def backtrack(self) -> Goals | None:
+        """Resume the most recent choicepoint with alternatives left."""
+        while self.choicepoints:
+            cp = self.choicepoints[-1]
+            self.undo(cp.trail_mark)
+            goals = cp.resume(cp.goals, cp.alternatives, cp.index, len(self.choicepoints) - 1)
+            if goals is not FAIL:
+                return goals
+        return FAIL
+
+    def cut(self, height: int) -> None:
+        """Discard all choicepoints above `height`."""
+        del self.choicepoints[height:]
+        self.var_mark = self.choicepoints[-1].var_mark if self.choicepoints else self.base_var_mark
+
+    def call_tabled(self, goals: Goals) -> Goals | None:
+        """Call a tabled predicate, evaluating its answer table first if needed."""
+        goal = goals.goal
+        tables = self.program.tables
+        key = variant_key(goal)
+        table = tables.lookup(key)
+        if table is None or (not table.complete and table.position is None):
+            table = self.evaluate_table(goal, key)
+        elif not table.complete:
+            # A recursive variant call, consume the answers found so far
+            tables.depend_on(table)
+        return self.resolve_answers(goals, table.answers, 0, len(self.choicepoints))
+
+    def evaluate_table(self, goal: Predicate, key: tuple) -> Table:
+        """Collect the answers of a tabled call, re-evaluating its clauses until no new answers are found."""
+        tables = self.program.tables
+        table = tables.start(key)
+        goal = copy_term(goal, renamer({}))
+        clauses = self.program.lookup(goal.functor, goal.args[0] if goal.args else None, goal.args)
+        try:
+            while True:
+                added = tables.answers_added
+                engine = self.sub_engine()
+                engine.reset()
+                # The limits apply to the query as a whole
+                engine.inferences, engine.start = self.inferences, self.start
+                try:
+                    for _ in engine.loop(engine.resolve_clauses(Goals(goal, 1, None), clauses, 0, 0)):
+                        args = [resolve(arg) for arg in goal.args]
+                        tables.add_answer(table, args, variant_key(args))
+                finally:
+                    self.inferences = engine.inferences
+                if tables.answers_added == added:
+                    break
+        except BaseException:
+            tables.abandon()
+            raise
+        tables.finish(table)
+        return table
+
+    def sub_engine(self) -> "Engine":
+        """A new engine with the same settings, used to evaluate tables and the goals of `collect` (`findall/3` etc.)"""
+        return Engine(self.program, occurs_check=self.occurs_check, limits=self.limits)
+
+    def resolve_answers(
+        self, goals: Goals, answers: list[tuple[list[Term], bool]], index: int, height: int
+    ) -> Goals | None:
+        """Unify the first goal with the first matching tabled answer starting at `index`."""
+        goal = goals.goal
+        mark = len(self.trail)
+        for i in range(index, len(answers)):
+            if i + 1 < len(answers):
+                self.push_choicepoint(goals, answers, i + 1, self.resolve_answers, mark, height)
+            elif len(self.choicepoints) > height:
+                self.cut(height)
+
+            args, ground = answers[i]
+            if not ground:
+                _rename = renamer({})
+                args = [copy_term(arg, _rename) for arg in args]
+            if self.unify_args(goal.args, args):
+                return goals.next
+            self.undo(mark)
+        return FAIL
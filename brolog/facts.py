@@ -0,0 +1,221 @@
+"""
+Columnar storage for large tables of ground facts, loaded from CSV, TSV or JSON lines files.
+
+Rows are not parsed as Prolog: each value becomes an atom or a number and is stored as an integer code
+in one compact array per column. A call to the predicate enumerates the matching rows directly, using a
+hash index of a column whose argument is bound (built the first time it is needed), and unifies the
+unbound arguments with the values of each row.
+
+    program.add_facts(load_facts("edge/2", "edges.csv"))
+"""
+
+import csv
+import json
+import re
+from array import array
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from brolog.lists import Choices, Solutions
+from brolog.objects import Atom, Float, Int, Number, Term, Variable, deref, make_functor
+
+
+INTEGER = re.compile(r"-?\d+")
+FLOAT = re.compile(r"-?\d+\.\d+(?:[eE][+-]?\d+)?")
+
+FORMATS = {".csv": "csv", ".tsv": "tsv", ".tab": "tsv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+# Row numbers and value codes
+CODE = "I"
+
+
+class FactFormatError(ValueError):
+    def __init__(self, message: str, *, line: int) -> None:
+        super().__init__(message)
+        self.line = line
+
+
+class FactTable:
+    """
+    The ground facts of a single predicate (name/arity), stored column-wise.
+
+    Each distinct value is stored once in `terms`, the columns hold its index (code).
+    The index of a column maps a code to the row with that value, or to an array of rows if there are several.
+    """
+
+    def __init__(self, name: str, arity: int) -> None:
+        if arity < 1:
+            msg = f"A fact table needs at least one column, got {name}/{arity}"
+            raise ValueError(msg)
+        self.functor = make_functor(name, arity)
+        self.terms: list[Term] = []
+        self.codes: dict[Term, int] = {}
+        self.columns = [array(CODE) for _ in range(arity)]
+        self.indexes: list[dict[int, int | array] | None] = [None] * arity
+
+    @property
+    def name(self) -> str:
+        return self.functor[0]
+
+    @property
+    def arity(self) -> int:
+        return self.functor[1]
+
+    def __len__(self) -> int:
+        return len(self.columns[0])
+
+    def code(self, value: Term) -> int:
+        if (code := self.codes.get(value)) is None:
+            code = self.codes[value] = len(self.terms)
+            self.terms.append(value)
+        return code
+
+    def add(self, row: list[Term]) -> None:
+        """Add a fact, its arguments must be atoms or numbers"""
+        if len(row) != self.arity or not all(isinstance(value, Atom | Number) for value in row):
+            msg = f"Expected {self.arity} atoms or numbers, got {row}"
+            raise ValueError(msg)
+        for column, value in zip(self.columns, row, strict=True):
+            column.append(self.code(value))
+        self.indexes = [None] * self.arity
+
+    def load(self, path: str | Path, *, file_format: str | None = None, header: bool = False) -> None:
+        """
+        Add the rows of a file, one fact per row.
+
+        The format (`csv`, `tsv` or `jsonl`) is guessed from the file extension unless given.
+        In CSV and TSV files, values which look like integers or floats are numbers and anything else is an atom.
+        A JSON line is an array of strings (atoms) and numbers. With `header=True`, the first row is skipped.
+        """
+        path = Path(path)
+        if file_format is None and (file_format := FORMATS.get(path.suffix.lower())) is None:
+            msg = f"Unknown fact file format: {path.name}, expected one of {', '.join(FORMATS)}"
+            raise ValueError(msg)
+
+        with path.open(newline="") as f:
+            rows = read_rows(f, file_format)
+            if header:
+                next(rows, None)
+            self.extend(rows)
+
+    def extend(self, rows: Iterable[tuple[int, list[str | Term]]]) -> None:
+        """Add rows of values, numbered by their line. Strings are converted to atoms or numbers."""
+        # Caches the code of each value so that repeated strings are only converted once
+        raw_codes: dict[str | Term, int] = {}
+        arity, columns = self.arity, self.columns
+        for line, row in rows:
+            if len(row) != arity:
+                msg = f"Expected {arity} values, got {len(row)}"
+                raise FactFormatError(msg, line=line)
+            for column, raw in zip(columns, row, strict=True):
+                if (code := raw_codes.get(raw)) is None:
+                    code = raw_codes[raw] = self.code(parse_value(raw) if isinstance(raw, str) else raw)
+                column.append(code)
+        self.indexes = [None] * arity
+
+    def index(self, column: int) -> dict[int, int | array]:
+        """The index of a column, built on first use"""
+        if (index := self.indexes[column]) is None:
+            index = self.indexes[column] = {}
+            for row, code in enumerate(self.columns[column]):
+                if (rows := index.get(code)) is None:
+                    index[code] = row
+                elif isinstance(rows, int):
+                    index[code] = array(CODE, [rows, row])
+                else:
+                    rows.append(row)
+        return index
+
+    def solutions(self, args: list[Term]) -> Solutions:
+        """The rows matching a call, as the pairs of terms to unify (see `brolog.lists`)"""
+        args = [deref(arg) for arg in args]
+        bound = []
+        for i, arg in enumerate(args):
+            if isinstance(arg, Variable):
+                continue
+            if not isinstance(arg, Atom | Number) or (code := self.codes.get(arg)) is None:
+                # The table only holds atoms and numbers
+                return []
+            bound.append((i, code))
+
+        rows: range | list[int] | array = range(len(self))
+        for i, code in bound:
+            match self.index(i).get(code):
+                case None:
+                    return []
+                case int(row):
+                    candidates = [row]
+                case candidates:
+                    pass
+            if len(candidates) < len(rows):
+                rows = candidates
+        if len(bound) > 1:
+            # Only keep the rows which match all bound arguments
+            rows = [row for row in rows if all(self.columns[i][row] == code for i, code in bound)]
+
+        terms, columns = self.terms, self.columns
+        unbound = [(arg, columns[i]) for i, arg in enumerate(args) if isinstance(arg, Variable)]
+        return Choices(len(rows), lambda k: [(arg, terms[column[rows[k]]]) for arg, column in unbound])
+
+
+def read_rows(lines: Iterable[str], file_format: str) -> Iterator[tuple[int, list[str | Term]]]:
+    """Read the values of each row, along with its line number"""
+    if file_format == "jsonl":
+        for line, text in enumerate(lines, 1):
+            if text.strip():
+                try:
+                    row = json.loads(text)
+                except json.JSONDecodeError as e:
+                    raise FactFormatError(str(e), line=line) from e
+                if not isinstance(row, list):
+                    msg = f"Expected a JSON array, got {text.strip()}"
+                    raise FactFormatError(msg, line=line)
+                yield line, [json_value(value, line) for value in row]
+        return
+    if file_format not in {"csv", "tsv"}:
+        msg = f"Unknown fact file format: {file_format}"
+        raise ValueError(msg)
+    reader = csv.reader(lines, delimiter="," if file_format == "csv" else "\t")
+    for row in reader:
+        if row:
+            yield reader.line_num, row
+
+
+def parse_value(text: str) -> Term:
+    """Convert a CSV value to an atom or a number, strings which look like numbers are numbers"""
+    if INTEGER.fullmatch(text):
+        return Int(int(text))
+    if FLOAT.fullmatch(text):
+        return Float(float(text))
+    return Atom(text)
+
+
+def json_value(value: object, line: int) -> Term:
+    """Convert a JSON value to an atom or a number, JSON strings are atoms even if they look like numbers"""
+    match value:
+        case str():
+            return Atom(value)
+        case bool():
+            return Atom(str(value).lower())
+        case int():
+            return Int(value)
+        case float():
+            return Float(value)
+    msg = f"Expected a string or a number, got {json.dumps(value)}"
+    raise FactFormatError(msg, line=line)
+
+
+def parse_indicator(indicator: str) -> tuple[str, int]:
+    """Split a predicate indicator, e.g. `edge/2`"""
+    name, _, arity = indicator.rpartition("/")
+    if not name or not arity.isdigit():
+        msg = f"Expected a predicate indicator (name/arity), got {indicator}"
+        raise ValueError(msg)
+    return name, int(arity)
+
+
+def load_facts(indicator: str, path: str | Path, *, file_format: str | None = None, header: bool = False) -> FactTable:
+    """Load a table of facts for the predicate `indicator` (`name/arity`) from a file, see `FactTable.load`"""
+    table = FactTable(*parse_indicator(indicator))
+    table.load(path, file_format=file_format, header=header)
+    return table
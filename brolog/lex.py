@@ -1,14 +1,33 @@
 import re
+from collections.abc import Iterable, Iterator
 from enum import Enum, auto
 from typing import NamedTuple
 
 
 VARIABLE = re.compile(r"[A-Z_][A-Za-z0-9_]*")
+NUMBER = re.compile(r"\d+(?:\.\d+(?:[eE][+-]?\d+)?)?(?![A-Za-z0-9_])")
 NAME = re.compile(r"(?:[a-z0-9][A-Za-z0-9_]*)|!")
-SPECIAL = re.compile(r"[\[\]|().,]|:-")
+# Longer symbols first, e.g. `->` before `-`
+SPECIAL = re.compile(r":-|->|\\\+|=:=|=\\=|=<|>=|<<|>>|\*\*|//|/\\|\\/|[\[\]|().,/;<>+\-*^?]")
 COMMENT = re.compile(r"#.*")
 NL = re.compile(r"\r?\n")
-WS = re.compile(r"\s+")
+WS = re.compile(r"[^\S\n]+")
+
+# All of the above combined into a single pattern, tried in this order
+TOKEN = re.compile(
+    "|".join(
+        f"(?P<{name}>{pattern.pattern})"
+        for name, pattern in [
+            ("nl", NL),
+            ("ws", WS),
+            ("comment", COMMENT),
+            ("variable", VARIABLE),
+            ("number", NUMBER),
+            ("name", NAME),
+            ("special", SPECIAL),
+        ]
+    )
+)
 
 
 class LexerError(Exception):
@@ -20,6 +39,7 @@ class LexerError(Exception):
 
 class TokenType(Enum):
     variable = auto()
+    number = auto()
     name = auto()
     special = auto()
 
@@ -31,29 +51,41 @@ class Token(NamedTuple):
     column: int
 
 
-def tokenize(source: str) -> list[Token]:
-    line, column = 1, 1
-    tokens = []
-    while source:
-        if match := re.match(NL, source):
-            line += 1
-            column = 1
-        elif (match := re.match(WS, source)) or (match := re.match(COMMENT, source)):
-            column += len(match[0])
-        elif match := re.match(VARIABLE, source):
-            _type = TokenType.variable
-            tokens.append(Token(_type, match[0], line, column))
-            column += len(match[0])
-        elif match := re.match(NAME, source):
-            _type = TokenType.name
-            tokens.append(Token(_type, match[0], line, column))
-            column += len(match[0])
-        elif match := re.match(SPECIAL, source):
-            _type = TokenType.special
-            tokens.append(Token(_type, match[0], line, column))
-            column += len(match[0])
-        else:
-            msg = f"Unexpected token: <{source[0]}>"
-            raise LexerError(msg, line=line, column=column)
-        source = source[match.end() :]
-    return tokens
+TOKEN_TYPES = {
+    "variable": TokenType.variable,
+    "number": TokenType.number,
+    "name": TokenType.name,
+    "special": TokenType.special,
+}
+
+
+def iter_tokens(source: str | Iterable[str]) -> Iterator[Token]:
+    """
+    Lazily tokenize a string or an iterable of lines (e.g. a file opened in text mode).
+
+    Each line is scanned once with a single combined pattern so the cost is linear in the size of the source.
+    """
+    lines = [source] if isinstance(source, str) else source
+    line = 1
+    for text in lines:
+        pos, line_start = 0, 0
+        for match in TOKEN.finditer(text):
+            if match.start() != pos:
+                # finditer() skipped over something which is not a token
+                break
+
+            kind = match.lastgroup
+            if kind == "nl":
+                line += 1
+                line_start = match.end()
+            elif (_type := TOKEN_TYPES.get(kind)) is not None:
+                yield Token(_type, match[0], line, pos - line_start + 1)
+            pos = match.end()
+
+        if pos != len(text):
+            msg = f"Unexpected token: <{text[pos]}>"
+            raise LexerError(msg, line=line, column=pos - line_start + 1)
+
+
+def tokenize(source: str | Iterable[str]) -> list[Token]:
+    return list(iter_tokens(source))
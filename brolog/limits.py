@@ -0,0 +1,96 @@
+"""
+Resource limits of a query.
+
+Both engines count their inferences (resolution steps), the depth of the current goal and
+the number of open choicepoints, and check the wall-clock deadline every `CHECK_INTERVAL`
+inferences. A query which exceeds one of its limits raises `LimitExceeded`.
+"""
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import NoReturn
+
+
+# Number of inferences between two checks of the clock
+CHECK_INTERVAL = 1024
+
+
+@dataclass(frozen=True)
+class Limits:
+    """The resources a query may use, `None` means unlimited"""
+
+    max_inferences: int | None = None
+    # The trail engine counts the depth of a goal in the proof tree,
+    # the substitution engine the number of resolution steps of the current branch
+    max_depth: int | None = None
+    max_choicepoints: int | None = None
+    # Wall-clock time in seconds
+    timeout: float | None = None
+
+
+class LimitExceeded(Exception):
+    def __init__(  # noqa: PLR0913
+        self, limit: str, inferences: int, depth: int, choicepoints: int, elapsed: float
+    ) -> None:
+        super().__init__(
+            f"{limit} limit exceeded "
+            f"(inferences: {inferences}, depth: {depth}, choicepoints: {choicepoints}, time: {elapsed:.3f}s)"
+        )
+        # One of "inferences", "depth", "choicepoints" or "time"
+        self.limit = limit
+        self.inferences = inferences
+        self.depth = depth
+        self.choicepoints = choicepoints
+        self.elapsed = elapsed
+
+    def __reduce__(self) -> tuple:
+        # Raised in worker processes and sent back to the caller
+        return (LimitExceeded, (self.limit, self.inferences, self.depth, self.choicepoints, self.elapsed))
+
+
+class Governor:
+    """Counts the resources used by a query of the substitution engine and enforces its limits"""
+
+    def __init__(self, limits: Limits | None = None) -> None:
+        self.limits = limits or Limits()
+        self.inferences = 0
+        self.choicepoints = 0
+        self.start = time.monotonic()
+
+    def step(self, depth: int) -> None:
+        """Count an inference at `depth`"""
+        self.inferences += 1
+        limits = self.limits
+        if limits.max_inferences is not None and self.inferences > limits.max_inferences:
+            self.exceeded("inferences", depth)
+        if limits.max_depth is not None and depth > limits.max_depth:
+            self.exceeded("depth", depth)
+        if (
+            limits.timeout is not None
+            and self.inferences % CHECK_INTERVAL == 0
+            and time.monotonic() - self.start > limits.timeout
+        ):
+            self.exceeded("time", depth)
+
+    @contextmanager
+    def choicepoint(self, depth: int) -> Iterator[None]:
+        """Count an open choicepoint for the duration of the block"""
+        self.choicepoints += 1
+        try:
+            if self.limits.max_choicepoints is not None and self.choicepoints > self.limits.max_choicepoints:
+                self.exceeded("choicepoints", depth)
+            yield
+        finally:
+            self.choicepoints -= 1
+
+    def exceeded(self, limit: str, depth: int) -> NoReturn:
+        """Raise `LimitExceeded` with the current counters"""
+        raise LimitExceeded(
+            limit,
+            inferences=self.inferences,
+            depth=depth,
+            choicepoints=self.choicepoints,
+            elapsed=time.monotonic() - self.start,
+        )
@@ -0,0 +1,239 @@
+"""
+List builtins: `append/3`, `length/2`, `member/2`, `nth0/3`, `reverse/2` and `msort/2`.
+
+They are only used for the predicates which the program does not define itself. The common
+modes run as Python loops over the arrays of `ArrayList`: a builtin returns its solutions, each
+one the pairs of terms to unify, and the engine tries them in order. The other modes, e.g.
+`length(L, N)` with both arguments unbound, are resolved with the clauses of `LIBRARY`.
+"""
+
+import collections
+import functools
+from collections.abc import Callable, Iterator, Sequence
+
+from brolog.objects import ArrayList, Atom, Function, Int, List, Number, Term, Variable, deref, make_functor
+from brolog.parse import Parser
+
+
+# The pairs of terms to unify for each solution, None to resolve the call with the library clauses instead
+Solutions = Sequence[list[tuple[Term, Term]]] | None
+
+LIBRARY_SOURCE = """\
+append([], L, L).
+append([H|T], L, [H|R]) :- append(T, L, R).
+length([], 0).
+length([_|T], N) :- length(T, M), N is M + 1.
+member(X, [X|_]).
+member(X, [_|T]) :- member(X, T).
+nth0(I, L, E) :- nth0_from(L, E, 0, I).
+nth0_from([E|_], E, I, I).
+nth0_from([_|T], E, I0, I) :- I1 is I0 + 1, nth0_from(T, E, I1, I).
+reverse(L, R) :- reverse_onto(L, [], R).
+reverse_onto([], R, R).
+reverse_onto([H|T], A, R) :- reverse_onto(T, [H|A], R).
+"""
+
+LIBRARY = Parser(LIBRARY_SOURCE).parse_program()
+
+
+class Choices(Sequence):
+    """The solutions of a nondeterministic builtin, built one at a time as they are tried"""
+
+    def __init__(self, count: int, solution: Callable[[int], list[tuple[Term, Term]]]) -> None:
+        self.count = count
+        self.solution = solution
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> list[tuple[Term, Term]]:
+        if not 0 <= index < self.count:
+            # Ends the iteration of the sequence
+            raise IndexError(index)
+        return self.solution(index)
+
+
+class Stream(Sequence):
+    """
+    The solutions of a builtin read lazily from an iterator, e.g. the rows of a database cursor.
+
+    Each solution is only read when it is tried, along with the next one to know if there are any left: until
+    the iterator is exhausted, the length is one more than the solutions read. The solutions before the last
+    one accessed are dropped, they are never tried again.
+    """
+
+    def __init__(self, solutions: Iterator[list[tuple[Term, Term]]]) -> None:
+        self.solutions = solutions
+        self.buffer: collections.deque[list[tuple[Term, Term]]] = collections.deque()
+        # The index of the first solution in the buffer
+        self.start = 0
+        self.exhausted = False
+        self.read(1)
+
+    def read(self, end: int) -> None:
+        """Read the solutions up to `end` (excluded) if there are that many"""
+        while not self.exhausted and self.start + len(self.buffer) < end:
+            try:
+                self.buffer.append(next(self.solutions))
+            except StopIteration:
+                self.exhausted = True
+
+    def __len__(self) -> int:
+        return self.start + len(self.buffer) + (0 if self.exhausted else 1)
+
+    def __getitem__(self, index: int) -> list[tuple[Term, Term]]:
+        if index < self.start:
+            msg = f"Solution {index} was dropped"
+            raise ValueError(msg)
+        self.read(index + 2)
+        while self.start < index and self.buffer:
+            self.buffer.popleft()
+            self.start += 1
+        if not self.buffer:
+            # Ends the iteration of the sequence
+            raise IndexError(index)
+        return self.buffer[0]
+
+
+def walk(term: Term) -> tuple[list[Term], Term]:
+    """The elements of a (partial) list and the dereferenced term which ends it, e.g. `[]` or a variable"""
+    items = []
+    term = deref(term)
+    while isinstance(term, List) and term.arity:
+        if isinstance(term, ArrayList):
+            items.extend(term.cells[term.start : -1])
+            term = term.cells[-1]
+        else:
+            items.append(term.args[0])
+            term = term.args[1]
+        term = deref(term)
+    return items, term
+
+
+def is_empty(term: Term) -> bool:
+    return isinstance(term, List) and not term.arity
+
+
+def fresh(n: int) -> list[Variable]:
+    return [Variable("_") for _ in range(n)]
+
+
+def append(a: Term, b: Term, c: Term) -> Solutions:
+    prefix, tail = walk(a)
+    if is_empty(tail):
+        return [[(c, List.from_list(prefix, b))]]
+    if not isinstance(tail, Variable):
+        return []
+    items, end = walk(c)
+    if not is_empty(end):
+        return None
+    # Split `c` in all possible ways, the suffixes share its array
+    whole = List.from_list(items)
+    return Choices(
+        len(items) + 1,
+        lambda i: [(a, List.from_list(items[:i])), (b, whole.drop(i) if items else whole)],
+    )
+
+
+def length(lst: Term, n: Term) -> Solutions:
+    items, tail = walk(lst)
+    n = deref(n)
+    if not isinstance(n, Int | Variable):
+        return []
+    if is_empty(tail):
+        return [[(n, Int(len(items)))]]
+    if not isinstance(tail, Variable):
+        return []
+    if isinstance(n, Variable):
+        return None
+    missing = n.value - len(items)
+    return [[(tail, List.from_list(fresh(missing)))]] if missing >= 0 else []
+
+
+def member(x: Term, lst: Term) -> Solutions:
+    items, tail = walk(lst)
+    if not is_empty(tail):
+        return None
+    return Choices(len(items), lambda i: [(x, items[i])])
+
+
+def nth0(index: Term, lst: Term, element: Term) -> Solutions:
+    index = deref(index)
+    items, tail = walk(lst)
+    if isinstance(index, Variable):
+        if not is_empty(tail):
+            return None
+        return Choices(len(items), lambda i: [(index, Int(i)), (element, items[i])])
+    if not isinstance(index, Int) or index.value < 0:
+        return []
+    if index.value < len(items):
+        return [[(element, items[index.value])]]
+    if isinstance(tail, Variable):
+        # Extend the partial list up to the element
+        return [[(tail, List.from_list([*fresh(index.value - len(items)), element], Variable("_")))]]
+    return []
+
+
+def reverse(lst: Term, reversed_: Term) -> Solutions:
+    items, tail = walk(lst)
+    if is_empty(tail):
+        return [[(reversed_, List.from_list(items[::-1]))]]
+    return None if isinstance(tail, Variable) else []
+
+
+def msort(lst: Term, sorted_: Term) -> Solutions:
+    """Sort in the standard order of terms, keeping duplicates. Fails unless `lst` is a proper list."""
+    items, tail = walk(lst)
+    if not is_empty(tail):
+        return []
+    return [[(sorted_, List.from_list(sorted(items, key=functools.cmp_to_key(compare))))]]
+
+
+BUILTINS: dict[tuple[str, int], Callable[..., Solutions]] = {
+    make_functor("append", 3): append,
+    make_functor("length", 2): length,
+    make_functor("member", 2): member,
+    make_functor("nth0", 3): nth0,
+    make_functor("reverse", 2): reverse,
+    make_functor("msort", 2): msort,
+}
+
+
+def order_class(term: Term) -> int:
+    """Variables < numbers < atoms < compound terms"""
+    if isinstance(term, Variable):
+        return 0
+    if isinstance(term, Number):
+        return 1
+    if isinstance(term, Atom):
+        return 2
+    return 3
+
+
+def compare(x: Term, y: Term) -> int:
+    """Compare two terms in the standard order, returns -1, 0 or 1"""
+    stack = [(x, y)]
+    while stack:
+        x, y = stack.pop()
+        x, y = deref(x), deref(y)
+        if x is y:
+            continue
+        if (cx := order_class(x)) != (cy := order_class(y)):
+            return -1 if cx < cy else 1
+        match x:
+            case Variable():
+                key_x, key_y = x.serial, y.serial
+            case Number():
+                # Compared by value, a float comes before an integer of the same value
+                key_x, key_y = (x.value, isinstance(x, Int)), (y.value, isinstance(y, Int))
+            case Atom():
+                key_x, key_y = x.name, y.name
+            case Function():
+                # By arity, then name, then the arguments from left to right
+                key_x, key_y = (x.arity, x.name), (y.arity, y.name)
+                if key_x == key_y:
+                    stack.extend(reversed(list(zip(x.args, y.args, strict=True))))
+                    continue
+        if key_x != key_y:
+            return -1 if key_x < key_y else 1
+    return 0
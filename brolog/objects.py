@@ -1,8 +1,22 @@
-import re
+import itertools
 from hashlib import sha1
 from typing import Self
 
 
+# Variables are numbered in order of creation, this lets the trail engine tell which ones are older
+_variable_serials = itertools.count()
+
+# Atoms and functors are interned so that they can be compared by identity
+_atoms: dict[str, "Atom"] = {}
+_functors: dict[tuple[str, int], tuple[str, int]] = {}
+
+
+def make_functor(name: str, arity: int) -> tuple[str, int]:
+    """Return the interned (name, arity) pair of a function or predicate"""
+    key = (name, arity)
+    return _functors.setdefault(key, key)
+
+
 def short_id(long_id: int) -> str:
     bytes_id = str(long_id).encode("utf-8")
     return sha1(bytes_id, usedforsecurity=False).hexdigest()[:2]
@@ -11,29 +25,87 @@ def short_id(long_id: int) -> str:
 class Symbol:
     """Base class for terms and predicates"""
 
+    __slots__ = ()
+
 
 class Term(Symbol):
     """Base class for atoms, functions & variables"""
 
+    __slots__ = ()
+
 
 class Atom(Term):
-    """A constant term, e.g., `c`"""
+    """A constant term, e.g., `c`. Atoms are interned, there is only one atom with a given name."""
 
-    def __init__(self, name: str) -> None:
-        self.name = name
+    __slots__ = ("name",)
+
+    def __new__(cls, name: str) -> Self:
+        if (atom := _atoms.get(name)) is None:
+            atom = _atoms[name] = super().__new__(cls)
+            atom.name = name
+        return atom
+
+    def __reduce__(self) -> tuple:
+        return (Atom, (self.name,))
 
     def __repr__(self) -> str:
         return self.name
 
 
+class Number(Term):
+    """A number, e.g., `1` or `2.5`. Unlike atoms, numbers are not interned, they are compared by value."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: float) -> None:
+        self.value = value
+
+    def __reduce__(self) -> tuple:
+        return (type(self), (self.value,))
+
+    def __eq__(self, other: object) -> bool:
+        # 1 and 1.0 are different terms
+        return type(self) is type(other) and self.value == other.value
+
+    def __hash__(self) -> int:
+        return hash(self.value)
+
+    def __repr__(self) -> str:
+        return repr(self.value)
+
+
+class Int(Number):
+    __slots__ = ()
+
+
+class Float(Number):
+    __slots__ = ()
+
+
+def make_number(value: float) -> Number:
+    return Int(value) if isinstance(value, int) else Float(value)
+
+
 class Function(Term):
     """A function term, e.g., `f(c)`"""
 
+    __slots__ = ("functor", "args")
+
     def __init__(self, name: str, args: list[Term]) -> None:
-        self.name = name
-        self.arity = len(args)
+        self.functor = make_functor(name, len(args))
         self.args = args
 
+    @property
+    def name(self) -> str:
+        return self.functor[0]
+
+    @property
+    def arity(self) -> int:
+        return self.functor[1]
+
+    def __reduce__(self) -> tuple:
+        return (type(self), (self.name, self.args))
+
     def __repr__(self) -> str:
         args = ", ".join([repr(arg) for arg in self.args])
         return f"{self.name}({args})"
@@ -42,6 +114,8 @@ class Function(Term):
 class List(Function):
     """Prolog-style lists e.g. [1,2] or [H|T]"""
 
+    __slots__ = ()
+
     def __init__(self, name: str = "<array>", args: list[Term] | None = None) -> None:
         match args:
             case None | []:
@@ -61,37 +135,95 @@ class List(Function):
         if len(self.args) > 1:
             return self.args[1]
 
+    def unpack(self) -> tuple[list[Term], Term]:
+        """The elements of the list and the term which ends it (`[]` for a proper list, e.g. a variable otherwise)"""
+        items = []
+        term = self
+        while isinstance(term, List) and term.arity:
+            if isinstance(term, ArrayList):
+                items.extend(itertools.islice(term.cells, term.start, len(term.cells) - 1))
+                term = term.cells[-1]
+            else:
+                items.append(term.args[0])
+                term = term.args[1]
+        return items, term
+
     def __repr__(self) -> str:
-        match (self.head, self.tail):
-            case None, None:
-                return "[]"
-            case head, None:
-                return f"[{head}]"
-            case head, Variable() as tail:
-                return f"[{head}|{tail}]"
-            case head, List(args=[]) as tail:
-                return f"[{head}]"
-            case head, List() as tail:
-                # unwrap extra '[]'
-                tail = re.sub(r"^\[(.+)\]$", r"\1", str(tail))
-                return f"[{head},{tail}]"
-            case head, tail:
-                # List() is just a function so technically tail can be any type like an atom
-                # e.g. [1|2] which is not a valid list but is syntactically correct
-                return f"[{head}|{tail}]"
+        items, tail = self.unpack()
+        elements = ",".join(str(item) for item in items)
+        if isinstance(tail, List):
+            return f"[{elements}]"
+        # List() is just a function so technically the tail can be any type like an atom
+        # e.g. [1|2] which is not a valid list but is syntactically correct
+        return f"[{elements}|{tail}]"
 
     @classmethod
-    def from_list(cls: type[Self], arr: list[Term]) -> Self:
-        if not arr:
-            return cls()
-        return cls(args=[arr[0], cls.from_list(arr[1:])])
+    def from_list(cls: type[Self], arr: list[Term], tail: Term | None = None) -> Term:
+        """A list of the elements of `arr` followed by `tail` (`[]` by default), stored as an array"""
+        if tail is None:
+            tail = cls()
+        return ArrayList([*arr, tail]) if arr else tail
+
+
+class ArrayList(List):
+    """
+    A list stored as an array of its elements.
+
+    `cells` holds the elements followed by the tail of the list (`[]` for a proper list). The list starts
+    at index `start`, so that the suffixes of a list share its array. To unification, it looks like a chain
+    of cons cells: `args`, the head and the rest of the list, is only built when it is first accessed.
+    """
+
+    __slots__ = ("cells", "start")
+
+    def __init__(self, cells: list[Term], start: int = 0) -> None:
+        self.functor = CONS
+        self.cells = cells
+        self.start = start
+
+    def __getattr__(self, name: str) -> list[Term]:
+        # Only called while the `args` slot is not set
+        if name != "args":
+            raise AttributeError(name)
+        rest = self.start + 1
+        self.args = [
+            self.cells[self.start],
+            ArrayList(self.cells, rest) if rest < len(self.cells) - 1 else self.cells[-1],
+        ]
+        return self.args
+
+    def __len__(self) -> int:
+        """The number of elements before the tail"""
+        return len(self.cells) - 1 - self.start
+
+    def drop(self, n: int) -> Term:
+        """The list without its first `n` elements, at most `len(self)`"""
+        if n == len(self):
+            return self.cells[-1]
+        return self if n == 0 else ArrayList(self.cells, self.start + n)
+
+    def __reduce__(self) -> tuple:
+        return (ArrayList, (self.cells[self.start :],))
+
+
+CONS = make_functor("<array>", 2)
 
 
 class Variable(Term):
     """A variable, e.g., `X` which takes on values of other terms"""
 
+    __slots__ = ("name", "ref", "serial")
+
     def __init__(self, name: str) -> None:
         self.name = name
+        # The term this variable is bound to (used by the trail engine)
+        self.ref: Term | None = None
+        self.serial = next(_variable_serials)
+
+    def __reduce__(self) -> tuple:
+        # An unpickled variable is a new (unbound) variable of the loading process,
+        # serials from another process would confuse the trail engine
+        return (Variable, (self.name,))
 
     def __str__(self) -> str:
         return self.name
@@ -106,14 +238,38 @@ class Variable(Term):
         return self is other
 
 
+def deref(term: Term) -> Term:
+    """Follow the bindings of a variable until reaching a non-variable or an unbound variable."""
+    while isinstance(term, Variable) and term.ref is not None:
+        term = term.ref
+    return term
+
+
+def next_variable_serial() -> int:
+    """Return the serial number which the next created variable will be greater than or equal to."""
+    return next(_variable_serials)
+
+
 class Predicate(Symbol):
     """A predicate, e.g., `P(X, f(Y))`. Predicates can be assigned truth values."""
 
+    __slots__ = ("functor", "args")
+
     def __init__(self, name: str, args: list[Term]) -> None:
-        self.name = name
-        self.arity = len(args)
+        self.functor = make_functor(name, len(args))
         self.args = args
 
+    @property
+    def name(self) -> str:
+        return self.functor[0]
+
+    @property
+    def arity(self) -> int:
+        return self.functor[1]
+
+    def __reduce__(self) -> tuple:
+        return (Predicate, (self.name, self.args))
+
     def __repr__(self) -> str:
         args = ", ".join([repr(arg) for arg in self.args])
         return f"{self.name}({args})"
@@ -122,9 +278,14 @@ class Predicate(Symbol):
 class Cut(Predicate):
     """A special Prolog predicate (`!`) which controls backtracking behaviour."""
 
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__(name="!", args=[])
 
+    def __reduce__(self) -> tuple:
+        return (Cut, ())
+
     def __hash__(self) -> int:
         return id(self)
 
@@ -132,12 +293,45 @@ class Cut(Predicate):
         return "!"
 
 
+class Control(Predicate):
+    """
+    A control construct, whose arguments are goals:
+
+    - `(A, B)`: conjunction
+    - `(A ; B)`: disjunction
+    - `(C -> T)`: if-then, `(C -> T ; E)` is if-then-else
+    - `\\+ G`: negation as failure
+    - `true` and `fail`
+
+    A cut inside the condition of an if-then or inside a negation is local to it,
+    elsewhere it cuts the clause in which the construct appears.
+    """
+
+    __slots__ = ()
+
+    def __reduce__(self) -> tuple:
+        return (Control, (self.name, self.args))
+
+    def __repr__(self) -> str:
+        match self.args:
+            case []:
+                return self.name
+            case [goal]:
+                return f"{self.name} {goal!r}"
+            case [left, right] if self.name == ",":
+                return f"({left!r}, {right!r})"
+            case [left, right]:
+                return f"({left!r} {self.name} {right!r})"
+
+
 class Rule:
     """A Prolog rule, e.g,
 
     connected(A, C) :- connected(A, B), connected(B, C).
     """
 
+    __slots__ = ("head", "body")
+
     def __init__(self, head: Predicate, body: list[Predicate] | None = None) -> None:
         self.head = head
         self.body = body or []
@@ -148,3 +342,54 @@ class Rule:
             return f"{head}."
         body = ", ".join([repr(p) for p in self.body])
         return f"{head} :- {body}."
+
+
+def variant_key(term: Term | Predicate | list[Term]) -> tuple:
+    """
+    Return a key which is equal for two terms iff they are variants (equal up to variable renaming).
+
+    The key is the pre-order sequence of the term's nodes, with variables numbered by first occurrence.
+    """
+    key = []
+    variables = {}
+    stack = [term]
+    while stack:
+        term = stack.pop()
+        if isinstance(term, list):
+            # A list of arguments, callers only compare lists of the same length
+            stack.extend(reversed(term))
+            continue
+        term = deref(term)
+        if isinstance(term, Variable):
+            key.append(variables.setdefault(term, len(variables)))
+        elif isinstance(term, Atom | Number):
+            key.append(term)
+        else:
+            key.append(term.functor)
+            stack.extend(reversed(term.args))
+    return tuple(key)
+
+
+class HashConsTable:
+    """
+    Shares structurally equal ground terms (hash-consing).
+
+    Terms must be built bottom-up, passing each compound term to `share()` once its arguments
+    have been shared. A term is only shared if all of its arguments are atoms or shared terms.
+    """
+
+    __slots__ = ("terms", "shared")
+
+    def __init__(self) -> None:
+        self.terms: dict[tuple, Function] = {}
+        self.shared: set[Function] = set()
+
+    def share(self, term: Function) -> Function:
+        if not all(isinstance(arg, Atom | Number) or arg in self.shared for arg in term.args):
+            return term
+
+        key = (type(term), term.functor, *term.args)
+        if (shared := self.terms.get(key)) is None:
+            shared = self.terms[key] = term
+            self.shared.add(term)
+        return shared
@@ -0,0 +1,236 @@
+"""
+OR-parallel execution of queries on a pool of processes.
+
+The query is first resolved in the calling process for as long as its goals have a single
+candidate clause. The first goal with several candidate clauses is then split: each clause
+is an independent branch of the search tree which a worker process explores on its own.
+Each worker keeps a copy of the program which is sent to it once, when the pool starts.
+
+Answers are streamed back through a queue as soon as they are found, either in the order in
+which they arrive or in the order of sequential execution.
+A cut could prune the branches of other workers, queries whose split would cross a cut are
+therefore run sequentially. So are tabled predicates, whose answers are shared between branches.
+The copies of the program in the workers cannot see each other's changes, so programs and queries
+which call `assertz/1`, `asserta/1` or `retract/1` are run sequentially as well.
+"""
+
+import itertools
+import multiprocessing
+import queue
+from collections.abc import Generator
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Self
+
+from brolog.database import ASSERT, RETRACT
+from brolog.engine import FAIL, PAUSE, Engine, Goals, copy_term, deref, has_cut, renamer, resolve
+from brolog.limits import Limits
+from brolog.objects import ArrayList, Cut, Function, Predicate, Term, Variable
+from brolog.program import Program
+
+
+# Give up looking for a split point after this many deterministic resolution steps
+MAX_SPLIT_STEPS = 1000
+# Workers check whether their query was cancelled after this many inferences,
+# so that a branch which searches for a long time without answers still stops
+CANCEL_CHECK_EVERY = 1000
+
+# The builtins which change the program
+DATABASE = frozenset([*ASSERT, RETRACT])
+
+# State of a worker process, set by `init_worker`
+_worker = {}
+
+
+class ParallelSolver:
+    """A pool of worker processes which prove queries against the same program."""
+
+    def __init__(
+        self, program: Program, workers: int, *, occurs_check: bool = False, limits: Limits | None = None
+    ) -> None:
+        self.program = program
+        self.occurs_check = occurs_check
+        # Applied to each branch separately
+        self.limits = limits
+        self.queue = multiprocessing.Queue()
+        # The id of the running query, workers stop once it changes
+        self.current = multiprocessing.Value("q", 0)
+        self.ids = itertools.count(1)
+        # Whether the program may change, queries then run sequentially against the program of the caller
+        self.dynamic = any(uses_database(goal) for rule in program for goal in rule.body)
+        self.executor = ProcessPoolExecutor(
+            workers,
+            initializer=init_worker,
+            initargs=(program, occurs_check, limits, self.queue, self.current),
+        )
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.current.value = 0
+        self.executor.shutdown(cancel_futures=True)
+
+    def query(self, q: Predicate, *, ordered: bool = False) -> Generator[list[dict[Variable, Term]], None, None]:
+        """Prove `q`, yielding answers in the same format as `brolog.solver.query`."""
+        return ([answer] for answer in self.solve(q, ordered=ordered))
+
+    def solve(self, q: Predicate, *, ordered: bool = False) -> Generator[dict[Variable, Term], None, None]:
+        """
+        Prove `q`, yielding the value of each of its variables for every proof.
+
+        With `ordered`, answers are yielded in the same order as sequential execution, the answers
+        of a branch being held back until all previous branches are exhausted.
+        """
+        engine = Engine(self.program, occurs_check=self.occurs_check, limits=self.limits)
+        # Once a query changed the program, the copies of the workers are out of date
+        self.dynamic = self.dynamic or uses_database(q)
+        if self.dynamic or (split := split_query(engine, q)) is None:
+            yield from engine.solve(q)
+            return
+
+        variables, goals, branches = split
+        query_id = next(self.ids)
+        self.current.value = query_id
+        # Pickled together with each task so that the variables shared by the goals and the answer stay shared
+        task = ([(resolve(g.goal), g.depth) for g in iter_goals(goals)], [resolve(v) for v in variables.values()])
+        futures = [self.executor.submit(solve_branch, query_id, task, branch) for branch in range(branches)]
+
+        # Answers of branches which cannot be yielded yet in ordered mode
+        pending = [[] for _ in range(branches)]
+        done = [False] * branches
+        next_branch = 0
+        try:
+            for branch, values in self.receive(query_id, futures):
+                if values is None:
+                    done[branch] = True
+                elif not ordered or branch == next_branch:
+                    yield dict(zip(variables, values, strict=True))
+                else:
+                    pending[branch].append(values)
+
+                # Once the current branch is exhausted, release the answers held back for the next one
+                while ordered and next_branch < branches - 1 and done[next_branch]:
+                    next_branch += 1
+                    for held in pending[next_branch]:
+                        yield dict(zip(variables, held, strict=True))
+                    pending[next_branch].clear()
+        finally:
+            if self.current.value == query_id:
+                self.current.value = 0
+            for future in futures:
+                future.cancel()
+
+    def receive(self, query_id: int, futures: list[Future]) -> Generator[tuple[int, list[Term] | None], None, None]:
+        """Yield the messages of a query until all of its branches are done. `None` marks the end of a branch."""
+        remaining = len(futures)
+        while remaining:
+            try:
+                message_id, branch, values = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                raise_worker_error(futures)
+                continue
+            # Skip messages left over from a previous query which was not consumed to the end
+            if message_id == query_id:
+                if values is None:
+                    remaining -= 1
+                yield branch, values
+
+
+def raise_worker_error(futures: list[Future]) -> None:
+    for future in futures:
+        if future.done() and not future.cancelled() and (error := future.exception()) is not None:
+            raise error
+
+
+def split_query(engine: Engine, q: Predicate) -> tuple[dict[Variable, Variable], Goals, int] | None:
+    """
+    Resolve `q` until its first goal has several candidate clauses.
+
+    Returns the query variables with their (renamed) values, the goal list and the number
+    of candidate clauses (branches) of its first goal. Returns None if the query should
+    run sequentially instead.
+    """
+    if isinstance(q, Cut):
+        return None
+
+    program = engine.program
+    variables = {}
+    goals = Goals(copy_term(q, renamer(variables)), 1, None)
+    engine.reset()
+    for _ in range(MAX_SPLIT_STEPS):
+        if goals is FAIL or goals is None or cut_in(goals) or goals.goal.functor in program.tabled:
+            return None
+        if goals.goal.__class__ is not Predicate or engine.choicepoints:
+            # The branches of control constructs and nondeterministic builtins (e.g. member/2) are not clauses
+            return None
+
+        goal = goals.goal
+        clauses = program.lookup(goal.functor, deref(goal.args[0]) if goal.args else None, goal.args)
+        if len(clauses) > 1:
+            if any(has_cut(p) for clause in clauses for p in clause.rule.body):
+                return None
+            return variables, goals, len(clauses)
+        goals = engine.call(goals)
+    return None
+
+
+def uses_database(goal: Predicate | Term) -> bool:
+    """Whether a goal calls a builtin which changes the program, also inside e.g. `findall/3` or `\\+`"""
+    stack = [goal]
+    while stack:
+        term = stack.pop()
+        if isinstance(term, ArrayList):
+            stack += term.cells[term.start :]
+        elif isinstance(term, Predicate | Function):
+            if term.functor in DATABASE:
+                return True
+            stack += term.args
+    return False
+
+
+def iter_goals(goals: Goals | None) -> Generator[Goals, None, None]:
+    while goals is not None:
+        yield goals
+        goals = goals.next
+
+
+def cut_in(goals: Goals | None) -> bool:
+    return any(has_cut(g.goal) for g in iter_goals(goals))
+
+
+def init_worker(
+    program: Program,
+    occurs_check: bool,  # noqa: FBT001
+    limits: Limits | None,
+    answers: multiprocessing.Queue,
+    current: multiprocessing.Value,
+) -> None:
+    _worker.update(program=program, occurs_check=occurs_check, limits=limits, answers=answers, current=current)
+
+
+def solve_branch(query_id: int, task: tuple[list[tuple[Predicate, int]], list[Term]], branch: int) -> None:
+    """Prove the goal list using only the `branch`-th candidate clause of its first goal and stream the answers."""
+    program, answers, current = _worker["program"], _worker["answers"], _worker["current"]
+    if current.value != query_id:
+        return
+
+    goal_list, values = task
+    goals = None
+    for goal, depth in reversed(goal_list):
+        goals = Goals(goal, depth, goals)
+    goal = goals.goal
+    clauses = program.lookup(goal.functor, deref(goal.args[0]) if goal.args else None, goal.args)
+
+    engine = Engine(program, occurs_check=_worker["occurs_check"], limits=_worker["limits"])
+    engine.reset()
+    start = engine.resolve_clauses(goals, clauses[branch : branch + 1], 0, 0)
+    for result in engine.loop(start, pause_every=CANCEL_CHECK_EVERY):
+        if current.value != query_id:
+            return
+        if result is PAUSE:
+            continue
+        answers.put((query_id, branch, [resolve(value) for value in values]))
+    answers.put((query_id, branch, None))
@@ -1,5 +1,44 @@
-from brolog.lex import Token, TokenType, tokenize
-from brolog.objects import Atom, Cut, Function, List, Predicate, Rule, Term, Variable
+from collections.abc import Iterable, Iterator
+
+from brolog.arithmetic import ARITHMETIC
+from brolog.lex import Token, TokenType, iter_tokens
+from brolog.objects import (
+    Atom,
+    Control,
+    Cut,
+    Function,
+    HashConsTable,
+    List,
+    Predicate,
+    Rule,
+    Term,
+    Variable,
+    make_number,
+)
+from brolog.program import DETERMINISMS, MODE_ARGS, Mode, Program
+
+
+# Infix operators: (priority, type), `xfx` does not associate, `yfx` is left and `xfy` right associative
+OPERATORS = {
+    # Clauses and control constructs as terms, e.g. `assertz((p(X) :- q(X), X > 1))`
+    ":-": (1200, "xfx"),
+    ";": (1100, "xfy"),
+    "->": (1050, "xfy"),
+    ",": (1000, "xfy"),
+    **dict.fromkeys(["is", "=:=", "=\\=", "<", ">", "=<", ">="], (700, "xfx")),
+    **dict.fromkeys(["+", "-", "/\\", "\\/"], (500, "yfx")),
+    **dict.fromkeys(["*", "/", "//", "mod", "rem", "<<", ">>"], (400, "yfx")),
+    "**": (200, "xfx"),
+    "^": (200, "xfy"),
+}
+# Prefix minus (`fy`)
+NEGATION_PRIORITY = 200
+# Prefix `\+` (`fy`)
+NOT_PROVABLE_PRIORITY = 900
+# The priority of arguments, which excludes the `,` operator
+ARGUMENT_PRIORITY = 999
+# The priority of a term in parentheses
+CLAUSE_PRIORITY = 1200
 
 
 class ParseError(Exception):
@@ -9,28 +48,149 @@ class ParseError(Exception):
 
 
 class Parser:
-    def __init__(self, source: str) -> None:
-        self.tokens = tokenize(source)
+    """
+    A recursive descent parser over a lazily tokenized source.
+
+    The source can be a string or an iterable of lines, e.g. an open file.
+    Tokens are read one at a time, the parser only looks at the next token.
+
+    With `hashcons=True`, structurally equal ground terms share a single object.
+    """
+
+    def __init__(self, source: str | Iterable[str], *, hashcons: bool = False) -> None:
+        self.hashcons = HashConsTable() if hashcons else None
+        self.tokens = iter_tokens(source)
+        self.next_token = next(self.tokens, None)
         self.current_scope = {}
+        # Predicates declared with `:- table name/arity.`
+        self.tabled: list[tuple[str, int]] = []
+        # Declared with `:- mode name(+, -).`
+        self.modes: list[Mode] = []
+
+    def peek(self) -> str | None:
+        """Return the value of the next token without consuming it"""
+        return self.next_token.value if self.next_token is not None else None
 
     def pop(self) -> Token:
-        if not self.tokens:
+        if (token := self.next_token) is None:
             msg = "Unexpected end of file"
             raise ParseError(msg)
 
-        return self.tokens.pop(0)
+        self.next_token = next(self.tokens, None)
+        return token
 
     def parse(self, *, head_only: bool = False) -> list[Rule]:
         if head_only:
             return self.parse_head()
         return self.parse_rules()
 
+    def parse_program(self) -> Program:
+        program = Program(self.iter_rules())
+        for name, arity in self.tabled:
+            program.table(name, arity)
+        for mode in self.modes:
+            program.declare_mode(mode)
+        return program
+
     def parse_rules(self) -> list[Rule]:
-        rules = []
-        while self.tokens:
+        return list(self.iter_rules())
+
+    def iter_rules(self) -> Iterator[Rule]:
+        """Parse rules one by one, so that they can be consumed while the source is still being read"""
+        while self.next_token is not None:
             self.current_scope = {}
-            rules.append(self.parse_rule())
-        return rules
+            if self.peek() == ":-":
+                self.parse_directive()
+            else:
+                yield self.parse_rule()
+
+    def iter_queries(self) -> Iterator[Predicate]:
+        """Parse queries (`goal.`) one by one"""
+        while self.next_token is not None:
+            self.current_scope = {}
+            query = self.parse_query()
+            token = self.pop()
+            if token.value != ".":
+                msg = f'Expected "." at the end of a query, but got "{token.value}"'
+                raise ParseError(msg, token)
+            yield query
+
+    def parse_directive(self) -> None:
+        self.pop()
+        token = self.pop()
+        match token:
+            case Token(type=TokenType.name, value="table"):
+                self.tabled.extend(self.parse_predicate_indicators())
+            case Token(type=TokenType.name, value="mode"):
+                self.modes.append(self.parse_mode())
+            case _:
+                msg = f"Unknown directive: {token.value}"
+                raise ParseError(msg, token)
+
+        token = self.pop()
+        if token.value != ".":
+            msg = f'Expected "." at the end of a directive, but got "{token.value}"'
+            raise ParseError(msg, token)
+
+    def parse_predicate_indicators(self) -> list[tuple[str, int]]:
+        indicators = [self.parse_predicate_indicator()]
+        while self.peek() == ",":
+            self.pop()
+            indicators.append(self.parse_predicate_indicator())
+        return indicators
+
+    def parse_predicate_indicator(self) -> tuple[str, int]:
+        """Parse `name/arity`"""
+        name = self.pop()
+        if name.type != TokenType.name:
+            msg = f"Expected a predicate name, but got {name.value}"
+            raise ParseError(msg, name)
+
+        token = self.pop()
+        if token.value != "/":
+            msg = f"Expected '/', but got {token.value}"
+            raise ParseError(msg, token)
+
+        arity = self.pop()
+        if arity.type != TokenType.number or not arity.value.isdigit():
+            msg = f"Expected an arity, but got {arity.value}"
+            raise ParseError(msg, arity)
+        return name.value, int(arity.value)
+
+    def parse_mode(self) -> Mode:
+        """Parse `name(+, -, ?)`, optionally followed by `is` and a determinism"""
+        name = self.pop()
+        if name.type != TokenType.name:
+            msg = f"Expected a predicate name, but got {name.value}"
+            raise ParseError(msg, name)
+
+        args = []
+        token = self.pop()
+        if token.value != "(":
+            msg = f"Expected '(', but got {token.value}"
+            raise ParseError(msg, token)
+        while True:
+            token = self.pop()
+            if token.value not in MODE_ARGS:
+                msg = f"Expected one of {', '.join(MODE_ARGS)}, but got {token.value}"
+                raise ParseError(msg, token)
+            args.append(token.value)
+            token = self.pop()
+            if token.value == ")":
+                break
+            if token.value != ",":
+                msg = f"Expected ',' or ')', but got {token.value}"
+                raise ParseError(msg, token)
+
+        determinism = None
+        if self.peek() == "is":
+            self.pop()
+            token = self.pop()
+            if token.value not in DETERMINISMS:
+                msg = f"Expected one of {', '.join(DETERMINISMS)}, but got {token.value}"
+                raise ParseError(msg, token)
+            determinism = token.value
+        return Mode(name.value, tuple(args), determinism)
 
     def parse_rule(self) -> Rule:
         head = self.parse_head()
@@ -52,13 +212,71 @@ class Parser:
     def parse_head(self) -> Predicate:
         return self.parse_predicate()
 
+    def parse_query(self) -> Predicate:
+        """Parse a goal, which may be a conjunction or use control constructs"""
+        return self.parse_disjunction()
+
     def parse_body(self) -> list[Predicate]:
-        body = [self.parse_predicate()]
-        while self.tokens[0].value == ",":
-            self.pop()
-            body.append(self.parse_predicate())
+        body = []
+        goal = self.parse_disjunction()
+        # The top-level conjunction is the list of goals
+        while isinstance(goal, Control) and goal.name == ",":
+            body.append(goal.args[0])
+            goal = goal.args[1]
+        body.append(goal)
         return body
 
+    def parse_disjunction(self) -> Predicate:
+        """Parse `A ; B` where `;` binds looser than `->` which binds looser than `,`"""
+        goal = self.parse_if_then()
+        if self.peek() == ";":
+            self.pop()
+            return Control(";", [goal, self.parse_disjunction()])
+        return goal
+
+    def parse_if_then(self) -> Predicate:
+        goal = self.parse_conjunction()
+        if self.peek() == "->":
+            self.pop()
+            return Control("->", [goal, self.parse_if_then()])
+        return goal
+
+    def parse_conjunction(self) -> Predicate:
+        goal = self.parse_goal()
+        if self.peek() == ",":
+            self.pop()
+            return Control(",", [goal, self.parse_conjunction()])
+        return goal
+
+    def parse_goal(self) -> Predicate:
+        if self.peek() == "\\+":
+            self.pop()
+            return Control("\\+", [self.parse_goal()])
+        if self.peek() == "(":
+            self.pop()
+            goal = self.parse_disjunction()
+            token = self.pop()
+            if token.value != ")":
+                msg = f"Expected ')', but got {token.value}"
+                raise ParseError(msg, token)
+            return goal
+        if self.next_token is not None and self.next_token.type == TokenType.name:
+            goal = self.parse_predicate()
+            if (operator := OPERATORS.get(self.peek())) is None or operator[0] > ARGUMENT_PRIORITY:
+                return goal
+            # A function on the left of a comparison, e.g. `max(X, Y) > 2`
+            return self.parse_arithmetic(Function(name=goal.name, args=goal.args))
+        return self.parse_arithmetic()
+
+    def parse_arithmetic(self, left: Term | None = None) -> Predicate:
+        """Parse an arithmetic goal, e.g. `X is Y + 1` or `X < 2`"""
+        token = self.next_token
+        term = self.parse_expression(ARGUMENT_PRIORITY, left)
+        if not isinstance(term, Function) or term.functor not in ARITHMETIC:
+            msg = f"Expected a goal, but got {term}"
+            raise ParseError(msg, token)
+        return Predicate(name=term.name, args=term.args)
+
     def parse_predicate(self) -> Predicate:
         token = self.pop()
         if token.type != TokenType.name:
@@ -68,6 +286,8 @@ class Parser:
         name = token.value
         if name == "!":
             return Cut()
+        if name in {"true", "fail"} and self.peek() != "(":
+            return Control(name, [])
 
         token = self.pop()
         if token.value != "(":
@@ -83,22 +303,55 @@ class Parser:
         return Predicate(name=name, args=args)
 
     def parse_args(self) -> list[Term]:
-        if not self.tokens:
+        if self.next_token is None:
             msg = "Unexpected end of file while parsing argument list"
             raise ParseError(msg)
 
-        if self.tokens[0].value == ")":
+        if self.peek() == ")":
             return []
 
         args = [self.parse_term()]
-        while self.tokens and self.tokens[0].value == ",":
+        while self.peek() == ",":
             self.pop()
             args.append(self.parse_term())
         return args
 
     def parse_term(self) -> Term:
+        return self.parse_expression(ARGUMENT_PRIORITY)
+
+    def parse_expression(self, max_priority: int, left: Term | None = None) -> Term:
+        """Parse a term with infix operators of at most `max_priority` (precedence climbing)"""
+        left_priority = 0
+        if left is None:
+            left = self.parse_primary()
+        while (operator := OPERATORS.get(self.peek())) is not None:
+            priority, kind = operator
+            if priority > max_priority or left_priority > (priority if kind == "yfx" else priority - 1):
+                break
+            name = self.pop().value
+            right = self.parse_expression(priority if kind == "xfy" else priority - 1)
+            left = self.share(Function(name=name, args=[left, right]))
+            left_priority = priority
+        return left
+
+    def parse_primary(self) -> Term:  # noqa: PLR0911
         token = self.pop()
         match token:
+            case Token(type=TokenType.number, value=value):
+                return self.parse_number(value)
+            case Token(type=TokenType.special, value="-"):
+                if self.next_token is not None and self.next_token.type == TokenType.number:
+                    return self.parse_number("-" + self.pop().value)
+                return self.share(Function(name="-", args=[self.parse_expression(NEGATION_PRIORITY)]))
+            case Token(type=TokenType.special, value="\\+"):
+                return self.share(Function(name="\\+", args=[self.parse_expression(NOT_PROVABLE_PRIORITY)]))
+            case Token(type=TokenType.special, value="("):
+                term = self.parse_expression(CLAUSE_PRIORITY)
+                token = self.pop()
+                if token.value != ")":
+                    msg = f"Expected ')', but got {token.value}"
+                    raise ParseError(msg, token)
+                return term
             case Token(type=TokenType.variable, value=name):
                 if name == "_":
                     return Variable("_")
@@ -106,7 +359,7 @@ class Parser:
                     self.current_scope[name] = Variable(name=name)
                 return self.current_scope[name]
             case Token(type=TokenType.name, value=name):
-                if self.tokens[0].value == "(":
+                if self.peek() == "(":
                     return self.parse_function(name)
                 return Atom(name=name)
             case Token(type=TokenType.special, value="["):
@@ -115,6 +368,9 @@ class Parser:
                 msg = f"Unexpected token while parsing term: {token.value}"
                 raise ParseError(msg, token)
 
+    def parse_number(self, value: str) -> Term:
+        return make_number(float(value) if any(c in value for c in ".eE") else int(value))
+
     def parse_function(self, name: str) -> Function:
         self.pop()
         fn = Function(name=name, args=self.parse_args())
@@ -122,34 +378,40 @@ class Parser:
         if token.value != ")":
             msg = f"Expected ')', but got {token.value}"
             raise ParseError(msg, token)
-        return fn
+        return self.share(fn)
+
+    def share(self, term: Function) -> Function:
+        if self.hashcons is None:
+            return term
+        return self.hashcons.share(term)
 
     def parse_list(self) -> List:
-        if self.tokens[0].value == "]":
+        if self.peek() == "]":
             self.pop()
-            return List()
+            return self.share(List())
 
-        head = self.parse_term()
-        if self.tokens[0].value == "|":
+        arr = [self.parse_term()]
+        while self.peek() == ",":
+            self.pop()
+            arr.append(self.parse_term())
+
+        tail = None
+        if self.peek() == "|":
             old_token = self.pop()
             tail = self.parse_term()
             if not isinstance(tail, List) and not isinstance(tail, Variable):
                 msg = f"Expected a list or variable, but got: {tail}"
                 raise ParseError(msg, old_token)
-            token = self.pop()
-            if token.value != "]":
-                msg = f"Expected ']', but got {token.value}"
-                raise ParseError(msg, token)
-            return List(args=[head, tail])
-
-        arr = [head]
-        while self.tokens[0].value == ",":
-            self.pop()
-            arr.append(self.parse_term())
 
         token = self.pop()
         if token.value != "]":
             msg = f"Expected ']', but got {token.value}"
             raise ParseError(msg, token)
 
-        return List.from_list(arr)
+        if self.hashcons is None:
+            # `[H|T]` is a single cons cell, longer lists are stored as arrays
+            return List(args=[arr[0], tail]) if len(arr) == 1 and tail is not None else List.from_list(arr, tail)
+        lst = self.share(List()) if tail is None else tail
+        for item in reversed(arr):
+            lst = self.share(List(args=[item, lst]))
+        return lst
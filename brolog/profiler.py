@@ -0,0 +1,207 @@
+"""
+Per-predicate profiling of the trail engine.
+
+The profiler counts the ports of each predicate (name/arity) in the box model of Prolog debuggers:
+
+- call: the predicate is called
+- exit: a clause body (or a tabled answer) succeeded
+- redo: the next alternative clause (or tabled answer) is tried on backtracking
+- fail: no (more) clauses or answers match
+
+as well as how many clause heads were matched against a call and how many of them unified.
+The self time of a predicate is the time spent resolving its calls (matching heads and building
+bodies), its cumulative time is the time from a call to its first exit, including the predicates it calls.
+
+Profiling is implemented by `ProfilingEngine`, so that the plain engine pays nothing for it.
+To detect exits, it inserts a marker goal after each clause body which breaks last-call optimization
+and counts as an inference.
+"""
+
+import json
+import time
+from collections.abc import Sequence
+from dataclasses import asdict, astuple, dataclass, fields
+from pathlib import Path
+
+from brolog.arithmetic import ARITHMETIC
+from brolog.compiler import Clause, Template
+from brolog.engine import FAIL, Engine, Goals
+from brolog.limits import Limits
+from brolog.objects import Predicate, Term
+from brolog.program import Program
+
+
+@dataclass(slots=True)
+class PredicateProfile:
+    calls: int = 0
+    exits: int = 0
+    redos: int = 0
+    fails: int = 0
+    # Clause heads tried and how many of them unified
+    unifications: int = 0
+    unified: int = 0
+    self_time: float = 0.0
+    cumulative_time: float = 0.0
+
+
+class Profile:
+    """Profiling counters of a query (or several queries), by predicate"""
+
+    def __init__(self) -> None:
+        self.predicates: dict[tuple[str, int], PredicateProfile] = {}
+
+    def __getitem__(self, functor: tuple[str, int]) -> PredicateProfile:
+        if (predicate := self.predicates.get(functor)) is None:
+            predicate = self.predicates[functor] = PredicateProfile()
+        return predicate
+
+    def sorted(self) -> list[tuple[str, PredicateProfile]]:
+        """The predicates (`name/arity`) in order of decreasing self time"""
+        predicates = sorted(self.predicates.items(), key=lambda item: item[1].self_time, reverse=True)
+        return [(f"{name}/{arity}", predicate) for (name, arity), predicate in predicates]
+
+    def report(self) -> str:
+        """A table of the counters of each predicate"""
+        header = ["predicate", *(f.name for f in fields(PredicateProfile))]
+        rows = [header, *([name, *map(format_value, astuple(predicate))] for name, predicate in self.sorted())]
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = []
+        for name, *cells in rows:
+            values = (cell.rjust(width) for cell, width in zip(cells, widths[1:], strict=True))
+            lines.append("  ".join([name.ljust(widths[0]), *values]))
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict[str, dict]:
+        return {name: asdict(predicate) for name, predicate in self.sorted()}
+
+    def dump(self, path: Path) -> None:
+        """Write the profile as JSON"""
+        with path.open("w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def format_value(value: float) -> str:
+    return f"{value:.6f}" if isinstance(value, float) else str(value)
+
+
+class ExitPort:
+    """A goal marking the end of a clause body"""
+
+    __slots__ = ("predicate", "start", "exited")
+
+    def __init__(self, predicate: PredicateProfile, start: float) -> None:
+        self.predicate = predicate
+        # When the predicate was called (or redone)
+        self.start = start
+        self.exited = False
+
+    def __repr__(self) -> str:
+        return "<exit>"
+
+
+class ProfilingEngine(Engine):
+    """An engine which records a `Profile` of the predicates it calls"""
+
+    def __init__(
+        self, program: Program, profile: Profile, *, occurs_check: bool = False, limits: Limits | None = None
+    ) -> None:
+        super().__init__(program, occurs_check=occurs_check, limits=limits)
+        self.profile = profile
+        # The predicate whose clauses are being matched
+        self.current: PredicateProfile | None = None
+        self.call_start: float | None = None
+
+    def sub_engine(self) -> Engine:
+        return ProfilingEngine(self.program, self.profile, occurs_check=self.occurs_check, limits=self.limits)
+
+    def call(self, goals: Goals) -> Goals | None:
+        goal = goals.goal
+        if isinstance(goal, ExitPort):
+            goal.predicate.exits += 1
+            if not goal.exited:
+                goal.exited = True
+                goal.predicate.cumulative_time += time.perf_counter() - goal.start
+            return goals.next
+        if goal.__class__ is not Predicate or goal.functor in ARITHMETIC:
+            # Control constructs and arithmetic are transparent, the goals of control constructs are profiled
+            return super().call(goals)
+
+        self.profile[goal.functor].calls += 1
+        self.call_start = time.perf_counter()
+        return super().call(goals)
+
+    def resolve_clauses(self, goals: Goals, clauses: list[Clause], index: int, height: int) -> Goals | None:
+        predicate, start = self.enter(goals, index)
+        resolve_start = time.perf_counter()
+        new_goals = super().resolve_clauses(goals, clauses, index, height)
+        if new_goals is FAIL:
+            predicate.fails += 1
+        else:
+            new_goals = insert_goal(new_goals, goals.next, ExitPort(predicate, start), goals.depth + 1)
+        predicate.self_time += time.perf_counter() - resolve_start
+        return new_goals
+
+    def resolve_solutions(
+        self, goals: Goals, solutions: Sequence[list[tuple[Term, Term]]], index: int, height: int
+    ) -> Goals | None:
+        predicate, start = self.enter(goals, index)
+        return self.leave_builtin(predicate, start, super().resolve_solutions(goals, solutions, index, height))
+
+    def resolve_retract(self, goals: Goals, clauses: list[Clause], index: int, height: int) -> Goals | None:
+        predicate, start = self.enter(goals, index)
+        return self.leave_builtin(predicate, start, super().resolve_retract(goals, clauses, index, height))
+
+    def leave_builtin(self, predicate: PredicateProfile, start: float, new_goals: Goals | None) -> Goals | None:
+        end = time.perf_counter()
+        if new_goals is FAIL:
+            predicate.fails += 1
+        else:
+            # Builtins exit as soon as they succeed
+            predicate.exits += 1
+            predicate.cumulative_time += end - start
+        predicate.self_time += end - start
+        return new_goals
+
+    def resolve_answers(
+        self, goals: Goals, answers: list[tuple[list[Term], bool]], index: int, height: int
+    ) -> Goals | None:
+        predicate, start = self.enter(goals, index)
+        resolve_start = time.perf_counter()
+        new_goals = super().resolve_answers(goals, answers, index, height)
+        end = time.perf_counter()
+        if new_goals is FAIL:
+            predicate.fails += 1
+        else:
+            predicate.exits += 1
+            if index == 0:
+                # Includes the evaluation of the table
+                predicate.cumulative_time += end - start
+        predicate.self_time += end - resolve_start
+        return new_goals
+
+    def enter(self, goals: Goals, index: int) -> tuple[PredicateProfile, float]:
+        """Start resolving a call (`index` is 0) or a redo of a predicate, returns its profile and start time"""
+        self.current = predicate = self.profile[goals.goal.functor]
+        if index:
+            predicate.redos += 1
+        start, self.call_start = self.call_start, None
+        return predicate, start if index == 0 and start is not None else time.perf_counter()
+
+    def match(self, templates: list[Template], args: list[Term], frame: list[Term | None]) -> bool:
+        self.current.unifications += 1
+        if super().match(templates, args, frame):
+            self.current.unified += 1
+            return True
+        return False
+
+
+def insert_goal(goals: Goals, tail: Goals | None, goal: ExitPort, depth: int) -> Goals:
+    """Copy the goal list up to `tail` with `goal` inserted before `tail`"""
+    prefix = []
+    while goals is not tail:
+        prefix.append(goals)
+        goals = goals.next
+    goals = Goals(goal, depth, tail)
+    for node in reversed(prefix):
+        goals = Goals(node.goal, node.depth, goals)
+    return goals
@@ -0,0 +1,303 @@
+import sys
+from collections.abc import Hashable, Iterable, Iterator
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from brolog.compiler import Clause, compile_clause
+from brolog.objects import Atom, Function, Number, Predicate, Rule, Term, deref, make_functor
+from brolog.tabling import Tables
+
+
+if TYPE_CHECKING:
+    from brolog.facts import FactTable
+    from brolog.sqlite import SqliteTable
+
+
+def index_key(term: Term) -> Hashable | None:
+    """
+    Return the key under which a clause with `term` as its first argument is indexed.
+
+    Atoms and numbers are keyed by themselves and functions (including lists) by their functor (name and arity).
+    Variables match anything and therefore have no key.
+    """
+    if isinstance(term, Atom | Number):
+        return term
+    if isinstance(term, Function):
+        return term.functor
+    return None
+
+
+# Bound, unbound or either
+MODE_ARGS = ("+", "-", "?")
+# At most one answer for `det` and `semidet`, possibly more for `nondet` and `multi`
+DETERMINISMS = ("det", "semidet", "nondet", "multi")
+
+
+@dataclass(frozen=True)
+class Mode:
+    """
+    A mode declaration, e.g. `:- mode append(+, +, -) is semidet.`
+
+    Each argument is bound when the predicate is called (`+`), unbound (`-`) or either (`?`).
+    The determinism (`det`, `semidet`, `nondet` or `multi`) is optional, see `brolog.analysis`.
+    """
+
+    name: str
+    args: tuple[str, ...]
+    determinism: str | None = None
+
+    @property
+    def functor(self) -> tuple[str, int]:
+        return make_functor(self.name, len(self.args))
+
+    @property
+    def bound(self) -> frozenset[int]:
+        """The positions of the arguments which are bound"""
+        return frozenset(i for i, arg in enumerate(self.args) if arg == "+")
+
+    def __str__(self) -> str:
+        mode = f"{self.name}({', '.join(self.args)})"
+        return mode if self.determinism is None else f"{mode} is {self.determinism}"
+
+
+class PredicateClauses:
+    """
+    All clauses of a single predicate (name/arity), indexed by their first argument.
+
+    Running calls iterate over the lists returned by `candidates`, so they are never changed in place
+    once handed out: the next change copies them first (logical update view). Lists which were not
+    handed out since are changed in place, so that adding many clauses in a row does not copy them each time.
+
+    The other arguments are indexed when every clause has a different key there (a switch argument), so that
+    a call with such an argument bound goes straight to the only clause which can match. Adding a clause updates
+    the switches in place, removing one can turn other arguments into switches, so they are found again by
+    `index_switches` on the next call.
+    """
+
+    def __init__(self) -> None:
+        self.clauses: list[Clause] = []
+        # Clauses whose first argument is a variable, these match any call
+        self.var_clauses: list[Clause] = []
+        # For each first argument key, the clauses which can match it in program order
+        # (i.e. the clauses with that key interleaved with `var_clauses`)
+        self.by_key: dict[Hashable, list[Clause]] = {}
+        # The ids of the lists which can be changed in place
+        self.owned: set[int] = {id(self.clauses), id(self.var_clauses)}
+        # For each switch argument (other than the first), the clause with each key, `None` until they are found
+        self.switches: dict[int, dict[Hashable, Clause]] | None = None
+
+    def own(self, clauses: list[Clause]) -> list[Clause]:
+        """Return `clauses`, or a copy of it if it was handed out to a call"""
+        if id(clauses) in self.owned:
+            return clauses
+        clauses = clauses.copy()
+        self.owned.add(id(clauses))
+        return clauses
+
+    def add(self, clause: Clause, *, front: bool = False) -> None:
+        """Add a clause after the other clauses, or before them with `front=True`"""
+        # Past the end of any list
+        index = 0 if front else sys.maxsize
+        self.clauses = self.own(self.clauses)
+        self.clauses.insert(index, clause)
+        if not clause.rule.head.args:
+            return
+
+        if len(self.clauses) == 1:
+            self.switches = None
+        elif self.switches is not None:
+            for position, by_key in list(self.switches.items()):
+                key = index_key(clause.rule.head.args[position])
+                if key is None or key in by_key:
+                    del self.switches[position]
+                else:
+                    by_key[key] = clause
+
+        key = index_key(clause.rule.head.args[0])
+        if key is None:
+            self.var_clauses = self.own(self.var_clauses)
+            self.var_clauses.insert(index, clause)
+            for other, clauses in self.by_key.items():
+                self.by_key[other] = self.own(clauses)
+                self.by_key[other].insert(index, clause)
+        elif key in self.by_key:
+            self.by_key[key] = self.own(self.by_key[key])
+            self.by_key[key].insert(index, clause)
+        else:
+            clauses = [clause, *self.var_clauses] if front else [*self.var_clauses, clause]
+            self.owned.add(id(clauses))
+            self.by_key[key] = clauses
+
+    def remove(self, clause: Clause) -> bool:
+        """Remove a clause, return False if it was already removed"""
+        if clause not in self.clauses:
+            return False
+        self.clauses = self.remove_from(self.clauses, clause)
+        self.switches = None
+        if not clause.rule.head.args:
+            return True
+
+        key = index_key(clause.rule.head.args[0])
+        if key is None:
+            self.var_clauses = self.remove_from(self.var_clauses, clause)
+            for other, clauses in self.by_key.items():
+                self.by_key[other] = self.remove_from(clauses, clause)
+        else:
+            clauses = self.remove_from(self.by_key[key], clause)
+            if len(clauses) == len(self.var_clauses):
+                # No clause has this key anymore
+                self.owned.discard(id(clauses))
+                del self.by_key[key]
+            else:
+                self.by_key[key] = clauses
+        return True
+
+    def remove_from(self, clauses: list[Clause], clause: Clause) -> list[Clause]:
+        # Clauses (and rules) are compared by identity
+        clauses = self.own(clauses)
+        clauses.remove(clause)
+        return clauses
+
+    def index_switches(self) -> None:
+        """Find the arguments other than the first where every clause has a different key, and index them"""
+        self.switches = {}
+        if not self.clauses:
+            return
+        for position in range(1, self.clauses[0].rule.head.arity):
+            by_key = {}
+            for clause in self.clauses:
+                key = index_key(clause.rule.head.args[position])
+                if key is None or key in by_key:
+                    break
+                by_key[key] = clause
+            else:
+                self.switches[position] = by_key
+
+    def candidates(self, first_arg: Term | None, args: list[Term] | None = None) -> list[Clause]:
+        """The clauses which may match a call with the given first argument, or with the given arguments"""
+        if first_arg is None or (key := index_key(first_arg)) is None:
+            clauses = self.clauses
+        else:
+            clauses = self.by_key.get(key, self.var_clauses)
+        if self.switches is None:
+            self.index_switches()
+        if self.switches and args is not None and len(clauses) > 1:
+            for position, by_key in self.switches.items():
+                if (key := index_key(deref(args[position]))) is not None:
+                    clause = by_key.get(key)
+                    return [] if clause is None else [clause]
+        # The caller may still be iterating over the list when the predicate changes
+        self.owned.discard(id(clauses))
+        return clauses
+
+    def __getstate__(self) -> dict:
+        # The ids are meaningless in another process
+        return self.__dict__ | {"owned": set()}
+
+
+class Program:
+    """
+    A Prolog program, i.e. a list of rules with a clause index.
+
+    The index is keyed on the predicate name/arity and the type/functor of the first argument.
+    It is built when the program is created and updated as rules are added or removed, so that the solver
+    only needs to consider clauses which can possibly match a goal. Each rule is also compiled once for the
+    trail engine.
+
+    Calls to the predicates in `tabled` are memoized in `tables` by the trail engine.
+    The predicates in `facts` have no clauses, their calls are answered from a `brolog.facts.FactTable`
+    or a `brolog.sqlite.SqliteTable`.
+    """
+
+    def __init__(
+        self,
+        rules: Iterable[Rule] = (),
+        *,
+        tabled: Iterable[tuple[str, int]] = (),
+        modes: Iterable[Mode] = (),
+        max_table_size: int | None = None,
+    ) -> None:
+        self.rules: list[Rule] = []
+        self.predicates: dict[tuple[str, int], PredicateClauses] = {}
+        self.tabled: set[tuple[str, int]] = set(tabled)
+        self.tables = Tables(max_size=max_table_size)
+        # Predicates whose facts are stored in a table instead of clauses
+        self.facts: dict[tuple[str, int], "FactTable | SqliteTable"] = {}
+        # The declared modes of each predicate
+        self.modes: dict[tuple[str, int], list[Mode]] = {}
+        for mode in modes:
+            self.declare_mode(mode)
+        for rule in rules:
+            self.add(rule)
+
+    def table(self, name: str, arity: int) -> None:
+        self.tabled.add((name, arity))
+        self.tables.clear()
+
+    def declare_mode(self, mode: Mode) -> None:
+        self.modes.setdefault(mode.functor, []).append(mode)
+
+    def add_facts(self, table: "FactTable | SqliteTable") -> None:
+        """Answer the calls to the predicate of `table` with its rows, the predicate must not have clauses"""
+        if table.functor in self.predicates:
+            msg = f"{table.name}/{table.arity} is already defined by clauses"
+            raise ValueError(msg)
+        if self.tables:
+            self.tables.clear()
+        self.facts[table.functor] = table
+
+    def add(self, rule: Rule, *, front: bool = False) -> Clause:
+        """Add a rule after the other clauses of its predicate, or before them with `front=True` (`asserta/1`)"""
+        if rule.head.functor in self.facts:
+            msg = f"{rule.head.name}/{rule.head.arity} is stored in a fact table"
+            raise ValueError(msg)
+        if self.tables:
+            # The stored answers may no longer be complete
+            self.tables.clear()
+        if front:
+            self.rules.insert(0, rule)
+        else:
+            self.rules.append(rule)
+        key = rule.head.functor
+        if key not in self.predicates:
+            self.predicates[key] = PredicateClauses()
+        clause = compile_clause(rule)
+        self.predicates[key].add(clause, front=front)
+        return clause
+
+    def remove(self, clause: Clause) -> bool:
+        """Remove a clause (`retract/1`), return False if it was already removed"""
+        if not self.predicates[clause.rule.head.functor].remove(clause):
+            return False
+        if self.tables:
+            self.tables.clear()
+        self.rules.remove(clause.rule)
+        return True
+
+    def candidates(self, goal: Predicate) -> list[Rule]:
+        """Return the rules which may unify with `goal` in program order."""
+        return [clause.rule for clause in self.lookup(goal.functor, goal.args[0] if goal.args else None, goal.args)]
+
+    def lookup(self, functor: tuple[str, int], first_arg: Term | None, args: list[Term] | None = None) -> list[Clause]:
+        """
+        Return the clauses of `functor` (name/arity) which may match a call with the given first argument.
+
+        With the arguments of the call, its switch arguments are used as well (see `PredicateClauses`).
+        The list is not affected by later changes to the program.
+        """
+        if (clauses := self.predicates.get(functor)) is None:
+            return []
+        return clauses.candidates(first_arg, args)
+
+    def __getstate__(self) -> dict:
+        # Answer tables are not worth persisting, they are recomputed on demand
+        return self.__dict__ | {"tables": Tables(max_size=self.tables.max_size)}
+
+    def __iter__(self) -> Iterator[Rule]:
+        return iter(self.rules)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def __repr__(self) -> str:
+        return "\n".join(repr(rule) for rule in self.rules)
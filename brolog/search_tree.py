@@ -0,0 +1,158 @@
+"""
+Bounded recording of the search tree of the substitution engine.
+
+Each resolution step is a node of the tree, the child of the step it came from. A `TreeRecorder`
+turns a node into a `TreeNode` record (its goals and the bindings of the step, as text) as soon as it
+is visited, so that nothing keeps the states of the engine alive:
+
+- `TreeBuffer` keeps the last nodes in memory, in a ring buffer
+- `DotWriter` and `JsonlWriter` stream the nodes to a file
+
+`max_depth` and `max_nodes` stop recording below a depth or after a number of nodes.
+"""
+
+import json
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Self, TextIO
+
+from brolog.objects import Term, Variable
+
+
+if TYPE_CHECKING:
+    from brolog.solver import QueryState
+
+
+@dataclass(frozen=True, slots=True)
+class TreeNode:
+    id: int
+    # None for the root
+    parent: int | None
+    depth: int
+    goals: list[str]
+    # The bindings made by the step which led to this node
+    bindings: dict[str, str]
+
+
+class TreeRecorder(ABC):
+    """Records the nodes of a search tree, pass it as `query(..., with_search_tree=recorder)`"""
+
+    def __init__(self, *, max_depth: int | None = None, max_nodes: int | None = None) -> None:
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        # Number of nodes recorded so far
+        self.nodes = 0
+
+    def root(self) -> "RecordedNode":
+        return RecordedNode(self, None, 0)
+
+    def record(self, parent: int | None, state: "QueryState", bindings: dict[Variable, Term]) -> int | None:
+        """Record the node of `state` reached with `bindings`, returns its id or None if it is past the limits"""
+        if (self.max_depth is not None and state.search_depth > self.max_depth) or (
+            self.max_nodes is not None and self.nodes >= self.max_nodes
+        ):
+            return None
+        node = TreeNode(
+            self.nodes, parent, state.search_depth, [str(goal) for goal in state.stack], format_bindings(bindings)
+        )
+        self.nodes += 1
+        self.write(node)
+        return node.id
+
+    @abstractmethod
+    def write(self, node: TreeNode) -> None:
+        """Store a recorded node"""
+
+    def close(self) -> None:  # noqa: B027 (optional, only recorders which write to a file need it)
+        """Release the resources of the recorder, nothing by default"""
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+class RecordedNode:
+    """The position of the engine in a recorded tree"""
+
+    __slots__ = ("recorder", "id", "steps")
+
+    def __init__(self, recorder: TreeRecorder, node_id: int | None, steps: int) -> None:
+        self.recorder = recorder
+        self.id = node_id
+        # Number of variable assignments of the state of the node
+        self.steps = steps
+
+    def child(self, state: "QueryState") -> Self | None:
+        """Record a child node, returns None if it is not recorded and neither should its descendants"""
+        steps = len(state.variable_assignments)
+        # A cut does not bind anything
+        bindings = state.variable_assignments[-1] if steps > self.steps else {}
+        if (node_id := self.recorder.record(self.id, state, bindings)) is None:
+            return None
+        return RecordedNode(self.recorder, node_id, steps)
+
+
+class TreeBuffer(TreeRecorder):
+    """Keeps the last `size` nodes in memory"""
+
+    def __init__(self, size: int, *, max_depth: int | None = None, max_nodes: int | None = None) -> None:
+        super().__init__(max_depth=max_depth, max_nodes=max_nodes)
+        self.buffer: deque[TreeNode] = deque(maxlen=size)
+
+    def write(self, node: TreeNode) -> None:
+        self.buffer.append(node)
+
+
+class FileWriter(TreeRecorder):
+    def __init__(
+        self, output: Path | str | TextIO, *, max_depth: int | None = None, max_nodes: int | None = None
+    ) -> None:
+        super().__init__(max_depth=max_depth, max_nodes=max_nodes)
+        self.owned = isinstance(output, Path | str)
+        self.file = Path(output).open("w") if self.owned else output  # noqa: SIM115
+
+    def close(self) -> None:
+        if self.owned:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class JsonlWriter(FileWriter):
+    """Writes a JSON record per node"""
+
+    def write(self, node: TreeNode) -> None:
+        self.file.write(json.dumps(asdict(node)) + "\n")
+
+
+class DotWriter(FileWriter):
+    """Writes the tree as a Graphviz digraph, the edges are labelled with the bindings of each step"""
+
+    def __init__(
+        self, output: Path | str | TextIO, *, max_depth: int | None = None, max_nodes: int | None = None
+    ) -> None:
+        super().__init__(output, max_depth=max_depth, max_nodes=max_nodes)
+        self.file.write("digraph search_tree {\n")
+
+    def write(self, node: TreeNode) -> None:
+        goals = ", ".join(node.goals) or "true"
+        self.file.write(f"  n{node.id} [label={quote(goals)}];\n")
+        if node.parent is not None:
+            bindings = ", ".join(f"{v} = {t}" for v, t in node.bindings.items())
+            self.file.write(f"  n{node.parent} -> n{node.id} [label={quote(bindings)}];\n")
+
+    def close(self) -> None:
+        self.file.write("}\n")
+        super().close()
+
+
+def format_bindings(bindings: dict[Variable, Term]) -> dict[str, str]:
+    return {str(variable): str(value) for variable, value in bindings.items()}
+
+
+def quote(label: str) -> str:
+    return '"' + label.replace("\\", "\\\\").replace('"', '\\"') + '"'
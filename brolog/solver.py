@@ -1,10 +1,36 @@
+import asyncio
 import itertools
-from collections.abc import Callable, Generator
+import sys
+from collections.abc import AsyncGenerator, Callable, Generator, Iterator, Sequence
+from contextlib import nullcontext
 from dataclasses import dataclass, field, fields
 from typing import Self
 
-from brolog.objects import Atom, Cut, Function, Predicate, Rule, Symbol, Term, Variable
+from brolog.aggregates import AGGREGATES
+from brolog.arithmetic import ARITHMETIC, COMPARISONS, IS, evaluate
+from brolog.database import ASSERT, RETRACT, as_clause, as_goal, clause_term, retract_candidates
+from brolog.engine import FAIL_GOAL, PAUSE, CutBarrier, Engine, renamer, scope_cuts
+from brolog.limits import Governor, Limits
+from brolog.lists import BUILTINS, LIBRARY
+from brolog.objects import (
+    ArrayList,
+    Atom,
+    Control,
+    Cut,
+    Function,
+    Number,
+    Predicate,
+    Rule,
+    Symbol,
+    Term,
+    Variable,
+    make_number,
+)
+from brolog.parallel import ParallelSolver
 from brolog.parse import Parser
+from brolog.profiler import Profile, ProfilingEngine
+from brolog.program import Program
+from brolog.search_tree import RecordedNode, TreeRecorder
 
 
 try:
@@ -13,40 +39,64 @@ except ImportError:
     nx = None
 
 
-def contains(term: Term, x: Variable) -> bool:
-    match term:
-        case Variable() as y:
-            return x == y
-        case Function(args=args):
-            return any(contains(arg, x) for arg in args)
-        case _:
-            return False
+def walk(term: Term, bindings: dict[Variable, Term]) -> Term:
+    """Follow the bindings of a variable until reaching a non-variable or an unbound variable."""
+    while isinstance(term, Variable) and term in bindings:
+        term = bindings[term]
+    return term
+
+
+def contains(term: Term, x: Variable, bindings: dict[Variable, Term] | None = None) -> bool:
+    """Check whether `x` occurs in `term`, following `bindings`."""
+    bindings = bindings or {}
+    stack = [term]
+    while stack:
+        match walk(stack.pop(), bindings):
+            case Variable() as y if x == y:
+                return True
+            case Function(args=args):
+                stack.extend(args)
+    return False
 
 
-def substitute(node: Symbol, substitution: dict[Variable, Term] | Callable[[Variable], Variable]) -> Symbol:
+def substitute(  # noqa: PLR0911
+    node: Symbol,
+    substitution: dict[Variable, Term] | Callable[[Variable], Variable],
+    active: set[Variable] | None = None,
+) -> Symbol:
     """
     Replace all variables in a symbol (predicate or term) with its corresponding value.
 
-    The value can be another variable.
+    The value can be another variable. `active` holds the variables whose values are being substituted:
+    without the occurs check a value can contain its own variable (e.g. `X = f(X)`), which is then kept as is.
     """
     match node:
-        case Atom() as atom:
-            return atom
-        case Cut() as cut:
-            return cut
+        case Atom() | Number():
+            return node
+        case Cut() | CutBarrier():
+            return node
         case Predicate(name=name, args=args):
-            args = [substitute(arg, substitution) for arg in args]
-            return Predicate(name=name, args=args)
+            args = [substitute(arg, substitution, active) for arg in args]
+            return type(node)(name=name, args=args)
+        case ArrayList(cells=cells, start=start):
+            return ArrayList([substitute(cell, substitution, active) for cell in itertools.islice(cells, start, None)])
         case Function(name=name, args=args) as f:
-            args = [substitute(arg, substitution) for arg in args]
+            args = [substitute(arg, substitution, active) for arg in args]
             return type(f)(name=name, args=args)
         case Variable() as v:
             if callable(substitution):
                 return substitution(v)
+            active = set() if active is None else active
+            bound = []
             while v in substitution:
+                if v in active:
+                    return v
+                bound.append(v)
                 v = substitution[v]
             if isinstance(v, Function):
-                v = substitute(v, substitution)
+                active.update(bound)
+                v = substitute(v, substitution, active)
+                active.difference_update(bound)
             return v
 
 
@@ -64,34 +114,37 @@ def relabel(rule: Rule) -> Rule:
     )
 
 
-def unify(x: Symbol | list[Term], y: Symbol | list[Term]) -> dict[Variable, Term] | None:  # noqa: PLR0911
-    match (x, y):
-        case (Atom(), Atom()) if x.name == y.name:
-            return {}
-        case (Function(), Function()) if x.name == y.name and x.arity == y.arity:
-            return unify(x.args, y.args)
-        case (Predicate(), Predicate()) if x.name == y.name and x.arity == y.arity:
-            return unify(x.args, y.args)
-        case (Variable(), Variable()):
-            if x == y:
-                return {}
-            return {x: y}
-        case (Variable(), (Atom() | Function()) as term):
-            if not contains(term, x):
-                return {x: term}
-        case ((Atom() | Function()) as term, Variable()):
-            if not contains(term, y):
-                return {y: term}
-        case (list(), list()) if len(x) == len(y):
-            current = {}
-            for a, b in zip(x, y, strict=True):
-                asub = substitute(a, current)
-                bsub = substitute(b, current)
-
-                if (new := unify(asub, bsub)) is None:
+def unify(x: Symbol | list[Term], y: Symbol | list[Term], *, occurs_check: bool = False) -> dict[Variable, Term] | None:
+    """
+    Unify two symbols (or lists of terms), returning the variable bindings or None if they do not unify.
+
+    The bindings are triangular: a bound value may contain variables which are bound themselves,
+    `substitute()` follows them. Each node is visited once so unification is linear in the size of the terms.
+    Like in standard Prolog, a variable is not checked to not occur in its value unless `occurs_check` is set.
+    """
+    bindings = {}
+    stack = [(x, y)]
+    while stack:
+        x, y = stack.pop()
+        match (walk(x, bindings), walk(y, bindings)):
+            case (list() as xs, list() as ys) if len(xs) == len(ys):
+                # Unify from left to right
+                stack.extend(reversed(list(zip(xs, ys, strict=True))))
+            case (Variable() as v, Variable() as w) if v == w:
+                pass
+            case (Variable() as v, term) | (term, Variable() as v):
+                if occurs_check and contains(term, v, bindings):
                     return None
-                current |= new
-            return current
+                bindings[v] = term
+            case (Atom() as a, Atom() as b) if a is b:
+                pass
+            case (Number() as a, Number() as b) if a == b:
+                pass
+            case (Function() as f, Function() as g) | (Predicate() as f, Predicate() as g) if f.functor is g.functor:
+                stack.extend(reversed(list(zip(f.args, g.args, strict=True))))
+            case _:
+                return None
+    return bindings
 
 
 def instantiate(pred: Predicate, assignments: list[dict[Variable, Term]]) -> Predicate:
@@ -101,37 +154,79 @@ def instantiate(pred: Predicate, assignments: list[dict[Variable, Term]]) -> Pre
 
 
 def get_variable_assignments(q: Predicate, assignments: list[dict[Variable, Term]]) -> dict[Variable, Term]:
-    return {v: instantiate(v, assignments) for v in get_variables(q)}
+    """
+    The value of each variable of the query in a proof.
+
+    A variable is bound at most once along a proof, so the assignments of its steps are merged into a single
+    dictionary and each value is built in one pass, instead of substituting the assignments one after the other.
+    """
+    if len(assignments) == 1:
+        bindings = assignments[0]
+    else:
+        bindings = {}
+        for assignment in assignments:
+            bindings.update(assignment)
+    return {v: substitute(v, bindings) for v in get_variables(q)}
 
 
 def get_variables(symbol: Symbol) -> list[Variable]:
     def _get_variables(symbol: Symbol) -> list[Variable]:
         match symbol:
-            case Atom():
+            case Atom() | Number():
                 return []
             case Variable() as v:
                 return [v]
+            case ArrayList(cells=cells, start=start):
+                return itertools.chain.from_iterable(
+                    _get_variables(cell) for cell in itertools.islice(cells, start, None)
+                )
             case Function(args=args) | Predicate(args=args):
                 return itertools.chain.from_iterable(_get_variables(arg) for arg in args)
 
     return list(dict.fromkeys(_get_variables(symbol)))
 
 
-def get_cuts(stack: list[Predicate]) -> set[Cut]:
-    return {pred for pred in stack if isinstance(pred, Cut)}
+class CutSignal:
+    """
+    Raised when backtracking into a cut, until the calls it prunes have been left.
+
+    A cut in a clause body is replaced by a barrier with the search depth of the clause's call.
+    Backtracking into it sets the signal to that depth: the calls deeper than it stop trying alternatives,
+    the call at that depth clears the signal. Pruning therefore does not depend on the size of the stack.
+    """
+
+    __slots__ = ("height",)
 
+    def __init__(self) -> None:
+        self.height: int | None = None
 
-def cut_active(stack: list[Predicate], cuts: set[Cut]) -> bool:
-    return any(cut in cuts for cut in get_cuts(stack))
+    def cut(self, height: int) -> None:
+        self.height = height if self.height is None else min(self.height, height)
+
+    def pruned(self, depth: int) -> bool:
+        """Whether the call at `depth` must not try its alternatives, clears the signal if it is its barrier"""
+        if self.height is None:
+            return False
+        if depth <= self.height:
+            self.height = None
+        return True
 
 
 @dataclass
 class QueryState:
-    rules: list[Rule]
+    rules: Program | list[Rule]
     stack: list[Predicate]
     search_depth: int = 0
-    active_cuts: set[Cut] = field(default_factory=set)
+    # Shared by all states of a query
+    cut: CutSignal = field(default_factory=CutSignal)
     variable_assignments: list[dict[Variable, Term]] = field(default_factory=list)
+    occurs_check: bool = False
+    # Shared by all states of a query
+    governor: Governor = field(default_factory=Governor)
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.rules, Program):
+            self.rules = Program(self.rules)
 
     def make_new(self, **kwargs) -> Self:
         # asdict() creates a deep copy but wee need to preserve the original objects
@@ -155,6 +250,11 @@ class SearchTree:
             variable_assignments=state.variable_assignments,
         )
 
+    def child(self, state: QueryState) -> Self:
+        node = SearchTree.from_query_state(state)
+        self.children.append(node)
+        return node
+
     if nx is not None:
         from networkx import DiGraph
 
@@ -169,87 +269,347 @@ class SearchTree:
         def _make_graph(self, G: DiGraph) -> None:
             for child in self.children:
                 G.add_edge(str(self.stack), str(child.stack), label=str(child.variable_assignments))
-                self._make_graph(G, child)
+                child._make_graph(G)  # noqa: SLF001
+
 
+ENGINES = ("trail", "substitution")
 
-def query(
-    rules: list[Predicate] | str, q: Predicate | str, *, with_search_tree: bool = False
+
+def query(  # noqa: C901, PLR0913
+    rules: Program | list[Rule] | str,
+    q: Predicate | str,
+    *,
+    with_search_tree: bool | TreeRecorder = False,
+    engine: str | None = None,
+    occurs_check: bool = False,
+    workers: int | None = None,
+    ordered: bool = False,
+    limits: Limits | None = None,
+    profile: bool | Profile = False,
 ) -> (
     Generator[list[dict[Variable, Term]], None, None]
     | tuple[Generator[list[dict[Variable, Term]], None, None], SearchTree]
 ):
-    if isinstance(rules, str):
-        rules = Parser(rules).parse()
-    if isinstance(q, str):
-        q = Parser(q).parse(head_only=True)
+    """
+    Prove a query, yielding a list of variable assignments for every proof.
+
+    The default engine is the trail engine (`brolog.engine`) which yields a single assignment
+    holding the final value of each query variable. The substitution engine yields the
+    assignments made at each resolution step and is the only one which can record a search tree.
+    Either way, use `get_variable_assignments()` to read the answer.
+
+    `with_search_tree=True` returns the whole search tree along with the answers, it keeps every state
+    of the query in memory. Pass a `brolog.search_tree.TreeRecorder` instead to keep only the last nodes
+    or stream them to a file, optionally up to a depth or number of nodes.
+
+    As in standard Prolog, unification omits the occurs check by default. Pass `occurs_check=True`
+    to make e.g. `X = f(X)` fail instead of creating a cyclic term.
 
-    state = QueryState(rules, [q])
-    search_tree = SearchTree([q])
+    With `workers`, the alternative branches near the root of the search tree are explored in
+    parallel by a pool of processes (see `brolog.parallel`) and answers are yielded as they are found.
+    Pass `ordered=True` to get them in the same order as sequential execution. Programs and queries which
+    change the program (`assertz/1`, `asserta/1`, `retract/1`) are run sequentially instead.
 
+    `limits` bounds the inferences, depth, choicepoints and time of the query (of each branch with `workers`).
+    Exceeding one of them raises `brolog.limits.LimitExceeded`.
+
+    With `profile=True`, a per-predicate profile (see `brolog.profiler`) is printed to stderr once the query
+    is done. Pass a `Profile` instead to collect it there.
+    """
+    if engine is None:
+        engine = "trail" if with_search_tree is False else "substitution"
+    if engine not in ENGINES:
+        msg = f"Unknown engine: {engine}"
+        raise ValueError(msg)
+    if with_search_tree is not False and engine != "substitution":
+        msg = "Search trees can only be recorded by the substitution engine"
+        raise ValueError(msg)
+    if workers is not None and workers > 1 and engine != "trail":
+        msg = "Parallel execution is only supported by the trail engine"
+        raise ValueError(msg)
+    if profile is not False and (engine != "trail" or (workers is not None and workers > 1)):
+        msg = "Profiling is only supported by the trail engine without workers"
+        raise ValueError(msg)
+
+    rules, q = _parse(rules, q)
+    if workers is not None and workers > 1:
+        return _query_parallel(rules, q, workers, ordered=ordered, occurs_check=occurs_check, limits=limits)
+    if profile is not False:
+        return _query_profiled(rules, q, profile, occurs_check=occurs_check, limits=limits)
+    if engine == "trail":
+        return ([assignments] for assignments in Engine(rules, occurs_check=occurs_check, limits=limits).solve(q))
+
+    state = QueryState(rules, [scope_cuts(q, 0)], occurs_check=occurs_check, governor=Governor(limits))
+    if isinstance(with_search_tree, TreeRecorder):
+        return _query(state, with_search_tree.root())
     if with_search_tree:
+        search_tree = SearchTree([q])
         return _query(state, search_tree), search_tree
-    return _query(state, search_tree)
+    return _query(state)
+
+
+async def aquery(
+    rules: Program | list[Rule] | str,
+    q: Predicate | str,
+    *,
+    pause_every: int = 1000,
+    occurs_check: bool = False,
+    limits: Limits | None = None,
+) -> AsyncGenerator[list[dict[Variable, Term]], None]:
+    """
+    Prove a query with the trail engine without blocking the event loop.
+
+    Answers are yielded in the same format as `query()`. Control is handed back to the event loop
+    after every `pause_every` inferences so that concurrent queries are interleaved fairly.
+    The query can be cancelled (e.g. by `asyncio.timeout()`) whenever it is paused.
+    The evaluation of a tabled call is not interrupted.
+    """
+    rules, q = _parse(rules, q)
+    for result in Engine(rules, occurs_check=occurs_check, limits=limits).solve(q, pause_every=pause_every):
+        if result is PAUSE:
+            await asyncio.sleep(0)
+        else:
+            yield [result]
+
+
+def _parse(rules: Program | list[Rule] | str, q: Predicate | str) -> tuple[Program, Predicate]:
+    if isinstance(rules, str):
+        rules = Parser(rules).parse_program()
+    if not isinstance(rules, Program):
+        rules = Program(rules)
+    if isinstance(q, str):
+        q = Parser(q).parse_query()
+    return rules, q
+
+
+def _query_profiled(
+    rules: Program, q: Predicate, profile: bool | Profile, *, occurs_check: bool, limits: Limits | None
+) -> Generator[list[dict[Variable, Term]], None, None]:
+    collected = profile if isinstance(profile, Profile) else Profile()
+    engine = ProfilingEngine(rules, collected, occurs_check=occurs_check, limits=limits)
+    try:
+        yield from ([assignments] for assignments in engine.solve(q))
+    finally:
+        if profile is True:
+            sys.stderr.write(collected.report() + "\n")
 
 
-def _query(state: QueryState, search_tree: SearchTree) -> Generator[list[dict[Variable, Term]], None, None]:
-    tree_node = SearchTree.from_query_state(state)
-    search_tree.children.append(tree_node)
+def _query_parallel(  # noqa: PLR0913
+    rules: Program, q: Predicate, workers: int, *, ordered: bool, occurs_check: bool, limits: Limits | None
+) -> Generator[list[dict[Variable, Term]], None, None]:
+    with ParallelSolver(rules, workers, occurs_check=occurs_check, limits=limits) as solver:
+        yield from solver.query(q, ordered=ordered)
+
+
+def _query(
+    state: QueryState, search_tree: SearchTree | RecordedNode | None = None
+) -> Generator[list[dict[Variable, Term]], None, None]:
+    # The node of this step, None when it is not recorded
+    tree_node = search_tree.child(state) if search_tree is not None else None
 
     # If the stack is empty, we have proven the query
     if not state.stack:
         yield state.variable_assignments
         return
 
+    state.governor.step(state.search_depth)
     predicate, stack = state.stack[0], state.stack[1:]
 
-    if isinstance(predicate, Cut):
-        # Activate the cut for the current branch
-        state.active_cuts.add(predicate)
-        yield from _query(
-            state.make_new(stack=stack),
-            tree_node,
-        )
+    if isinstance(predicate, Cut | CutBarrier):
+        yield from _query(state.make_new(stack=stack), tree_node)
+        # Backtracking into a cut fails the call of its clause (a cut in the query has nothing left to prune)
+        state.cut.cut(predicate.height if isinstance(predicate, CutBarrier) else 0)
         return
 
-    skip_alternatives = False
-    for rule in state.rules:
-        # If there is an active cut, we must not bactrack beyond the active cut
-        if cut_active(stack, state.active_cuts):
-            break
-
-        # If we activated a cut when evaluating a branch, we must not evaluate any alternatives
-        if skip_alternatives:
-            break
+    if isinstance(predicate, Control):
+        yield from _call_control(state, predicate, stack, tree_node)
+        return
 
+    depth = state.search_depth
+    # Only consider the clauses which can match the goal's name/arity and first argument
+    candidates = state.rules.candidates(predicate)
+    if not candidates and predicate.functor not in state.rules.predicates:
+        if (proofs := _call_builtin_goal(state, predicate, stack, tree_node)) is not None:
+            yield from proofs
+            return
+        candidates = LIBRARY.candidates(predicate)
+    for i, rule in enumerate(candidates):
         rule = relabel(rule)  # noqa: PLW2901
-        if (assignment := unify(predicate, rule.head)) is None:
+        if (assignment := unify(predicate, rule.head, occurs_check=state.occurs_check)) is None:
             continue
 
-        # Apply the unification assignments to the stack
+        # Apply the unification assignments to the stack, the cuts of the body prune back to this call
         new_stack = [substitute(p, assignment) for p in stack]
+        body = [scope_cuts(substitute(p, assignment), depth) for p in rule.body]
 
-        if not rule.body:
+        # The remaining clauses are an open choicepoint while this one is explored
+        choicepoint = state.governor.choicepoint(depth) if i + 1 < len(candidates) else nullcontext()
+        with choicepoint:
             yield from _query(
                 state.make_new(
-                    stack=new_stack,
+                    stack=body + new_stack,
                     variable_assignments=[*state.variable_assignments, assignment],
                 ),
                 tree_node,
             )
-        else:
-            body = [substitute(p, assignment) for p in rule.body]
-            cuts = get_cuts(body)
+        if state.cut.pruned(depth):
+            break
+
+
+def _call_builtin_goal(  # noqa: PLR0911
+    state: QueryState, goal: Predicate, stack: list[Predicate], tree_node: SearchTree | RecordedNode | None
+) -> Generator[list[dict[Variable, Term]], None, None] | None:
+    """Return the proofs of a call to a builtin or a fact table, or None to resolve it with the library clauses"""
+    if (table := state.rules.facts.get(goal.functor)) is not None:
+        return _call_builtin(state, table.solutions(goal.args), stack, tree_node)
+    if goal.functor in ARITHMETIC:
+        return _call_arithmetic(state, goal, stack, tree_node)
+    if (builtin := BUILTINS.get(goal.functor)) and (solutions := builtin(*goal.args)) is not None:
+        return _call_builtin(state, solutions, stack, tree_node)
+    if (aggregate := AGGREGATES.get(goal.functor)) is not None:
+
+        def collect(template: Term, goal: Term) -> Iterator[Term]:
+            return _collect(state, template, goal, tree_node)
+
+        return _call_builtin(state, aggregate(collect, *goal.args), stack, tree_node)
+    if (assert_ := ASSERT.get(goal.functor)) is not None:
+        return _call_builtin(state, assert_(state.rules, goal.args[0]), stack, tree_node)
+    if goal.functor is RETRACT:
+        return _call_retract(state, goal, stack, tree_node)
+    return None
+
+
+def _call_arithmetic(
+    state: QueryState, goal: Predicate, stack: list[Predicate], tree_node: SearchTree | RecordedNode | None
+) -> Generator[list[dict[Variable, Term]], None, None]:
+    """Evaluate `is/2` or a comparison, the goal is instantiated so its expressions are evaluated as they are"""
+    left, right = goal.args
+    if goal.functor is not IS:
+        if COMPARISONS[goal.functor](evaluate(left), evaluate(right)):
+            yield from _query(state.make_new(stack=stack), tree_node)
+        return
+
+    if (assignment := unify(left, make_number(evaluate(right)), occurs_check=state.occurs_check)) is None:
+        return
+    yield from _query(
+        state.make_new(
+            stack=[substitute(p, assignment) for p in stack],
+            variable_assignments=[*state.variable_assignments, assignment],
+        ),
+        tree_node,
+    )
+
+
+def _call_builtin(
+    state: QueryState,
+    solutions: Sequence[list[tuple[Term, Term]]],
+    stack: list[Predicate],
+    tree_node: SearchTree | RecordedNode | None,
+) -> Generator[list[dict[Variable, Term]], None, None]:
+    """Try the solutions of a list builtin like the clauses of a predicate"""
+    depth = state.search_depth
+    for i, pairs in enumerate(solutions):
+        xs, ys = [x for x, _ in pairs], [y for _, y in pairs]
+        if (assignment := unify(xs, ys, occurs_check=state.occurs_check)) is None:
+            continue
+        choicepoint = state.governor.choicepoint(depth) if i + 1 < len(solutions) else nullcontext()
+        with choicepoint:
             yield from _query(
                 state.make_new(
-                    stack=body + new_stack,
+                    stack=[substitute(p, assignment) for p in stack],
                     variable_assignments=[*state.variable_assignments, assignment],
                 ),
                 tree_node,
             )
-            if state.active_cuts & cuts:
-                # A cut which is on the stack was activated in a previous branch,
-                # We must not evaluate any alternatives
-                skip_alternatives = True
-            # Deactivate cuts when leaving this branch
-            for cut in cuts:
-                state.active_cuts.discard(cut)
+        if state.cut.pruned(depth):
+            break
+
+
+def _call_retract(
+    state: QueryState, goal: Predicate, stack: list[Predicate], tree_node: SearchTree | RecordedNode | None
+) -> Generator[list[dict[Variable, Term]], None, None]:
+    """Remove the first clause which unifies with the argument, and the next ones on backtracking"""
+    depth = state.search_depth
+    pattern = as_clause(goal.args[0])
+    clauses = retract_candidates(state.rules, goal.args[0])
+    for i, clause in enumerate(clauses):
+        term = clause_term(relabel(clause.rule))
+        if (assignment := unify(pattern, term, occurs_check=state.occurs_check)) is None:
+            continue
+        if not state.rules.remove(clause):
+            # Already retracted
+            continue
+        choicepoint = state.governor.choicepoint(depth) if i + 1 < len(clauses) else nullcontext()
+        with choicepoint:
+            yield from _query(
+                state.make_new(
+                    stack=[substitute(p, assignment) for p in stack],
+                    variable_assignments=[*state.variable_assignments, assignment],
+                ),
+                tree_node,
+            )
+        if state.cut.pruned(depth):
+            break
+
+
+def _collect(
+    state: QueryState, template: Term, goal: Term, tree_node: SearchTree | RecordedNode | None
+) -> Iterator[Term]:
+    """Prove a goal, yielding a copy of `template` with fresh variables for each proof (see `brolog.aggregates`)"""
+    # The cuts of the goal are local to it
+    proofs = _query(state.make_new(stack=[scope_cuts(as_goal(goal), state.search_depth + 1)]), tree_node)
+    try:
+        for proof in proofs:
+            value = instantiate(template, proof[len(state.variable_assignments) :])
+            yield substitute(value, renamer({}))
+    finally:
+        proofs.close()
+        state.cut.pruned(state.search_depth + 1)
+
+
+def _call_control(
+    state: QueryState, goal: Control, stack: list[Predicate], tree_node: SearchTree | RecordedNode | None
+) -> Generator[list[dict[Variable, Term]], None, None]:
+    match goal.name:
+        case "true":
+            yield from _query(state.make_new(stack=stack), tree_node)
+        case "fail":
+            return
+        case ",":
+            yield from _query(state.make_new(stack=[*goal.args, *stack]), tree_node)
+        case ";" if isinstance(left := goal.args[0], Control) and left.name == "->":
+            yield from _if_then_else(state, *left.args, goal.args[1], stack, tree_node)
+        case ";":
+            with state.governor.choicepoint(state.search_depth):
+                yield from _query(state.make_new(stack=[goal.args[0], *stack]), tree_node)
+            if not state.cut.pruned(state.search_depth):
+                yield from _query(state.make_new(stack=[goal.args[1], *stack]), tree_node)
+        case "->":
+            yield from _if_then_else(state, *goal.args, None, stack, tree_node)
+        case "\\+":
+            yield from _if_then_else(state, goal.args[0], FAIL_GOAL, Control("true", []), stack, tree_node)
+
+
+def _if_then_else(  # noqa: PLR0913
+    state: QueryState,
+    condition: Predicate,
+    then: Predicate,
+    else_: Predicate | None,
+    stack: list[Predicate],
+    tree_node: SearchTree | RecordedNode | None,
+) -> Generator[list[dict[Variable, Term]], None, None]:
+    """Prove the condition once, then continue with `then`, or with `else_` (if any) if it has no proof"""
+    # The cuts of the condition are local to it
+    proofs = _query(state.make_new(stack=[scope_cuts(condition, state.search_depth + 1)]), tree_node)
+    proof = next(proofs, None)
+    proofs.close()
+    state.cut.pruned(state.search_depth + 1)
+
+    if proof is not None:
+        assignments = proof[len(state.variable_assignments) :]
+        yield from _query(
+            state.make_new(stack=[instantiate(p, assignments) for p in [then, *stack]], variable_assignments=proof),
+            tree_node,
+        )
+    elif else_ is not None:
+        yield from _query(state.make_new(stack=[else_, *stack]), tree_node)
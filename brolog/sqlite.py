@@ -0,0 +1,111 @@
+"""
+Predicates backed by a table of a SQLite database, for fact tables which do not fit in memory.
+
+A call such as `edge(a, X)` runs `SELECT src, dst FROM edges WHERE src IS ?` with the bound arguments
+(atoms and numbers) as parameters, so that the indexes of the table are used. The rows are read lazily
+from the cursor as the solutions of the call are tried. Text values are atoms, integers and reals are numbers
+and NULL is the atom `null`.
+
+The database is opened read-only, once per table and process, and the SQL of each combination of bound
+arguments is built once so that sqlite3 reuses its prepared statement.
+
+    program.add_facts(SqliteTable("edge/2", "graph.db", "edges"))
+"""
+
+import sqlite3
+from pathlib import Path
+
+from brolog.facts import parse_indicator
+from brolog.lists import Solutions, Stream
+from brolog.objects import Atom, Float, Int, Number, Term, Variable, deref, make_functor
+
+
+NULL = Atom("null")
+
+
+class SqliteTable:
+    """
+    The facts of a predicate (name/arity), stored in a SQLite table.
+
+    The arguments map to `columns`, by default all the columns of the table in order.
+    """
+
+    def __init__(self, indicator: str, path: str | Path, table: str, columns: list[str] | None = None) -> None:
+        self.functor = make_functor(*parse_indicator(indicator))
+        self.path = Path(path)
+        self.table = table
+        self.connection: sqlite3.Connection | None = None
+        if columns is None:
+            columns = [row[1] for row in self.connect().execute(f"PRAGMA table_info({quote(table)})")]
+        if len(columns) != self.arity:
+            msg = f"{self.name}/{self.arity} needs {self.arity} columns, got {len(columns)} from {table}"
+            raise ValueError(msg)
+        self.columns = columns
+        # The SQL for each combination of bound arguments
+        self.queries: dict[tuple[bool, ...], str] = {}
+
+    @property
+    def name(self) -> str:
+        return self.functor[0]
+
+    @property
+    def arity(self) -> int:
+        return self.functor[1]
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.connection = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True)
+        return self.connection
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def query(self, bound: tuple[bool, ...]) -> str:
+        if (sql := self.queries.get(bound)) is None:
+            columns = ", ".join(quote(column) for column in self.columns)
+            sql = f"SELECT {columns} FROM {quote(self.table)}"  # noqa: S608
+            if conditions := [f"{quote(c)} IS ?" for c, is_bound in zip(self.columns, bound, strict=True) if is_bound]:
+                sql += " WHERE " + " AND ".join(conditions)
+            self.queries[bound] = sql
+        return sql
+
+    def solutions(self, args: list[Term]) -> Solutions:
+        """The rows matching a call, as the pairs of terms to unify (see `brolog.lists`)"""
+        args = [deref(arg) for arg in args]
+        if not all(isinstance(arg, Atom | Number | Variable) for arg in args):
+            # The table only holds atoms and numbers
+            return []
+        bound = tuple(not isinstance(arg, Variable) for arg in args)
+        parameters = [to_sql(arg) for arg in args if not isinstance(arg, Variable)]
+        cursor = self.connect().execute(self.query(bound), parameters)
+        # The bound arguments are unified as well, SQLite may convert e.g. '1' to 1 when comparing
+        return Stream([*zip(args, map(to_term, row), strict=True)] for row in cursor)
+
+    def __getstate__(self) -> dict:
+        # Each process opens its own connection
+        return self.__dict__ | {"connection": None}
+
+
+def quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def to_sql(term: Atom | Number) -> str | float | None:
+    if term is NULL:
+        return None
+    return term.name if isinstance(term, Atom) else term.value
+
+
+def to_term(value: str | float | bytes | None) -> Term:
+    match value:
+        case None:
+            return NULL
+        case int():
+            return Int(value)
+        case float():
+            return Float(value)
+        case bytes():
+            return Atom(value.decode())
+    return Atom(value)
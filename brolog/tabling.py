@@ -0,0 +1,154 @@
+"""
+Answer tables for tabled predicates (declared with `:- table name/arity.`).
+
+Calls to a tabled predicate are evaluated once per variant (i.e. up to variable renaming)
+and their answers are stored in a table. Recursive variant calls consume the answers found
+so far instead of re-entering the clauses, and evaluation is repeated until no new answers
+are found (linear tabling). This makes left recursion and cycles terminate.
+
+The evaluation itself is done by the engine, this module only stores the tables.
+"""
+
+from collections import OrderedDict
+from collections.abc import Hashable
+
+from brolog.objects import Term
+
+
+class Table:
+    """The answers of a single tabled call variant."""
+
+    __slots__ = ("key", "answers", "answer_keys", "size", "complete", "position", "leader", "followers")
+
+    def __init__(self, key: Hashable) -> None:
+        self.key = key
+        # Each answer is a list of the call's arguments and whether they are ground
+        self.answers: list[tuple[list[Term], bool]] = []
+        self.answer_keys: set[Hashable] = set()
+        self.size = 0
+        self.complete = False
+        # Position on the evaluation stack while the table is being evaluated
+        self.position: int | None = None
+        # Position of the oldest table this one (transitively) consumed incomplete answers from
+        self.leader: int | None = None
+        # Incomplete tables which can only be completed together with this one
+        self.followers: list[Table] = []
+
+
+class Tables:
+    """
+    All answer tables of a program.
+
+    `max_size` caps the total size of the stored answers, measured in term nodes.
+    When it is exceeded, the least recently used completed tables are evicted
+    (and recomputed if they are needed again).
+    """
+
+    def __init__(self, max_size: int | None = None) -> None:
+        self.max_size = max_size
+        self.tables: OrderedDict[Hashable, Table] = OrderedDict()
+        # Tables which are currently being evaluated, innermost last
+        self.stack: list[Table] = []
+        self.size = 0
+        # Total number of answers ever added, used to detect a fixpoint
+        self.answers_added = 0
+        # Set when the program changed during an evaluation, all tables are discarded once it is done
+        self.stale = False
+
+    def lookup(self, key: Hashable) -> Table | None:
+        if (table := self.tables.get(key)) is not None and table.complete:
+            self.tables.move_to_end(key)
+        return table
+
+    def start(self, key: Hashable) -> Table:
+        """Start (or restart) the evaluation of a table."""
+        if (table := self.tables.get(key)) is None:
+            table = self.tables[key] = Table(key)
+        table.position = table.leader = len(self.stack)
+        self.stack.append(table)
+        return table
+
+    def add_answer(self, table: Table, args: list[Term], key: tuple) -> bool:
+        """Add an answer unless a variant of it is already in the table."""
+        if key in table.answer_keys:
+            return False
+        table.answer_keys.add(key)
+        ground = not any(isinstance(k, int) for k in key)
+        table.answers.append((args, ground))
+        table.size += len(key)
+        self.size += len(key)
+        self.answers_added += 1
+        return True
+
+    def depend_on(self, table: Table) -> None:
+        """Record that the table being evaluated consumed the incomplete answers of `table`."""
+        top = self.stack[-1]
+        top.leader = min(top.leader, table.position)
+
+    def finish(self, table: Table) -> None:
+        """
+        Finish the evaluation of a table once it has reached a fixpoint.
+
+        A table which does not depend on an older incomplete table is complete together
+        with its followers. Otherwise it becomes a follower of the table below it,
+        and will be re-evaluated until that one is complete.
+        """
+        self.stack.pop()
+        position, leader = table.position, table.leader
+        table.position = table.leader = None
+        if leader == position:
+            table.complete = True
+            for follower in table.followers:
+                follower.complete = True
+            table.followers = []
+            if self.stale and not self.stack:
+                self.clear()
+            self.evict()
+        else:
+            parent = self.stack[-1]
+            parent.leader = min(parent.leader, leader)
+            parent.followers += [table, *table.followers]
+            table.followers = []
+
+    def abandon(self) -> None:
+        """Discard all incomplete tables, e.g. when their evaluation was interrupted."""
+        for key, table in list(self.tables.items()):
+            if not table.complete:
+                self.remove(key)
+        self.stack.clear()
+        if self.stale:
+            self.clear()
+
+    def evict(self) -> None:
+        if self.max_size is None:
+            return
+        for key, table in list(self.tables.items()):
+            if self.size <= self.max_size:
+                break
+            if table.complete:
+                self.remove(key)
+
+    def remove(self, key: Hashable) -> None:
+        table = self.tables.pop(key)
+        self.size -= table.size
+
+    def clear(self) -> None:
+        """
+        Discard all tables, e.g. between queries or after the program has changed.
+
+        The tables which are being evaluated are still needed by the running evaluation, which keeps
+        the clauses it started with (logical update view). Only the complete tables are discarded
+        right away, the others once the evaluation is done.
+        """
+        if not self.stack:
+            self.tables.clear()
+            self.size = 0
+            self.stale = False
+            return
+        self.stale = True
+        for key, table in list(self.tables.items()):
+            if table.complete:
+                self.remove(key)
+
+    def __len__(self) -> int:
+        return len(self.tables)
@@ -0,0 +1,67 @@
+import pytest
+
+from brolog.arithmetic import EvaluationError
+from brolog.limits import LimitExceeded, Limits
+from brolog.parse import Parser
+from brolog.solver import ENGINES, get_variable_assignments, query
+
+
+program = """
+p(1, a).
+p(2, b).
+p(3, a).
+p(1, c).
+age(peter, 7).
+age(ann, 11).
+age(pat, 8).
+loop(X) :- loop(X).
+older(N, M) :- findall(A, age(M, A), [Age]), aggregate_all(count, (age(_, B), B > Age), N).
+"""
+
+cases = [
+    ("findall(X, p(X, Y), L).", [{"X": "X", "Y": "Y", "L": "[1,2,3,1]"}]),
+    ("findall(X, p(X, z), L).", [{"X": "X", "L": "[]"}]),
+    ("findall(X, (p(X, a), !), L).", [{"X": "X", "L": "[1]"}]),
+    # The bindings made by the goal are undone
+    ("findall(Y, p(1, Y), L), p(2, Y).", [{"Y": "b", "L": "[a,c]"}]),
+    ("findall(X, member(X, [c, b, a]), L), msort(L, M).", [{"X": "X", "L": "[c,b,a]", "M": "[a,b,c]"}]),
+    (
+        "bagof(X, p(X, Y), L).",
+        [{"X": "X", "Y": "a", "L": "[1,3]"}, {"X": "X", "Y": "b", "L": "[2]"}, {"X": "X", "Y": "c", "L": "[1]"}],
+    ),
+    ("bagof(X, p(X, z), L).", []),
+    ("setof(X, Y^p(X, Y), L).", [{"X": "X", "Y": "Y", "L": "[1,2,3]"}]),
+    ("setof(N, A^age(N, A), L).", [{"N": "N", "A": "A", "L": "[ann,pat,peter]"}]),
+    ("setof(X, p(X, a), [First|Rest]).", [{"X": "X", "First": "1", "Rest": "[3]"}]),
+    ("aggregate_all(count, p(X, Y), N).", [{"X": "X", "Y": "Y", "N": "4"}]),
+    ("aggregate_all(sum(A), age(N, A), S).", [{"A": "A", "N": "N", "S": "26"}]),
+    ("aggregate_all(max(A * 2), age(N, A), S).", [{"A": "A", "N": "N", "S": "22"}]),
+    ("aggregate_all(max(A), p(A, z), S).", []),
+    ("aggregate_all(bag(N), age(N, A), S).", [{"N": "N", "A": "A", "S": "[peter,ann,pat]"}]),
+    ("aggregate_all(set(Y), p(X, Y), S).", [{"Y": "Y", "X": "X", "S": "[a,b,c]"}]),
+    ("older(N, pat).", [{"N": "1"}]),
+]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(("q", "expected"), cases)
+def test_aggregates(engine, q, expected):
+    q = Parser(q).parse_query()
+    answers = [get_variable_assignments(q, proof) for proof in query(program, q, engine=engine)]
+    assert [{str(k): str(v) for k, v in answer.items()} for answer in answers] == expected
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(
+    "q",
+    ["findall(X, G, L).", "findall(X, 1, L).", "aggregate_all(avg(X), p(X, Y), A).", "aggregate_all(S, p(X, Y), A)."],
+)
+def test_aggregate_errors(engine, q):
+    with pytest.raises(EvaluationError):
+        list(query(program, q, engine=engine))
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_limits_include_the_goal(engine):
+    with pytest.raises(LimitExceeded):
+        list(query(program, "findall(X, loop(X), L).", engine=engine, limits=Limits(max_inferences=200)))
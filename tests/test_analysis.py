@@ -0,0 +1,89 @@
+import pytest
+from click.testing import CliRunner
+
+from brolog.analysis import analyze
+from brolog.cli import cli
+from brolog.engine import Engine
+from brolog.parse import ParseError, Parser
+from brolog.program import Mode
+from brolog.solver import ENGINES, get_variable_assignments, query
+
+
+program = """
+:- mode app(+, +, -) is det.
+:- mode app(-, -, +).
+:- mode len(+, -) is det.
+:- mode max(+, +, -) is semidet.
+:- mode member2(?, +) is det.
+:- mode color(-, +) is det.
+app([], L, L).
+app([H|T], L, [H|R]) :- app(T, L, R).
+len([], 0).
+len([_|T], N) :- len(T, M), N is M + 1.
+max(X, Y, X) :- X >= Y, !.
+max(_, Y, Y).
+member2(X, [X|_]).
+member2(X, [_|T]) :- member2(X, T).
+color(red, 1).
+color(green, 2).
+color(blue, 3).
+sign(X, S) :- (X > 0 -> pos(S) ; neg(S)).
+pos(pos).
+neg(neg).
+"""
+
+
+def test_analyze():
+    reports = {report.functor: report for report in analyze(Parser(program).parse_program())}
+    assert {str(mode): inferred for mode, inferred in reports["app", 3].modes} == {
+        "app(+, +, -) is det": "semidet",
+        "app(-, -, +)": "nondet",
+    }
+    assert reports["len", 2].modes[0][1] == "semidet"
+    assert reports["max", 3].committed
+    assert reports["max", 3].modes[0][1] == "semidet"
+    assert [str(mode) for mode in reports["member2", 2].mismatches] == ["member2(?, +) is det"]
+    assert reports["color", 2].switches == [0, 1]
+    assert str(reports["color", 2]) == "color/2: 3 clauses, switch on argument 1, 2"
+    assert reports["sign", 2].modes == [(Mode("sign", ("?", "?")), "semidet")]
+
+
+@pytest.mark.parametrize("directive", [":- mode p(+, x).", ":- mode p(+, -) is maybe.", ":- mode p(+ -)."])
+def test_mode_errors(directive):
+    with pytest.raises(ParseError):
+        Parser(directive).parse_program()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_switch_arguments(engine):
+    rules = Parser(program).parse_program()
+    for source, expected in [("color(X, 2).", ["green"]), ("color(X, 4).", []), ("color(red, 2).", [])]:
+        q = Parser(source).parse_query()
+        answers = [get_variable_assignments(q, proof) for proof in query(rules, q, engine=engine)]
+        assert [str(value) for answer in answers for value in answer.values()] == expected
+
+    # The second argument is no longer a switch once two clauses share a key
+    list(query(rules, "assertz(color(purple, 2)).", engine=engine))
+    assert len(list(query(rules, "color(X, 2).", engine=engine))) == 2
+
+
+def test_switch_leaves_no_choicepoint():
+    rules = Parser(program).parse_program()
+    engine = Engine(rules)
+    answers = engine.solve(Parser("color(X, 3).").parse_query())
+    next(answers)
+    assert not engine.choicepoints
+    assert [str(rule.head) for rule in rules.candidates(Parser("color(X, 3).").parse_query())] == ["color(blue, 3)"]
+
+
+def test_cli_analyze(tmp_path):
+    source = tmp_path / "input.pl"
+    source.write_text(program)
+    result = CliRunner().invoke(cli, ["analyze", str(source), "--no-cache"])
+    assert result.exit_code == 1
+    assert "  app(+, +, -) is semidet\n" in result.output
+    assert "member2(?, +) is nondet, declared det" in result.output
+
+    source.write_text(program.replace("member2(?, +) is det", "member2(?, +)"))
+    result = CliRunner().invoke(cli, ["analyze", str(source), "--no-cache"])
+    assert result.exit_code == 0
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from brolog.solver import aquery, query
+
+
+program = "nat(z).\nnat(s(X)) :- nat(X).\nloop(X) :- loop(X)."
+
+
+async def take(q, n, log, name):
+    answers = []
+    async for answer in aquery(program, q, pause_every=10):
+        log.append(name)
+        answers.append(answer)
+        if len(answers) == n:
+            break
+    return answers
+
+
+def test_aquery_answers():
+    async def main() -> list:
+        return [answer async for answer in aquery("e(a, b).\ne(a, c).", "e(a, X).")]
+
+    answers = asyncio.run(main())
+    assert [str(list(a[0].values())) for a in answers] == [
+        str(list(a[0].values())) for a in query("e(a, b).\ne(a, c).", "e(a, X).")
+    ]
+
+
+def test_concurrent_queries_are_interleaved():
+    async def main() -> list[str]:
+        log = []
+        await asyncio.gather(take("nat(X).", 50, log, "a"), take("nat(X).", 50, log, "b"))
+        return log
+
+    log = asyncio.run(main())
+    assert sorted(log) == ["a"] * 50 + ["b"] * 50
+    # The first query does not run to completion before the second one starts
+    assert log != sorted(log)
+
+
+def test_timeout_cancels_query():
+    async def main() -> None:
+        async with asyncio.timeout(0.05):
+            async for _ in aquery(program, "loop(a)."):
+                pass
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(main())
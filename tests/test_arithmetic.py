@@ -0,0 +1,87 @@
+import pickle
+
+import pytest
+
+from brolog.arithmetic import EvaluationError
+from brolog.compiler import Arithmetic, compile_clause
+from brolog.objects import Float, Int
+from brolog.parse import Parser
+from brolog.solver import ENGINES, get_variable_assignments, query
+
+
+program = """
+len([], 0).
+len([_|T], N) :- len(T, M), N is M + 1.
+fib(0, 0).
+fib(1, 1).
+fib(N, F) :- N > 1, A is N - 1, B is N - 2, fib(A, FA), fib(B, FB), F is FA + FB.
+max(X, Y, X) :- X >= Y, !.
+max(_, Y, Y).
+twice(X, Y) :- Z is X, Y is Z * 2.
+"""
+
+cases = [
+    ("X is 1 + 2 * 3.", [{"X": "7"}]),
+    ("X is (1 + 2) * 3 - -1.", [{"X": "10"}]),
+    ("X is 7 / 2, Y is 6 / 2, Z is 7 // -2, W is -7 mod 2.", [{"X": "3.5", "Y": "3", "Z": "-3", "W": "1"}]),
+    ("X is 2 ** 3, Y is 2 ^ 3 ^ 2.", [{"X": "8", "Y": "512"}]),
+    ("X is max(2, 3.0) + abs(-1) + 1 << 2.", [{"X": "8.0"}]),
+    ("1 < 2, 2 =< 2, 3 > 2.5, 1 =:= 1.0, 1 =\\= 2.", [{}]),
+    ("2 < 1.", []),
+    ("len([a, b, c], N).", [{"N": "3"}]),
+    ("fib(10, F).", [{"F": "55"}]),
+    ("max(3, 2, X).", [{"X": "3"}]),
+    ("max(2, 3, X).", [{"X": "3"}]),
+    ("twice(1 + 2, Y).", [{"Y": "6"}]),
+    ("len([a], 1), \\+ len([a], 1.0).", [{}]),
+    ("(1 > 2 -> fail ; X is 1), X =:= 1.", [{"X": "1"}]),
+]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(("q", "expected"), cases)
+def test_arithmetic(engine, q, expected):
+    q = Parser(q).parse_query()
+    answers = [get_variable_assignments(q, proof) for proof in query(program, q, engine=engine)]
+    assert [{str(k): str(v) for k, v in answer.items()} for answer in answers] == expected
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(
+    "q",
+    [
+        "X is Y + 1.",
+        "X is foo + 1.",
+        "X is 1 / 0.",
+        "X is 1.5 mod 2.",
+        "X is 1 << -1.",
+        "X is 1 >> -1.",
+        "X is sin(inf).",
+        "X is cos(inf).",
+        "X is tan(inf).",
+        "X is (0 - 8) ** 0.5.",
+        "X is (0 - 8) ^ 0.5.",
+        "Y is 0.5, X is (0 - 8) ** Y.",
+        "X is 1, X < (0 - 8) ** 0.5.",
+    ],
+)
+def test_evaluation_errors(engine, q):
+    with pytest.raises(EvaluationError):
+        list(query(program, q, engine=engine))
+
+
+def test_numbers():
+    [rule] = Parser("p(1, -2, 1.5, 2.0e3, 10abc).").parse()
+    assert rule.head.args[:4] == [Int(1), Int(-2), Float(1.5), Float(2000.0)]
+    assert str(rule.head.args[4]) == "10abc"
+
+
+def test_expressions_are_compiled_once():
+    [rule] = Parser("p(X, Y) :- Y is X * 2 + 3 * 4.").parse()
+    [goal] = compile_clause(rule).body
+    assert isinstance(goal, Arithmetic)
+    # `3 * 4` is folded and the clause variables are read from the frame
+    assert goal.value([Int(5), None]) == Int(22)
+
+    copy = pickle.loads(pickle.dumps(goal))  # noqa: S301
+    assert copy.value([Int(1), None]) == Int(14)
@@ -0,0 +1,44 @@
+import json
+
+from click.testing import CliRunner
+
+from brolog.bench import BENCHMARKS, CRYPT, QUEENS, TAK, ZEBRA, load, run_suite
+from brolog.cli import cli
+from brolog.engine import Engine
+from brolog.parse import Parser
+
+
+def solve(source, query):
+    q = Parser(query).parse_head()
+    return [{str(k): str(v) for k, v in answer.items()} for answer in Engine(Parser(source).parse_program()).solve(q)]
+
+
+def test_benchmark_answers():
+    assert solve(ZEBRA, "zebra(X).") == [{"X": "japanese"}]
+    assert solve(TAK, "tak(12, 8, 4, A).") == [{"A": "5"}]
+    assert len(solve(QUEENS, "queens(6, Qs).")) == 4
+    assert solve(CRYPT, "money(S, E, N, D, M, O, R, Y).") == [
+        dict(zip("SENDMORY", ["9", "5", "6", "7", "1", "0", "8", "2"], strict=True))
+    ]
+
+
+def test_run_suite():
+    results = list(run_suite(scale=0.01, repeat=1))
+    assert [result.name for result in results] == [b.name for b in BENCHMARKS]
+    assert all(result.units > 0 and result.throughput > 0 and result.peak_memory > 0 for result in results)
+
+
+def test_bench_baseline(tmp_path):
+    saved = tmp_path / "results.json"
+    args = ["bench", "nrev", "crypt", "--scale", "0.01", "--repeat", "1", "--no-memory"]
+    result = CliRunner().invoke(cli, [*args, "--save", str(saved)])
+    assert result.exit_code == 0
+    assert set(json.loads(saved.read_text())["results"]) == {"nrev", "crypt"}
+    assert load(saved)["nrev"].units > 0
+
+    result = CliRunner().invoke(cli, [*args, "--baseline", str(saved)])
+    assert result.exit_code == 0
+    assert "vs baseline" in result.output
+
+    result = CliRunner().invoke(cli, [*args, "--baseline", str(saved), "--tolerance", "-1"])
+    assert result.exit_code == 2
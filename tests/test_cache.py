@@ -0,0 +1,24 @@
+from brolog.cache import cache_paths, load_program
+from brolog.solver import query
+
+
+def test_cache_is_used_and_invalidated(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    source = tmp_path / "input.pl"
+    source.write_text(":- table e/2.\ne(a, b).\ne(b, c).\n")
+    compiled = tmp_path / "input.plc"
+
+    program = load_program(source)
+    assert cache_paths(source)[0] == compiled
+    assert compiled.exists()
+    assert len(program) == 2
+
+    cached = load_program(source)
+    assert [str(rule) for rule in cached] == ["e(a, b).", "e(b, c)."]
+    assert cached.tabled == {("e", 2)}
+    assert len(list(query(cached, "e(b, X)."))) == 1
+
+    # Changing the source invalidates the compiled form
+    source.write_text("e(a, b).\n")
+    assert [str(rule) for rule in load_program(source)] == ["e(a, b)."]
+    assert [str(rule) for rule in load_program(source)] == ["e(a, b)."]
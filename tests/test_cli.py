@@ -0,0 +1,63 @@
+import json
+
+from click.testing import CliRunner
+
+from brolog.cli import cli, print_answers
+from brolog.parse import Parser
+from brolog.solver import query
+
+
+def test_batch_queries_jsonl(tmp_path):
+    program = tmp_path / "input.pl"
+    program.write_text("e(a, b).\ne(b, c).\npath(X, Y) :- e(X, Y).\npath(X, Y) :- e(X, Z), path(Z, Y).\n")
+    queries = tmp_path / "queries.pl"
+    queries.write_text("path(a, X).\ne(c, X).\n")
+
+    result = CliRunner().invoke(cli, [str(program), "--queries", str(queries), "--format", "jsonl", "--no-cache"])
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.output.splitlines()]
+    assert [(r["query"], r.get("bindings"), r.get("answers")) for r in records] == [
+        (0, {"X": "b"}, None),
+        (0, {"X": "c"}, None),
+        (0, None, 2),
+        (1, None, 0),
+    ]
+    assert all(r["time"] >= 0 for r in records)
+
+
+def test_format_requires_queries(tmp_path):
+    program = tmp_path / "input.pl"
+    program.write_text("e(a, b).\n")
+    result = CliRunner().invoke(cli, [str(program), "--format", "jsonl"])
+    assert result.exit_code == 2
+
+
+def test_repl_streams_answers(tmp_path):
+    program = tmp_path / "input.pl"
+    program.write_text("nat(0).\nnat(N) :- nat(M), N is M + 1.\n")
+
+    # Infinitely many answers, the REPL stops after the first ones
+    result = CliRunner().invoke(cli, [str(program), "--no-cache", "--max-answers", "2"], input="nat(X).\nmissing(a).\n")
+    assert result.exit_code == 0
+    assert "X = 0.\n\nX = 1.\n" in result.output
+    assert "X = 2" not in result.output
+    assert "false." in result.output
+
+    queries = tmp_path / "queries.pl"
+    queries.write_text("nat(X).\n")
+    args = [str(program), "--no-cache", "--queries", str(queries), "--format", "jsonl", "--max-answers", "3"]
+    result = CliRunner().invoke(cli, args)
+    records = [json.loads(line) for line in result.output.splitlines()]
+    assert [r.get("bindings") for r in records] == [{"X": "0"}, {"X": "1"}, {"X": "2"}, None]
+
+
+def test_print_answers_asks_for_more(capsys):
+    program = Parser("p(1).\np(2).\np(3).\n").parse_program()
+    q = Parser("p(X).").parse_query()
+
+    keys = iter(";\r")
+    print_answers(q, query(program, q), more=lambda: next(keys) == ";")
+    assert capsys.readouterr().out == "X = 1 ;\nX = 2.\n\n"
+
+    print_answers(q, query(program, q), more=lambda: True)
+    assert capsys.readouterr().out == "X = 1 ;\nX = 2 ;\nX = 3 ;\nfalse.\n"
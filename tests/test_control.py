@@ -0,0 +1,55 @@
+import pytest
+
+from brolog.limits import Limits
+from brolog.parse import Parser
+from brolog.solver import ENGINES, get_variable_assignments, query
+
+
+program = r"""
+member(X, [X|_]).
+member(X, [_|T]) :- member(X, T).
+eq(X, X).
+le(a, b).
+le(a, c).
+le(b, c).
+first(X, L) :- member(X, L), !.
+max(X, Y, Z) :- (le(X, Y) -> eq(Z, Y) ; eq(Z, X)).
+notin(X, L) :- \+ member(X, L).
+either(X) :- (eq(X, a) ; eq(X, b) ; eq(X, c)).
+transparent(X) :- (member(X, [1, 2, 3]), ! ; eq(X, none)).
+local(X) :- (member(X, [1, 2, 3]), ! -> true ; eq(X, none)).
+guarded(X, Y) :- member(X, [1, 2]), (member(Y, [a, b]) -> true ; fail).
+negated(X) :- member(X, [1, 2, 3]), \+ (eq(X, 2), !, fail).
+"""
+
+cases = [
+    ("first(X, [1, 2, 3]).", [{"X": "1"}]),
+    ("max(a, b, Z).", [{"Z": "b"}]),
+    ("max(c, a, Z).", [{"Z": "c"}]),
+    ("notin(d, [a, b]).", [{}]),
+    ("notin(a, [a, b]).", []),
+    ("either(X).", [{"X": "a"}, {"X": "b"}, {"X": "c"}]),
+    ("transparent(X).", [{"X": "1"}]),
+    ("local(X).", [{"X": "1"}]),
+    ("guarded(X, Y).", [{"X": "1", "Y": "a"}, {"X": "2", "Y": "a"}]),
+    ("negated(X).", [{"X": "1"}, {"X": "2"}, {"X": "3"}]),
+    ("(member(X, [1, 2]) ; eq(X, 3)), \\+ eq(X, 2).", [{"X": "1"}, {"X": "3"}]),
+    ("member(X, [1, 2, 3]), !.", [{"X": "1"}]),
+    ("fail ; true.", [{}]),
+]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(("q", "expected"), cases)
+def test_control_constructs(engine, q, expected):
+    q = Parser(q).parse_query()
+    answers = [get_variable_assignments(q, proof) for proof in query(program, q, engine=engine)]
+    assert [{str(k): str(v) for k, v in answer.items()} for answer in answers] == expected
+
+
+def test_if_then_else_leaves_no_choicepoint():
+    # The condition and the else branch are cut once the condition succeeds
+    source = "count([]).\ncount([_|T]) :- (eq(T, []) -> true ; count(T)).\neq(X, X).\n"
+    lst = "[" + ", ".join(["a"] * 100) + "]"
+    for engine in ENGINES:
+        assert len(list(query(source, f"count({lst}).", engine=engine, limits=Limits(max_choicepoints=2)))) == 1
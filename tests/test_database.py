@@ -0,0 +1,81 @@
+import pytest
+
+from brolog.arithmetic import EvaluationError
+from brolog.engine import Engine
+from brolog.parse import Parser
+from brolog.program import Program
+from brolog.solver import ENGINES, get_variable_assignments, query
+
+
+program = """
+counter(0).
+edge(a, b).
+edge(b, c).
+"""
+
+cases = [
+    ("assertz(p(1)), assertz(p(2)), asserta(p(0)), p(X).", [{"X": "0"}, {"X": "1"}, {"X": "2"}]),
+    # The running call of `edge/2` does not see the new clause (logical update view)
+    ("edge(X, Y), assertz(edge(c, d)).", [{"X": "a", "Y": "b"}, {"X": "b", "Y": "c"}]),
+    ("assertz(edge(c, d)), edge(c, Y).", [{"Y": "d"}]),
+    ("retract(edge(X, Y)).", [{"X": "a", "Y": "b"}, {"X": "b", "Y": "c"}]),
+    ("retract(edge(a, b)), edge(X, Y).", [{"X": "b", "Y": "c"}]),
+    ("retract(edge(X, b)), !, edge(X, Y).", []),
+    ("retract(counter(N)), M is N + 1, assertz(counter(M)), counter(C).", [{"N": "0", "M": "1", "C": "1"}]),
+    ("assertz((path(X, Y) :- edge(X, Z), edge(Z, Y))), path(a, W).", [{"X": "X", "Y": "Y", "Z": "Z", "W": "c"}]),
+    ("assertz((big(X) :- X > 1, \\+ X =:= 3)), big(2), \\+ big(3).", [{"X": "X"}]),
+    ("assertz((q(X) :- edge(X, b))), retract((q(a) :- B)), \\+ q(a).", [{"X": "X", "B": "edge(a, b)"}]),
+    ("retract(missing(X)).", []),
+]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(("q", "expected"), cases)
+def test_database(engine, q, expected):
+    q = Parser(q).parse_query()
+    answers = [get_variable_assignments(q, proof) for proof in query(program, q, engine=engine)]
+    assert [{str(k): str(v) for k, v in answer.items()} for answer in answers] == expected
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(
+    "q", ["assertz(X).", "assertz(1).", "assertz((p(a) :- 1)).", "asserta((a, b)).", "retract(X)."]
+)
+def test_database_errors(engine, q):
+    with pytest.raises(EvaluationError):
+        list(query(program, q, engine=engine))
+
+
+def test_program_is_updated_between_queries():
+    rules = Parser(program).parse_program()
+    engine = Engine(rules)
+    for i in range(100):
+        list(engine.solve(Parser(f"assertz(event({i}, t{i % 3})).").parse_query()))
+    [answer] = engine.solve(Parser("event(42, T).").parse_query())
+    assert str(next(iter(answer.values()))) == "t0"
+    assert len(list(engine.solve(Parser("event(N, t1).").parse_query()))) == 33
+    assert len(rules) == 103
+
+
+def test_incremental_index():
+    rules = Program(Parser("e(a, 1).\ne(X, 2).").parse())
+    clauses = rules.predicates["e", 2]
+
+    def candidates(q: str) -> list[str]:
+        return [str(rule.head.args[1]) for rule in rules.candidates(Parser(q).parse_head())]
+
+    running = rules.lookup(("e", 2), None)
+    rules.add(*Parser("e(b, 3).").parse())
+    rules.add(*Parser("e(Y, 0).").parse(), front=True)
+    assert candidates("e(a, N).") == ["0", "1", "2"]
+    assert candidates("e(b, N).") == ["0", "2", "3"]
+    assert candidates("e(c, N).") == ["0", "2"]
+    # Lists handed out to calls are copied before they are changed
+    assert [str(c.rule.head.args[1]) for c in running] == ["1", "2"]
+
+    [clause] = [c for c in clauses.clauses if str(c.rule.head.args[0]) == "b"]
+    assert rules.remove(clause)
+    assert not rules.remove(clause)
+    assert "b" not in {str(key) for key in clauses.by_key}
+    assert candidates("e(b, N).") == ["0", "2"]
+    assert [str(rule.head.args[1]) for rule in rules] == ["0", "1", "2"]
@@ -0,0 +1,46 @@
+from brolog.engine import Engine
+from brolog.objects import Atom, List, Predicate, Variable
+from brolog.parse import Parser
+from brolog.program import Program
+
+
+def test_deep_deterministic_recursion():
+    program = Program(Parser("list([]).\nlist([_|T]) :- list(T).").parse())
+    q = Predicate("list", [List.from_list([Atom("a")] * 2000)])
+    engine = Engine(program)
+    answers = engine.solve(q)
+
+    assert next(answers) == {}
+    # Every call is deterministic thanks to first-argument indexing,
+    # so no choicepoints are left and no binding had to be trailed
+    assert engine.choicepoints == []
+    assert engine.trail == []
+    assert list(answers) == []
+
+
+def test_deep_answer():
+    program = Program(Parser("len([], z).\nlen([_|T], s(N)) :- len(T, N).").parse())
+    n = Variable("N")
+    q = Predicate("len", [List.from_list([Atom("a")] * 2000), n])
+    [answer] = Engine(program).solve(q)
+
+    depth, term = 0, answer[n]
+    while not isinstance(term, Atom):
+        depth, term = depth + 1, term.args[0]
+    assert depth == 2000
+
+
+def test_compiled_clauses():
+    program = Program(Parser("p(X, f(X, g(Y)), a) :- q(Y, h(b)).\nq(c, h(b)).").parse())
+    [clause] = program.lookup(("p", 3), None)
+    # The ground atom is shared and the body goal only keeps its ground argument as is
+    assert clause.nvars == 2
+    assert clause.head[2] is Atom("a")
+    assert clause.body[0].args[1] is clause.rule.body[0].args[1]
+
+    x, z = Variable("X"), Variable("Z")
+    [answer] = Engine(program).solve(Predicate("p", [x, z, Atom("a")]))
+    assert answer[x] is not x
+    assert str(answer[z]) == f"f({answer[x]!r}, g(c))"
+    assert list(Engine(program).solve(Parser("p(b, f(b, g(Y)), a).").parse_head()))
+    assert not list(Engine(program).solve(Parser("p(b, f(c, Z), a).").parse_head()))
@@ -0,0 +1,110 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from brolog import load_facts
+from brolog.arithmetic import EvaluationError
+from brolog.cli import cli
+from brolog.facts import FactFormatError, FactTable
+from brolog.objects import Atom, Float, Int
+from brolog.parse import Parser
+from brolog.solver import ENGINES, get_variable_assignments, query
+
+
+program = """
+path(X, Y) :- e(X, Y, _).
+path(X, Y) :- e(X, Z, _), path(Z, Y).
+"""
+
+cases = [
+    ("e(a, Y, W).", [{"Y": "b", "W": "1"}, {"Y": "c", "W": "2.5"}]),
+    ("e(X, c, W).", [{"X": "a", "W": "2.5"}, {"X": "b", "W": "3"}]),
+    ("e(X, c, 3).", [{"X": "b"}]),
+    ("e(a, c, 3).", []),
+    ("e(X, Y, 2).", []),
+    ("e(a, f(b), W).", []),
+    ("e(X, X, W).", [{"X": "d", "W": "0"}]),
+    ("path(a, Y).", [{"Y": "b"}, {"Y": "c"}, {"Y": "c"}]),
+]
+
+
+@pytest.fixture()
+def edges(tmp_path):
+    path = tmp_path / "edges.csv"
+    path.write_text("a,b,1\na,c,2.5\nb,c,3\nd,d,0\n")
+    return path
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(("q", "expected"), cases)
+def test_fact_table(edges, engine, q, expected):
+    rules = Parser(program).parse_program()
+    rules.add_facts(load_facts("e/3", edges))
+    q = Parser(q).parse_query()
+    answers = [get_variable_assignments(q, proof) for proof in query(rules, q, engine=engine)]
+    assert [{str(k): str(v) for k, v in answer.items()} for answer in answers] == expected
+
+
+def test_formats(tmp_path):
+    tsv = tmp_path / "e.tsv"
+    tsv.write_text("from\tto\na b\t-2\n")
+    table = load_facts("e/2", tsv, header=True)
+    assert table.terms == [Atom("a b"), Int(-2)]
+
+    jsonl = tmp_path / "e.jsonl"
+    jsonl.write_text('["1", 1]\n\n[true, 1.0]\n')
+    table = load_facts("e/2", jsonl)
+    assert len(table) == 2
+    # Strings are atoms, 1 and 1.0 are different values
+    assert table.terms == [Atom("1"), Int(1), Atom("true"), Float(1.0)]
+
+
+@pytest.mark.parametrize(
+    ("name", "text", "line"),
+    [("e.csv", "a,b\nc\n", 2), ("e.jsonl", '["a", "b"]\n{"a": 1}\n', 2), ("e.jsonl", '["a", null]\n', 1)],
+)
+def test_format_errors(tmp_path, name, text, line):
+    path = tmp_path / name
+    path.write_text(text)
+    with pytest.raises(FactFormatError) as e:
+        load_facts("e/2", path)
+    assert e.value.line == line
+
+
+def test_clauses_and_tables_do_not_mix(edges):
+    rules = Parser("e(x, y, z).\n").parse_program()
+    with pytest.raises(ValueError, match="already defined"):
+        rules.add_facts(load_facts("e/3", edges))
+
+    rules = Parser(program).parse_program()
+    rules.add_facts(load_facts("e/3", edges))
+    with pytest.raises(EvaluationError):
+        list(query(rules, "assertz(e(x, y, z))."))
+
+
+def test_indexes_follow_new_rows():
+    table = FactTable("e", 2)
+    table.add([Atom("a"), Int(1)])
+    assert table.index(0) == {0: 0}
+    table.add([Atom("a"), Int(2)])
+    assert list(table.index(0)[0]) == [0, 1]
+
+
+def test_cli_facts(tmp_path, edges):
+    source = tmp_path / "input.pl"
+    source.write_text(program)
+    more = tmp_path / "more.jsonl"
+    more.write_text('["c", "e", 4]\n')
+    queries = tmp_path / "queries.pl"
+    queries.write_text("path(b, Y).\n")
+
+    args = [str(source), "--no-cache", "--facts", f"e/3={edges}", "--facts", f"e/3={more}"]
+    result = CliRunner().invoke(cli, [*args, "--queries", str(queries), "--format", "jsonl"])
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.output.splitlines()]
+    assert [r["bindings"] for r in records if "bindings" in r] == [{"Y": "c"}, {"Y": "e"}]
+
+    result = CliRunner().invoke(cli, [str(source), "--facts", "e3=edges.csv"])
+    assert result.exit_code == 1
+    assert "name/arity" in result.output
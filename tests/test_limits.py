@@ -0,0 +1,56 @@
+import pickle
+
+import pytest
+
+from brolog.limits import LimitExceeded, Limits
+from brolog.solver import ENGINES, query
+
+
+program = """\
+e(a, b).
+e(b, a).
+path(X, Y) :- path(X, Z), e(Z, Y).
+path(X, Y) :- e(X, Y).
+d(0).
+d(1).
+d(2).
+d(3).
+d(4).
+d(5).
+d(6).
+d(7).
+d(8).
+d(9).
+wide(X) :- d(A), d(B), d(C), d(D), d(E), d(F), missing(X).
+"""
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(
+    ("q", "limits", "limit"),
+    [
+        ("path(X, d).", Limits(max_inferences=500), "inferences"),
+        ("path(X, d).", Limits(max_depth=50), "depth"),
+        ("path(X, d).", Limits(max_choicepoints=20), "choicepoints"),
+        ("wide(X).", Limits(timeout=0.05), "time"),
+    ],
+)
+def test_limits(engine, q, limits, limit):
+    with pytest.raises(LimitExceeded) as e:
+        list(query(program, q, engine=engine, limits=limits))
+    assert e.value.limit == limit
+    if limit == "inferences":
+        assert e.value.inferences == 501
+    if limit == "depth":
+        assert e.value.depth == 51
+
+
+def test_answers_within_limits():
+    answers = list(query(program, "e(a, X).", limits=Limits(max_inferences=1, max_depth=1, max_choicepoints=0)))
+    assert len(answers) == 1
+
+
+def test_limit_exceeded_pickles():
+    error = pickle.loads(pickle.dumps(LimitExceeded("time", 10, 2, 1, 0.5)))  # noqa: S301
+    assert (error.limit, error.inferences, error.depth, error.choicepoints) == ("time", 10, 2, 1)
+    assert str(error).startswith("time limit exceeded")
@@ -0,0 +1,74 @@
+import pickle
+
+import pytest
+
+from brolog.engine import Engine, resolve
+from brolog.objects import ArrayList, Atom, List, Variable
+from brolog.parse import Parser
+from brolog.solver import ENGINES, get_variable_assignments, query
+
+
+program = """
+mylen([], 0).
+mylen([_|T], N) :- mylen(T, M), N is M + 1.
+# Defined by the program, so it is used instead of the builtin
+last([X], X).
+last([_|T], X) :- last(T, X).
+"""
+
+cases = [
+    ("append(X, Y, [1, 2]).", [{"X": "[]", "Y": "[1,2]"}, {"X": "[1]", "Y": "[2]"}, {"X": "[1,2]", "Y": "[]"}]),
+    ("append([1, 2], [3|T], L).", [{"T": "T", "L": "[1,2,3|T]"}]),
+    ("append([a|X], [c], [a, b, c]).", [{"X": "[b]"}]),
+    ("length([a, b, c], N).", [{"N": "3"}]),
+    ("length([a|T], 3).", [{"T": "[_,_]"}]),
+    ("length(L, N), N >= 2, !.", [{"L": "[_,_]", "N": "2"}]),
+    ("member(X, [c, a, b]).", [{"X": "c"}, {"X": "a"}, {"X": "b"}]),
+    ("member(b, [a|T]), !.", [{"T": "[b|_]"}]),
+    ("nth0(I, [a, b], E).", [{"I": "0", "E": "a"}, {"I": "1", "E": "b"}]),
+    ("nth0(2, L, x).", [{"L": "[_,_,x|_]"}]),
+    ("reverse([1, 2, 3], R).", [{"R": "[3,2,1]"}]),
+    ("msort([b, 2, f(x), a, 1.0, g(a, b), 1, f(a), b], S).", [{"S": "[1.0,1,2,a,b,b,f(a),f(x),g(a, b)]"}]),
+    ("mylen([a, b], N), last([a, b], X).", [{"N": "2", "X": "b"}]),
+]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(("q", "expected"), cases)
+def test_list_builtins(engine, q, expected):
+    q = Parser(q).parse_query()
+    answers = [get_variable_assignments(q, proof) for proof in query(program, q, engine=engine)]
+    assert [{str(k): str(v) for k, v in answer.items()} for answer in answers] == expected
+
+
+def test_long_lists():
+    n = 100_000
+    lst = List.from_list([Atom("a")] * n)
+    assert isinstance(lst, ArrayList)
+    assert repr(lst) == "[" + ",".join(["a"] * n) + "]"
+
+    # Native builtins and clause resolution see the same list
+    source = ", ".join(["a"] * n)
+    q = Parser(f"length([{source}], N), append([{source}], [b], R), reverse(R, [b|_]), mylen([{source}], M).")
+    [answer] = Engine(Parser(program).parse_program()).solve(q.parse_query())
+    values = {str(k): v for k, v in answer.items()}
+    assert str(values["N"]) == str(values["M"]) == str(n)
+    assert isinstance(values["R"], ArrayList)
+    assert len(values["R"].unpack()[0]) == n + 1
+
+
+def test_array_list_views():
+    lst = List.from_list([Atom("a"), Atom("b")], Variable("T"))
+    head, rest = lst.args
+    assert head is Atom("a")
+    assert rest.args[0] is Atom("b")
+    assert rest.args[1] is lst.cells[-1]
+    # The view is only built once
+    assert lst.args[1] is rest
+    assert repr(pickle.loads(pickle.dumps(rest))) == "[b|T]"  # noqa: S301
+
+    # Copies keep the array
+    copy = resolve(lst)
+    assert isinstance(copy, ArrayList)
+    assert copy is not lst
+    assert str(copy) == "[a,b|T]"
@@ -0,0 +1,94 @@
+import itertools
+import threading
+
+from brolog.engine import Engine
+from brolog.parallel import ParallelSolver, split_query
+from brolog.parse import Parser
+from brolog.solver import query
+
+
+program = Parser("""\
+color(red).
+color(green).
+color(blue).
+pair(X, Y) :- color(X), color(Y).
+main(P) :- pair(X, Y), eq(P, p(X, Y)).
+eq(X, X).
+nat(z).
+nat(s(X)) :- nat(X).
+first(X) :- color(X), !.
+""").parse_program()
+
+
+def answers(proofs):
+    return [{str(v): str(value) for v, value in proof[0].items()} for proof in proofs]
+
+
+def test_split_below_the_root():
+    split = split_query(Engine(program), Parser("main(P).").parse_head())
+    assert split is not None
+    _, goals, branches = split
+    assert goals.goal.name == "color"
+    assert branches == 3
+    # A cut could prune the other branches
+    assert split_query(Engine(program), Parser("first(X).").parse_head()) is None
+
+
+def test_parallel_answers():
+    q = "main(P)."
+    sequential = answers(query(program, q))
+    assert len(sequential) == 9
+    assert answers(query(program, q, workers=2, ordered=True)) == sequential
+    unordered = answers(query(program, q, workers=2))
+    assert sorted(unordered, key=str) == sorted(sequential, key=str)
+    assert answers(query(program, "first(X).", workers=2)) == [{"X": "red"}]
+
+
+def test_stop_consuming_early():
+    with ParallelSolver(program, 2) as solver:
+        nats = solver.query(Parser("nat(X).").parse_head(), ordered=True)
+        assert len(list(itertools.islice(nats, 3))) == 3
+        nats.close()
+        assert len(list(solver.query(Parser("pair(X, Y).").parse_head()))) == 9
+
+
+def test_close_cancels_branches_without_answers():
+    looping = Parser("""\
+loop(X) :- loop(X).
+p(X) :- loop(X).
+p(a).
+""").parse_program()
+    solver = ParallelSolver(looping, 2)
+    closed = threading.Event()
+    try:
+        answers = solver.query(Parser("p(X).").parse_head())
+        assert len(list(itertools.islice(answers, 1))) == 1
+        answers.close()
+    finally:
+        closer = threading.Thread(target=lambda: (solver.close(), closed.set()), daemon=True)
+        closer.start()
+        # The first branch never yields an answer, it must still notice that the query was cancelled
+        assert closed.wait(timeout=30)
+
+
+def test_database_runs_sequentially():
+    counting = Parser("""\
+count(0).
+step(a).
+step(b).
+step(c).
+tick(S) :- step(S), retract(count(N)), M is N + 1, assertz(count(M)).
+""").parse_program()
+    with ParallelSolver(counting, 2) as solver:
+        assert solver.dynamic
+        assert answers(solver.query(Parser("tick(S).").parse_head())) == [{"S": "a"}, {"S": "b"}, {"S": "c"}]
+        # Every branch saw the changes of the previous ones, and the caller sees all of them
+        assert answers(solver.query(Parser("count(N).").parse_head())) == [{"N": "3"}]
+
+    colors = Parser("color(red).\ncolor(green).\ncolor(blue).\npair(X, Y) :- color(X), color(Y).").parse_program()
+    with ParallelSolver(colors, 2) as solver:
+        assert not solver.dynamic
+        list(solver.solve(Parser("assertz(color(white)).").parse_head()))
+        # The workers do not have the new clause, so the following queries run against the caller's program
+        assert solver.dynamic
+        assert len(list(solver.solve(Parser("pair(X, Y).").parse_head()))) == 16
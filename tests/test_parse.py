@@ -0,0 +1,75 @@
+import pickle
+from collections.abc import Iterator
+
+import pytest
+
+from brolog.lex import LexerError, TokenType, tokenize
+from brolog.parse import Parser
+
+
+def test_tokenize_positions():
+    tokens = tokenize("a(X). # comment\n  \n  b(_Y, [1|T]).")
+    assert [(t.value, t.line, t.column) for t in tokens[:5]] == [
+        ("a", 1, 1),
+        ("(", 1, 2),
+        ("X", 1, 3),
+        (")", 1, 4),
+        (".", 1, 5),
+    ]
+    assert (tokens[5].value, tokens[5].line, tokens[5].column) == ("b", 3, 3)
+    assert tokens[7].type == TokenType.variable
+
+
+def test_lexer_error_position():
+    with pytest.raises(LexerError) as e:
+        tokenize("a(x).\nb(x) :- @.")
+    assert (e.value.line, e.value.column) == (2, 9)
+
+
+def test_iter_rules_is_lazy():
+    lines_read = []
+
+    def lines() -> Iterator[str]:
+        for line in ["a(x).\n", "b(x) :- a(x).\n", "c(y).\n"]:
+            lines_read.append(line)
+            yield line
+
+    rules = Parser(lines()).iter_rules()
+    assert str(next(rules)) == "a(x)."
+    # Only the next token is read ahead
+    assert len(lines_read) == 2
+    assert [str(rule) for rule in rules] == ["b(x) :- a(x).", "c(y)."]
+
+
+def test_atoms_and_functors_are_interned():
+    rule_a, rule_b = Parser("p(a, f(x)).\np(a, f(y)).").parse()
+    assert rule_a.head.args[0] is rule_b.head.args[0]
+    assert rule_a.head.args[1].functor is rule_b.head.args[1].functor
+    assert rule_a.head.functor is rule_b.head.functor
+
+    copy = pickle.loads(pickle.dumps(rule_a))  # noqa: S301
+    assert copy.head.args[0] is rule_a.head.args[0]
+    assert copy.head.args[1].functor is rule_a.head.args[1].functor
+
+
+def test_hashcons():
+    source = "p(f(a, [b]), f(X, [b])).\np(f(a, [b]), g)."
+    rule_a, rule_b = Parser(source, hashcons=True).parse()
+    ground, non_ground = rule_a.head.args
+    assert ground is rule_b.head.args[0]
+    assert non_ground is not ground
+    assert non_ground.args[1] is ground.args[1]
+
+    rule_a, rule_b = Parser(source).parse()
+    assert rule_a.head.args[0] is not rule_b.head.args[0]
+
+
+def test_control_constructs():
+    (rule,) = Parser(r"p(X) :- a(X), (b(X) -> c(X), ! ; \+ d(X) ; true), e(X).").parse_rules()
+    assert len(rule.body) == 3
+    control = rule.body[1]
+    assert control.name == ";"
+    assert control.args[0].name == "->"
+    assert [goal.name for goal in control.args[0].args] == ["b", ","]
+    assert control.args[1].name == ";"
+    assert [goal.name for goal in control.args[1].args] == ["\\+", "true"]
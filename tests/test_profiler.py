@@ -0,0 +1,41 @@
+import json
+
+from brolog.profiler import Profile
+from brolog.solver import query
+
+
+program = """\
+e(a, b).
+e(b, c).
+e(c, d).
+path(X, Y) :- e(X, Y).
+path(X, Y) :- e(X, Z), path(Z, Y).
+"""
+
+
+def answers(proofs):
+    return [str(list(proof[0].values())) for proof in proofs]
+
+
+def test_ports():
+    profile = Profile()
+    assert answers(query(program, "path(a, X).", profile=profile)) == answers(query(program, "path(a, X)."))
+
+    path, e = profile[("path", 2)], profile[("e", 2)]
+    assert (path.calls, path.exits, path.redos) == (4, 6, 4)
+    assert (e.calls, e.exits, e.fails) == (8, 6, 2)
+    assert (e.unifications, e.unified) == (6, 6)
+    assert path.cumulative_time >= path.self_time > 0
+    assert profile.report().splitlines()[0].split()[:3] == ["predicate", "calls", "exits"]
+
+
+def test_tabled_and_dump(tmp_path):
+    profile = Profile()
+    assert len(list(query(":- table path/2.\n" + program, "path(a, X).", profile=profile))) == 3
+    # The evaluation of the table is profiled as well
+    assert profile[("path", 2)].exits > 3
+
+    profile.dump(tmp_path / "profile.json")
+    data = json.loads((tmp_path / "profile.json").read_text())
+    assert set(data) == {"path/2", "e/2"}
+    assert data["path/2"]["exits"] == profile[("path", 2)].exits
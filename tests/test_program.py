@@ -0,0 +1,50 @@
+from brolog.parse import Parser
+from brolog.program import Program
+
+
+def test_candidates_first_argument_index():
+    program = Program(
+        Parser("""\
+e(a, b).
+e(b, c).
+e(X, z).
+e([], d).
+e([H|T], f).
+f(a).""").parse()
+    )
+
+    def candidates(q: str) -> list[str]:
+        return [str(rule.head.args[1]) for rule in program.candidates(Parser(q).parse_head())]
+
+    assert candidates("e(a, Y).") == ["b", "z"]
+    assert candidates("e(c, Y).") == ["z"]
+    assert candidates("e([], Y).") == ["z", "d"]
+    assert candidates("e([1], Y).") == ["z", "f"]
+    assert candidates("e(f(a), Y).") == ["z"]
+    assert len(candidates("e(X, Y).")) == 5
+    assert candidates("f(X, Y).") == []
+    assert candidates("g(a).") == []
+
+
+def test_switch_index_after_changes():
+    program = Program(Parser("color(red, 1).").parse())
+
+    def candidates(q: str) -> list[str]:
+        return [str(rule.head) for rule in program.candidates(Parser(q).parse_head())]
+
+    # Predicates filled clause by clause get a switch as well
+    green = program.add(Parser("color(green, 2).").parse()[0])
+    program.add(Parser("color(blue, 3).").parse()[0])
+    assert candidates("color(X, 2).") == ["color(green, 2)"]
+    assert candidates("color(X, 4).") == []
+
+    program.add(Parser("color(purple, 2).").parse()[0])
+    assert program.predicates["color", 2].switches == {}
+    assert candidates("color(X, 2).") == ["color(red, 1)", "color(green, 2)", "color(blue, 3)", "color(purple, 2)"]
+
+    # Removing the clause with the duplicate key makes the argument a switch again
+    program.remove(green)
+    assert candidates("color(X, 2).") == ["color(purple, 2)"]
+    program.add(Parser("color(white, 4).").parse()[0], front=True)
+    assert candidates("color(X, 4).") == ["color(white, 4)"]
+    assert candidates("color(X, 1).") == ["color(red, 1)"]
@@ -0,0 +1,83 @@
+import io
+import json
+
+import pytest
+
+from brolog.search_tree import DotWriter, JsonlWriter, TreeBuffer, TreeRecorder
+from brolog.solver import SearchTree, query
+
+
+program = """\
+nat(z).
+nat(s(X)) :- nat(X).
+first(X) :- nat(X), !.
+"""
+
+
+def test_search_tree():
+    answers, tree = query(program, "first(X).", with_search_tree=True)
+    assert len(list(answers)) == 1
+    assert isinstance(tree, SearchTree)
+    (root,) = tree.children
+    assert [goal.name for goal in root.stack] == ["first"]
+    assert len(root.children) == 1
+
+
+def test_not_recorded_by_default():
+    assert not isinstance(query(program, "first(X).", engine="substitution"), tuple)
+
+
+def test_jsonl_writer(tmp_path):
+    path = tmp_path / "tree.jsonl"
+    with JsonlWriter(path) as writer:
+        assert len(list(query(program, "first(X).", with_search_tree=writer))) == 1
+
+    nodes = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(node["id"], node["parent"], node["depth"], node["bindings"]) for node in nodes[:2]] == [
+        (0, None, 0, {}),
+        (1, 0, 1, {"X": "X"}),
+    ]
+    assert nodes[0]["goals"][0].startswith("first(")
+    assert [node["parent"] for node in nodes[1:]] == [node["id"] for node in nodes[:-1]]
+    assert nodes[-1]["goals"] == []
+
+
+def test_dot_writer():
+    output = io.StringIO()
+    with DotWriter(output) as writer:
+        list(query(program, "first(X).", with_search_tree=writer))
+    dot = output.getvalue()
+    assert dot.startswith("digraph search_tree {\n")
+    assert dot.endswith("}\n")
+    assert 'n0 [label="first(' in dot
+    assert 'n1 -> n2 [label="X = z"];' in dot
+
+
+def test_limits():
+    # Infinitely many answers, only the first nodes are recorded
+    with TreeBuffer(5) as buffer:
+        proofs = query(program, "nat(X).", with_search_tree=buffer)
+        for _, _proof in zip(range(100), proofs, strict=False):
+            pass
+    assert len(buffer.buffer) == 5
+    assert buffer.nodes > 100
+
+    with TreeBuffer(100, max_depth=3) as buffer:
+        proofs = query(program, "nat(X).", with_search_tree=buffer)
+        for _, _proof in zip(range(20), proofs, strict=False):
+            pass
+    assert max(node.depth for node in buffer.buffer) == 3
+
+    with TreeBuffer(100, max_nodes=10) as buffer:
+        proofs = query(program, "nat(X).", with_search_tree=buffer)
+        for _, _proof in zip(range(20), proofs, strict=False):
+            pass
+    assert buffer.nodes == 10
+
+
+def test_recorder_must_implement_write():
+    class Incomplete(TreeRecorder):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
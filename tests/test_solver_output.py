@@ -3,8 +3,9 @@ from pathlib import Path
 
 import pytest
 
+from brolog.objects import Atom, List, Variable
 from brolog.parse import Parser
-from brolog.solver import QueryState, SearchTree, _query, instantiate
+from brolog.solver import ENGINES, QueryState, SearchTree, _query, get_variable_assignments, instantiate, query, unify
 
 
 test_cases = [
@@ -100,3 +101,53 @@ def test_solver_output(snapshot, test_case):
 
     snapshot.snapshot_dir = snapshot_dir
     snapshot.assert_match(json.dumps(answers, indent=2), path)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("test_case", test_cases)
+def test_query_engines(snapshot, test_case, engine):
+    name = test_case["name"]
+    snapshot_dir = Path(__file__).parent / "data"
+    path = snapshot_dir / f"{name}.json"
+
+    rules = Parser(test_case["program"]).parse()
+    answers = []
+    for _q in test_case["queries"]:
+        q = Parser(_q).parse_head()
+        answers.append([str(instantiate(q, proof)) for proof in query(rules, q, engine=engine)])
+
+    snapshot.snapshot_dir = snapshot_dir
+    snapshot.assert_match(json.dumps(answers, indent=2), path)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_occurs_check(engine):
+    # The cyclic term is not part of the answer
+    rules = "eq(X, X).\ncyclic(a) :- eq(X, f(X))."
+    assert len(list(query(rules, "cyclic(a).", engine=engine))) == 1
+    assert list(query(rules, "cyclic(a).", engine=engine, occurs_check=True)) == []
+    assert list(query(rules, "eq(f(X, Y), f(Y, g(X))).", engine=engine, occurs_check=True)) == []
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_cyclic_answers(engine):
+    # Without the occurs check the answer is a cyclic term, the inner variable stands for the whole term
+    q = Parser("eq(X, f(X)).").parse_head()
+    [proof] = query("eq(X, X).", q, engine=engine, occurs_check=False)
+    [value] = get_variable_assignments(q, proof).values()
+    assert value.name == "f"
+    [inner] = value.args
+    assert isinstance(inner, Variable)
+
+    q = Parser("eq(f(X, Y), f(Y, g(X))).").parse_head()
+    [proof] = query("eq(X, X).", q, engine=engine, occurs_check=False)
+    assert {str(v): value.name for v, value in get_variable_assignments(q, proof).items()} == {"X": "g", "Y": "g"}
+    assert str(instantiate(q, proof)).startswith("eq(f(g(")
+
+
+def test_unify_long_lists():
+    xs = [Variable(f"X{i}") for i in range(5000)]
+    ys = [Variable(f"Y{i}") for i in range(5000)]
+    bindings = unify(List.from_list(xs), List.from_list([*ys[1:], Atom("a")]), occurs_check=True)
+    assert bindings is not None
+    assert unify(List.from_list(xs), List.from_list(xs[1:])) is None
@@ -0,0 +1,117 @@
+import json
+import pickle
+import sqlite3
+from collections.abc import Iterator
+
+import pytest
+from click.testing import CliRunner
+
+from brolog.cli import cli
+from brolog.lists import Stream
+from brolog.parse import Parser
+from brolog.solver import ENGINES, get_variable_assignments, query
+from brolog.sqlite import SqliteTable
+
+
+program = """
+path(X, Y) :- e(X, Y).
+path(X, Y) :- e(X, Z), path(Z, Y).
+"""
+
+cases = [
+    ("e(a, Y).", [{"Y": "b"}, {"Y": "c"}]),
+    ("e(X, c).", [{"X": "a"}, {"X": "b"}]),
+    ("e(a, c).", [{}]),
+    ("e(c, Y).", []),
+    ("e(X, f(Y)).", []),
+    ("w(X, 1).", [{"X": "a"}]),
+    ("w(X, 2.5), w(Y, null).", [{"X": "b", "Y": "c"}]),
+    # Text which looks like a number is an atom, even if SQLite compares it equal to the number
+    ("label(a, 7).", []),
+    ("label(a, L).", [{"L": "7"}]),
+    ("path(a, Y).", [{"Y": "b"}, {"Y": "c"}, {"Y": "c"}]),
+    ("e(X, Y), !.", [{"X": "a", "Y": "b"}]),
+]
+
+
+@pytest.fixture()
+def database(tmp_path):
+    path = tmp_path / "graph.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE edges (src TEXT, dst TEXT)")
+        connection.execute("CREATE INDEX edges_src ON edges (src)")
+        connection.executemany("INSERT INTO edges VALUES (?, ?)", [("a", "b"), ("a", "c"), ("b", "c")])
+        connection.execute('CREATE TABLE "weights" (id TEXT, "the weight" NUMERIC, label TEXT)')
+        rows = [("a", 1, "7"), ("b", 2.5, "x"), ("c", None, "y")]
+        connection.executemany("INSERT INTO weights VALUES (?, ?, ?)", rows)
+    connection.close()
+    return path
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(("q", "expected"), cases)
+def test_sqlite_table(database, engine, q, expected):
+    rules = Parser(program).parse_program()
+    rules.add_facts(SqliteTable("e/2", database, "edges"))
+    rules.add_facts(SqliteTable("w/2", database, "weights", ["id", "the weight"]))
+    rules.add_facts(SqliteTable("label/2", database, "weights", ["id", "label"]))
+    q = Parser(q).parse_query()
+    answers = [get_variable_assignments(q, proof) for proof in query(rules, q, engine=engine)]
+    assert [{str(k): str(v) for k, v in answer.items()} for answer in answers] == expected
+
+
+def test_statements_and_connection_are_reused(database):
+    table = SqliteTable("e/2", database, "edges")
+    rules = Parser(program).parse_program()
+    rules.add_facts(table)
+    assert len(list(query(rules, "path(a, Y)."))) == 3
+    connection = table.connection
+    assert set(table.queries) == {(True, False)}
+    assert len(list(query(rules, "path(b, Y)."))) == 1
+    assert table.connection is connection
+
+    copy = pickle.loads(pickle.dumps(table))  # noqa: S301
+    assert copy.connection is None
+    assert len(copy.solutions(Parser("e(X, Y).").parse_head().args)) > 0
+
+
+def test_wrong_arity(database):
+    with pytest.raises(ValueError, match="needs 3 columns"):
+        SqliteTable("e/3", database, "edges")
+
+
+def test_stream_reads_lazily():
+    read = []
+
+    def solutions() -> Iterator[list[int]]:
+        for i in range(3):
+            read.append(i)
+            yield [i]
+
+    stream = Stream(solutions())
+    # The first solution is read ahead
+    assert read == [0]
+    assert len(stream) == 2
+    assert stream[0] == [0]
+    assert read == [0, 1]
+    assert stream[2] == [2]
+    assert len(stream) == 3
+    with pytest.raises(IndexError):
+        stream[3]
+    assert list(Stream(iter([]))) == []
+
+
+def test_cli_sqlite(tmp_path, database):
+    source = tmp_path / "input.pl"
+    source.write_text(program)
+    queries = tmp_path / "queries.pl"
+    queries.write_text("path(a, Y).\n")
+
+    args = [str(source), "--no-cache", "--sqlite", f"e/2={database}:edges", "--queries", str(queries)]
+    result = CliRunner().invoke(cli, [*args, "--format", "jsonl"])
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.output.splitlines()]
+    assert records[-1]["answers"] == 3
+
+    result = CliRunner().invoke(cli, [str(source), "--sqlite", f"e/2={database}"])
+    assert result.exit_code == 1
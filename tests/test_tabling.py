@@ -0,0 +1,94 @@
+from brolog.parse import Parser
+from brolog.solver import get_variable_assignments, query
+
+
+graph = """\
+e(a, b).
+e(b, c).
+e(c, a).
+e(c, d).
+"""
+
+
+def solve(program, q):
+    q = Parser(q).parse_head()
+    return sorted(str(value) for proof in query(program, q) for value in get_variable_assignments(q, proof).values())
+
+
+def test_left_recursion():
+    program = Parser(
+        graph
+        + """\
+:- table path/2.
+path(X, Y) :- path(X, Z), e(Z, Y).
+path(X, Y) :- e(X, Y)."""
+    ).parse_program()
+
+    assert solve(program, "path(a, Y).") == ["a", "b", "c", "d"]
+    assert solve(program, "path(X, d).") == ["a", "b", "c"]
+    assert solve(program, "path(d, Y).") == []
+
+
+def test_right_recursion_on_a_cycle():
+    program = Parser(
+        graph
+        + """\
+:- table path/2.
+path(X, X).
+path(X, Y) :- e(X, Z), path(Z, Y)."""
+    ).parse_program()
+
+    assert solve(program, "path(b, Y).") == ["a", "b", "c", "d"]
+    assert solve(program, "path(X, a).") == ["a", "b", "c"]
+
+
+def test_mutual_recursion():
+    program = Parser("""\
+:- table even/1, odd/1.
+n(z, s(z)).
+n(s(z), s(s(z))).
+n(s(s(z)), z).
+even(z).
+even(Y) :- odd(X), n(X, Y).
+odd(Y) :- even(X), n(X, Y).""").parse_program()
+
+    # The cycle has odd length so every node is both even and odd
+    assert solve(program, "even(X).") == ["s(s(z))", "s(z)", "z"]
+    assert solve(program, "odd(X).") == ["s(s(z))", "s(z)", "z"]
+
+
+def test_table_eviction_and_clear():
+    program = Parser(
+        graph
+        + """\
+:- table path/2.
+path(X, Y) :- e(X, Y).
+path(X, Y) :- e(X, Z), path(Z, Y)."""
+    ).parse_program()
+    program.tables.max_size = 10
+
+    assert solve(program, "path(a, Y).") == ["a", "b", "c", "d"]
+    assert program.tables.size <= 10
+    assert solve(program, "path(a, Y).") == ["a", "b", "c", "d"]
+
+    program.tables.clear()
+    assert len(program.tables) == 0
+    assert program.tables.size == 0
+
+
+def test_assert_during_evaluation():
+    program = Parser(
+        graph
+        + """\
+:- table path/2.
+path(X, Y) :- e(X, Y), assertz(seen(Y)).
+path(X, Y) :- path(X, Z), e(Z, Y)."""
+    ).parse_program()
+
+    assert solve(program, "path(a, Y).") == ["a", "b", "c", "d"]
+    # The tables computed while the program changed are discarded once the evaluation is done
+    assert len(program.tables) == 0
+    assert not program.tables.stale
+    # Once for each of the three iterations of the fixpoint, the last one finds no new answers
+    assert solve(program, "seen(Y).") == ["b", "b", "b"]
+    assert solve(program, "path(a, Y).") == ["a", "b", "c", "d"]